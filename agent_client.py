@@ -0,0 +1,305 @@
+"""
+Shared HTTP client for the external AI agents.
+
+Every call to CHATBOT_AGENT_URL, AI_AGENT_URL or DESCRIPTION_AGENT_URL goes
+through `get_agent(<setting name>)`, which gives each agent:
+  - a keep-alive connection pool per worker process (rebuilt after fork),
+  - a cap on concurrent calls from this process,
+  - one timeout policy (AGENT_CLIENTS in settings),
+  - a circuit breaker that fails fast while the agent is down, and
+  - latency and error counters, see `agent_stats()`, and Prometheus
+    latency histograms (metrics.py).
+
+Calls that are refused without reaching the agent raise AgentUnavailable,
+which is a requests ConnectionError so existing network error handling
+covers it.
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+import metrics
+import server_timing
+
+DEFAULTS = {
+    'connect_timeout': 5,       # seconds to establish a connection
+    'timeout': 60,              # seconds to wait for the agent's answer
+    'max_concurrency': 10,      # concurrent calls per process
+    'acquire_timeout': 5,       # seconds to wait for a free slot before failing
+    'failure_threshold': 5,     # consecutive failures that open the circuit
+    'reset_timeout': 30,        # seconds the circuit stays open before a trial call
+}
+
+
+class AgentUnavailable(requests.exceptions.ConnectionError):
+    """The call was refused locally: the circuit is open or the agent is at its concurrency cap."""
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After `failure_threshold` consecutive failures
+    it opens and refuses calls for `reset_timeout` seconds, then lets a single
+    trial call through (half-open); its outcome closes or re-opens the circuit.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let one trial call through. Should it never report back,
+                # another one is allowed after a further reset_timeout.
+                self.state = self.HALF_OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class AgentClient:
+    def __init__(self, setting_name, options):
+        self.setting_name = setting_name
+        self.options = options
+        self.breaker = CircuitBreaker(options['failure_threshold'], options['reset_timeout'])
+        self.stats = {'calls': 0, 'errors': 0, 'rejected': 0, 'latency_total': 0.0, 'latency_max': 0.0}
+        self._stats_lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(options['max_concurrency'])
+        self._session = None
+        self._async_state = weakref.WeakKeyDictionary()  # event loop -> (AsyncClient, Semaphore)
+
+    @property
+    def url(self):
+        # Read on every call so that settings overrides take effect
+        return getattr(settings, self.setting_name)
+
+    @property
+    def timeout(self):
+        return (self.options['connect_timeout'], self.options['timeout'])
+
+    @property
+    def session(self):
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.options['max_concurrency'])
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    def post(self, json, headers=None, timeout=None):
+        """POSTs `json` to the agent and returns the response; raises for 4xx/5xx."""
+        with self._slot():
+            return self._send(json, headers, timeout, stream=False)
+
+    @contextmanager
+    def stream(self, json, headers=None, timeout=None):
+        """
+        Like `post`, but yields a response whose body is read incrementally.
+        The concurrency slot is held, and the connection kept, until the block exits.
+        """
+        with self._slot():
+            response = self._send(json, headers, timeout, stream=True)
+            try:
+                yield response
+            finally:
+                response.close()
+
+    async def apost(self, json, headers=None, timeout=None):
+        """Async `post` for ASGI views; raises httpx errors or AgentUnavailable."""
+        client, semaphore = self._get_async_state()
+        self._check_circuit()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.options['acquire_timeout'])
+        except asyncio.TimeoutError:
+            self._reject(f"{self.setting_name} is at its concurrency limit.")
+        try:
+            started = time.monotonic()
+            try:
+                with server_timing.phase('agent'):
+                    response = await client.post(
+                        self.url, json=json, headers=headers,
+                        timeout=httpx.Timeout(timeout or self.options['timeout'], connect=self.options['connect_timeout'])
+                    )
+                response.raise_for_status()
+            except httpx.HTTPStatusError as exc:
+                self._record(started, failed=exc.response.status_code >= 500)
+                raise
+            except httpx.HTTPError:
+                self._record(started, failed=True)
+                raise
+            self._record(started, failed=False)
+            return response
+        finally:
+            semaphore.release()
+
+    @asynccontextmanager
+    async def astream(self, json, headers=None, timeout=None):
+        """Async `stream` for ASGI views; raises httpx errors or AgentUnavailable."""
+        client, semaphore = self._get_async_state()
+        self._check_circuit()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.options['acquire_timeout'])
+        except asyncio.TimeoutError:
+            self._reject(f"{self.setting_name} is at its concurrency limit.")
+        try:
+            started = time.monotonic()
+            request = client.build_request(
+                'POST', self.url, json=json, headers=headers,
+                timeout=httpx.Timeout(timeout or self.options['timeout'], connect=self.options['connect_timeout'])
+            )
+            try:
+                # Covers the wait for the agent's first byte, as in `stream`
+                with server_timing.phase('agent'):
+                    response = await client.send(request, stream=True)
+                response.raise_for_status()
+            except httpx.HTTPStatusError as exc:
+                await exc.response.aclose()
+                self._record(started, failed=exc.response.status_code >= 500)
+                raise
+            except httpx.HTTPError:
+                self._record(started, failed=True)
+                raise
+            self._record(started, failed=False)
+            try:
+                yield response
+            finally:
+                await response.aclose()
+        finally:
+            semaphore.release()
+
+    def _send(self, json, headers, timeout, stream):
+        started = time.monotonic()
+        try:
+            # For streamed calls this covers the wait for the agent's first byte
+            with server_timing.phase('agent'):
+                response = self.session.post(
+                    self.url,
+                    json=json,
+                    headers={"Content-Type": "application/json", **(headers or {})},
+                    timeout=(self.options['connect_timeout'], timeout) if timeout else self.timeout,
+                    stream=stream
+                )
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as exc:
+            exc.response.close()
+            # 4xx means we sent something wrong, not that the agent is down
+            self._record(started, failed=exc.response.status_code >= 500)
+            raise
+        except requests.exceptions.RequestException:
+            self._record(started, failed=True)
+            raise
+        self._record(started, failed=False)
+        return response
+
+    @contextmanager
+    def _slot(self):
+        self._check_circuit()
+        if not self._semaphore.acquire(timeout=self.options['acquire_timeout']):
+            self._reject(f"{self.setting_name} is at its concurrency limit.")
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+    def _check_circuit(self):
+        if not self.breaker.allow():
+            self._reject(f"{self.setting_name} is unavailable (circuit open).")
+
+    def _reject(self, message):
+        with self._stats_lock:
+            self.stats['rejected'] += 1
+        metrics.count_agent_rejection(self.setting_name)
+        raise AgentUnavailable(message)
+
+    def _record(self, started, failed):
+        latency = time.monotonic() - started
+        with self._stats_lock:
+            self.stats['calls'] += 1
+            self.stats['errors'] += int(failed)
+            self.stats['latency_total'] += latency
+            self.stats['latency_max'] = max(self.stats['latency_max'], latency)
+        metrics.observe_agent_call(self.setting_name, self.url, latency, failed)
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _get_async_state(self):
+        loop = asyncio.get_running_loop()
+        state = self._async_state.get(loop)
+        if state is None:
+            max_concurrency = self.options['max_concurrency']
+            client = httpx.AsyncClient(limits=httpx.Limits(
+                max_connections=max_concurrency, max_keepalive_connections=max_concurrency
+            ))
+            state = (client, asyncio.Semaphore(max_concurrency))
+            self._async_state[loop] = state
+        return state
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['latency_avg'] = stats['latency_total'] / stats['calls'] if stats['calls'] else 0.0
+        stats['circuit'] = self.breaker.state
+        stats['url'] = self.url
+        return stats
+
+
+_agents = {}
+_agents_lock = threading.Lock()
+
+
+def get_agent(setting_name):
+    """Returns this process's client for the agent configured under `setting_name`."""
+    agent = _agents.get(setting_name)
+    if agent is None:
+        with _agents_lock:
+            agent = _agents.get(setting_name)
+            if agent is None:
+                options = {**DEFAULTS, **getattr(settings, 'AGENT_CLIENTS', {}).get(setting_name, {})}
+                agent = _agents[setting_name] = AgentClient(setting_name, options)
+    return agent
+
+
+def agent_stats():
+    """Per-agent counters for this process, keyed by setting name."""
+    return {name: agent.snapshot() for name, agent in list(_agents.items())}
+
+
+def _reset_after_fork():
+    # Sockets, locks and counters must not be shared with the parent process
+    global _agents_lock
+    _agents.clear()
+    _agents_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,120 @@
+"""
+Benchmark: sync vs async chat send path against a slow agent.
+
+Sends the same number of chat messages through
+  - the sync endpoint (sessions/{id}/send-message/), from a fixed pool of
+    threads standing in for sync WSGI workers, and
+  - the async endpoint (sessions/{id}/send-message-async/), all from one
+    event loop, the way a single ASGI process would serve them.
+
+The agent is a local stand-in (benchmarks.fake_agent) with a fixed latency,
+and the database is a throwaway SQLite file. Run from the repository root:
+
+    python -m benchmarks.chat_concurrency --conversations 200 --workers 10 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+from .fake_agent import FakeAgentServer
+
+
+def setup_django(db_path, agent_url):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'startup_hub.settings')
+    from django.conf import settings
+
+    settings.DATABASES['default'].update({'NAME': db_path, 'OPTIONS': {'timeout': 60}})
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.CHATBOT_AGENT_URL = f'{agent_url}/startup'
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def create_fixtures(count):
+    from rest_framework.authtoken.models import Token
+    from chat.models import ChatSession
+    from users.models import User
+
+    user = User.objects.create_user(username='bench', password='bench')
+    token = Token.objects.create(user=user)
+    sessions = [ChatSession.objects.create(user=user, topic=f'Bench {i}') for i in range(count)]
+    return token.key, [session.id for session in sessions]
+
+
+def run_sync(token, session_ids, workers):
+    from django.test import Client
+
+    def send(session_id):
+        started = time.perf_counter()
+        response = Client().post(
+            f'/api/chat/sessions/{session_id}/send-message/',
+            {'prompt': 'How big is the market?'},
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'Token {token}'
+        )
+        assert response.status_code == 201, response.content
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(send, session_ids))
+    return time.perf_counter() - started, latencies
+
+
+def run_async(token, session_ids):
+    from django.test import AsyncClient
+
+    async def send(client, session_id):
+        started = time.perf_counter()
+        response = await client.post(
+            f'/api/chat/sessions/{session_id}/send-message-async/',
+            {'prompt': 'How big is the market?'},
+            content_type='application/json',
+            headers={'Authorization': f'Token {token}'}
+        )
+        assert response.status_code == 201, response.content
+        return time.perf_counter() - started
+
+    async def main():
+        client = AsyncClient()
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(send(client, session_id) for session_id in session_ids))
+        return time.perf_counter() - started, latencies
+
+    return asyncio.run(main())
+
+
+def report(name, elapsed, latencies):
+    print(f'{name:<26} {elapsed:8.2f}s {len(latencies) / elapsed:10.1f} msg/s '
+          f'{statistics.median(latencies):8.2f}s p50 {max(latencies):8.2f}s max')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conversations', type=int, default=200, help='Messages to send per mode.')
+    parser.add_argument('--workers', type=int, default=10, help='Threads standing in for sync workers.')
+    parser.add_argument('--latency', type=float, default=0.5, help='Stand-in agent latency in seconds.')
+    args = parser.parse_args()
+
+    agent = FakeAgentServer(latency=args.latency).start()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        setup_django(os.path.join(tmp_dir, 'bench.sqlite3'), agent.url)
+        token, session_ids = create_fixtures(args.conversations)
+
+        print(f'{args.conversations} conversations, agent latency {args.latency}s')
+        report(f'sync ({args.workers} workers)', *run_sync(token, session_ids, args.workers))
+        report('async (1 event loop)', *run_async(token, session_ids))
+    agent.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+r"""
+A local stand-in for the AI agents, for benchmarks.
+
+It answers POSTs on the same paths as the real agents after a delay of
+`latency` seconds (per path if given), give or take up to `jitter`, and fails
+a `failure_rate` share of the calls with a 503:
+
+    /startup            {"response": ...}, or an SSE token stream when the
+                        payload asks for "stream" (the chat agent)
+    /startup_advisor    {"response": <a markdown report>}
+    /description        {"response": ...}
+
+Run it on its own with:
+
+    python -m benchmarks.fake_agent --port 5000 --latency 0.5 --jitter 0.2 \
+        --path-latency /startup_advisor=5 --failure-rate 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+AGENT_PATHS = ('/startup', '/startup_advisor', '/description')
+
+
+class FakeAgentHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real agents behind a proxy
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path not in AGENT_PATHS:
+            self._send_json(404, {'error': f'Unknown agent path {self.path}'})
+            return
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': 'Body is not JSON.'})
+            return
+
+        time.sleep(self.server.delay(self.path))
+        if self.server.fails():
+            self._send_json(503, {'error': 'Stand-in failure.'})
+            return
+
+        prompt = payload.get('prompt', payload.get('query', ''))
+        answer = f'Stand-in answer to: {prompt}'
+        if self.path == '/startup_advisor':
+            self._send_json(200, {'response': f'# Analysis\n\n{answer}\n\n## Market\n\nLarge and growing.\n'})
+        elif self.path == '/startup' and payload.get('stream'):
+            self._send_stream(answer.split(' '))
+        else:
+            self._send_json(200, {'response': answer})
+
+    def _send_json(self, status, data):
+        self._send_text(status, 'application/json', json.dumps(data))
+
+    def _send_text(self, status, content_type, text):
+        encoded = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _send_stream(self, words):
+        """One SSE `data:` event per word, paced by the token interval, then [DONE]."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.server.token_interval)
+            self._write_chunk(f'data: {json.dumps({"token": word + " "})}\n\n')
+        self._write_chunk('data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, text):
+        encoded = text.encode()
+        self.wfile.write(f'{len(encoded):x}\r\n'.encode() + encoded + b'\r\n')
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeAgentServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # benchmarks open hundreds of connections at once
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.5, jitter=0.0, failure_rate=0.0,
+                 path_latency=None, token_interval=0.02, seed=None):
+        super().__init__((host, port), FakeAgentHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.path_latency = path_latency or {}
+        self.token_interval = token_interval
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def delay(self, path):
+        with self._random_lock:
+            spread = self._random.uniform(-self.jitter, self.jitter)
+        return max(self.path_latency.get(path, self.latency) + spread, 0)
+
+    def fails(self):
+        with self._random_lock:
+            return self._random.random() < self.failure_rate
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serves from a background thread and returns self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def path_latency(value):
+    """argparse type for PATH=SECONDS, e.g. '/startup_advisor=5' -> ('/startup_advisor', 5.0)"""
+    path, _, seconds = value.partition('=')
+    try:
+        if path in AGENT_PATHS:
+            return path, float(seconds)
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(f'expected PATH=SECONDS with PATH one of {", ".join(AGENT_PATHS)}, got {value!r}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds to wait before answering.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Latency varies by up to this many seconds.')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of calls answered with a 503.')
+    parser.add_argument('--path-latency', type=path_latency, action='append', default=[], metavar='PATH=SECONDS',
+                        help='Latency for one path, e.g. /startup_advisor=5. Repeatable.')
+    parser.add_argument('--token-interval', type=float, default=0.02, help='Seconds between streamed tokens.')
+    parser.add_argument('--seed', type=int, help='Seed for jitter and failures, for repeatable runs.')
+    args = parser.parse_args()
+
+    server = FakeAgentServer(
+        args.host, args.port, args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+        path_latency=dict(args.path_latency), token_interval=args.token_interval, seed=args.seed,
+    )
+    print(f'Fake agent listening on {server.url} (latency {args.latency}s ± {args.jitter}s, '
+          f'failure rate {args.failure_rate:.1%})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
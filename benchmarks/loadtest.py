@@ -0,0 +1,366 @@
+"""
+Load test: throughput and tail latency of the main API flows.
+
+A number of virtual users, one thread each, run a weighted mix of flows
+back to back for a fixed duration:
+
+    startup_list      GET  /api/startups/
+    startup_detail    GET  /api/startups/{id}/
+    recommendations   GET  /api/investor/recommendations/
+    chat_send         POST /api/chat/sessions/{id}/send-message/
+    chat_stream       POST /api/chat/sessions/{id}/send-message/stream/ (read to the end)
+    report_create     POST /api/reports/
+    report_download   GET  /api/reports/{id}/download/
+
+Per flow it reports requests/sec, the error count and p50/p95/p99/max
+latency, and writes the same numbers with the run's settings and git
+commit to a JSON file so runs can be compared over time.
+
+By default everything runs in this process: a throwaway SQLite database,
+Django's test client, an in-memory Celery broker (tasks are queued but not
+run, as report creation is in production) and the stand-in agent from
+benchmarks.fake_agent. With --base-url the flows are sent over HTTP to a
+running server instead; fixtures are then created in the database of the
+configured settings, so point DJANGO_SETTINGS_MODULE at the server's, and
+removed afterwards. Run from the repository root:
+
+    python -m benchmarks.loadtest --users 20 --duration 30 --agent-latency 0.5
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8000 --mix startup_list=1,startup_detail=1
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import django
+
+from .fake_agent import FakeAgentServer, path_latency
+
+DEFAULT_MIX = {
+    'startup_list': 30,
+    'startup_detail': 30,
+    'recommendations': 10,
+    'chat_send': 10,
+    'chat_stream': 5,
+    'report_create': 5,
+    'report_download': 10,
+}
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+# Flows --------------------------------------------------------------------
+# Each takes a virtual user and returns (method, path, json body, accepted statuses)
+
+def startup_list(user):
+    return 'GET', '/api/startups/', None, {200}
+
+
+def startup_detail(user):
+    return 'GET', f'/api/startups/{user.rng.choice(user.fixtures.startup_ids)}/', None, {200}
+
+
+def recommendations(user):
+    return 'GET', '/api/investor/recommendations/', None, {200}
+
+
+def chat_send(user):
+    return 'POST', f'/api/chat/sessions/{user.session_id}/send-message/', {'prompt': 'How big is the market?'}, {201}
+
+
+def chat_stream(user):
+    return 'POST', f'/api/chat/sessions/{user.session_id}/send-message/stream/', {'prompt': 'Who competes?'}, {200}
+
+
+def report_create(user):
+    # Unique queries, so that every report goes to the agent rather than the result cache
+    return 'POST', '/api/reports/', {'initial_query_input': f'Market for {uuid.uuid4().hex}?'}, {201, 202}
+
+
+def report_download(user):
+    return 'GET', f'/api/reports/{user.report_id}/download/', None, {200}
+
+
+FLOWS = {flow.__name__: flow for flow in (
+    startup_list, startup_detail, recommendations, chat_send, chat_stream, report_create, report_download,
+)}
+
+
+def mix(value):
+    """argparse type for 'name=weight,...'"""
+    weights = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in FLOWS:
+            raise argparse.ArgumentTypeError(f'unknown flow {name!r}; choose from {", ".join(FLOWS)}')
+        try:
+            weights[name] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'bad weight in {item!r}')
+    return weights
+
+
+# Transports ---------------------------------------------------------------
+
+class InProcessClient:
+    """Django's test client; streamed bodies are read to the end like a browser would."""
+
+    def __init__(self, token):
+        from django.test import Client
+
+        self.client = Client(headers={'Authorization': f'Token {token}'})
+
+    def send(self, method, path, body):
+        response = self.client.generic(
+            method, path, json.dumps(body) if body is not None else '', content_type='application/json'
+        )
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response.status_code
+
+
+class HttpClient:
+
+    def __init__(self, token, base_url):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Token {token}'
+
+    def send(self, method, path, body):
+        with self.session.request(method, self.base_url + path, json=body, stream=True, timeout=600) as response:
+            for _ in response.iter_content(chunk_size=None):
+                pass
+            return response.status_code
+
+
+# Fixtures -----------------------------------------------------------------
+
+class Fixtures:
+    """Users, startups, tags, likes, chat sessions and completed reports to run the flows against."""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.startup_ids = []
+        self.users = []  # (token key, chat session id, completed report id)
+
+    @classmethod
+    def create(cls, users, startups, seed):
+        from rest_framework.authtoken.models import Token
+
+        from chat.models import ChatSession
+        from investors.likes import set_likes
+        from investors.models import InvestorProfile
+        from startups.models import AnalysisReport, Startup, Tag
+        from users.models import User
+
+        rng = random.Random(seed)
+        fixtures = cls(f'loadtest-{uuid.uuid4().hex[:8]}')
+        tags = [Tag.objects.create(name=f'{fixtures.prefix}-tag-{i}') for i in range(10)]
+        founder = User.objects.create_user(username=f'{fixtures.prefix}-founder', password='loadtest')
+        for i in range(startups):
+            startup = Startup.objects.create(
+                founder=founder, name=f'{fixtures.prefix} startup {i}', founding_year=rng.randint(2000, 2025),
+                description_short='A startup used by the load test.', description_long='Lorem ipsum. ' * 50,
+            )
+            startup.tags.set(rng.sample(tags, 3))
+            fixtures.startup_ids.append(startup.id)
+
+        for i in range(users):
+            user = User.objects.create_user(username=f'{fixtures.prefix}-user-{i}', password='loadtest')
+            profile = InvestorProfile.objects.create(user=user)
+            profile.interested_in_tags.set(rng.sample(tags, 2))
+            set_likes(profile, like_ids=rng.sample(fixtures.startup_ids, min(5, startups)))
+            session = ChatSession.objects.create(user=user, topic='Load test')
+            report = AnalysisReport.objects.create(
+                user=user, initial_query=f'{fixtures.prefix} report {i}', status=AnalysisReport.Status.COMPLETED,
+                # Stored as the report agent returns it: JSON with the markdown under 'response'
+                report_content_md=json.dumps({'response': '# Analysis\n\n' + 'The market is large and growing. ' * 200}),
+            )
+            fixtures.users.append((Token.objects.create(user=user).key, session.id, report.id))
+        return fixtures
+
+    def delete(self):
+        from startups.models import Tag
+        from users.models import User
+
+        # Startups, profiles, likes, sessions, reports and tokens go with their users
+        User.objects.filter(username__startswith=self.prefix).delete()
+        Tag.objects.filter(name__startswith=self.prefix).delete()
+
+
+class VirtualUser:
+
+    def __init__(self, index, fixtures, client, weights, seed):
+        self.fixtures = fixtures
+        self.client = client
+        _, self.session_id, self.report_id = fixtures.users[index]
+        self.rng = random.Random(seed + index)
+        self.names = list(weights)
+        self.weights = list(weights.values())
+
+    def run(self, deadline, results):
+        while time.monotonic() < deadline:
+            name = self.rng.choices(self.names, self.weights)[0]
+            method, path, body, accepted = FLOWS[name](self)
+            started = time.perf_counter()
+            try:
+                ok = self.client.send(method, path, body) in accepted
+            except Exception:
+                ok = False
+            results.append((name, time.perf_counter() - started, ok))
+
+
+# Running and reporting ----------------------------------------------------
+
+def setup_django(db_path, agent_url, pdf_dir):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'startup_hub.settings')
+    from django.conf import settings
+
+    settings.DATABASES['default'].update({'NAME': db_path, 'OPTIONS': {'timeout': 60}})
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.REPORT_PDF_CACHE_DIR = pdf_dir
+    settings.SERVER_TIMING = {**getattr(settings, 'SERVER_TIMING', {}), 'SLOW_REQUEST_MS': None}
+    for name, path in (('CHATBOT_AGENT_URL', '/startup'), ('AI_AGENT_URL', '/startup_advisor'),
+                       ('DESCRIPTION_AGENT_URL', '/description')):
+        setattr(settings, name, agent_url + path)
+    django.setup()
+
+    from celery import current_app
+    current_app.conf.broker_url = 'memory://'
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(int(round(fraction * len(sorted_values))) - 1, 0)]
+
+
+def summarize(results, elapsed):
+    by_flow = {}
+    for name, latency, ok in results:
+        by_flow.setdefault(name, []).append((latency, ok))
+    by_flow['all'] = [(latency, ok) for _, latency, ok in results]
+
+    summary = {}
+    for name, samples in by_flow.items():
+        latencies = sorted(latency for latency, _ in samples)
+        summary[name] = {
+            'requests': len(samples),
+            'errors': sum(1 for _, ok in samples if not ok),
+            'rps': round(len(samples) / elapsed, 2),
+            **{key: round(percentile(latencies, fraction) * 1000, 2)
+               for key, fraction in (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99), ('max_ms', 1.0))},
+        }
+    return summary
+
+
+def report(summary):
+    print(f'{"flow":<18}{"requests":>9}{"errors":>8}{"req/s":>9}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+    for name, row in summary.items():
+        print(f'{name:<18}{row["requests"]:>9}{row["errors"]:>8}{row["rps"]:>9.1f}{row["p50_ms"]:>10.1f}'
+              f'{row["p95_ms"]:>10.1f}{row["p99_ms"]:>10.1f}{row["max_ms"]:>10.1f}')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, fixtures):
+    if args.base_url:
+        clients = [HttpClient(token, args.base_url) for token, _, _ in fixtures.users]
+    else:
+        clients = [InProcessClient(token) for token, _, _ in fixtures.users]
+    virtual_users = [VirtualUser(i, fixtures, client, args.mix, args.seed) for i, client in enumerate(clients)]
+
+    results = []  # list.append is atomic, so the threads can share it
+    started = time.monotonic()
+    threads = [
+        threading.Thread(target=user.run, args=(started + args.duration, results)) for user in virtual_users
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(results, time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users.')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run.')
+    parser.add_argument('--mix', type=mix, default=DEFAULT_MIX, metavar='FLOW=WEIGHT,...',
+                        help=f'Flows to run and their relative weights (default: all; choose from {", ".join(FLOWS)}).')
+    parser.add_argument('--startups', type=int, default=200, help='Startups to create as fixtures.')
+    parser.add_argument('--base-url', help='Send the flows over HTTP to this running server.')
+    parser.add_argument('--agent-latency', type=float, default=0.5, help='Stand-in agent latency in seconds.')
+    parser.add_argument('--agent-jitter', type=float, default=0.0)
+    parser.add_argument('--agent-failure-rate', type=float, default=0.0)
+    parser.add_argument('--agent-path-latency', type=path_latency, action='append', default=[],
+                        metavar='PATH=SECONDS')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', type=Path, help='JSON results file (default: benchmarks/results/<time>.json).')
+    args = parser.parse_args()
+
+    started_at = datetime.datetime.now(datetime.timezone.utc)
+    agent = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.base_url:
+            os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'startup_hub.settings')
+            django.setup()
+        else:
+            agent = FakeAgentServer(
+                latency=args.agent_latency, jitter=args.agent_jitter, failure_rate=args.agent_failure_rate,
+                path_latency=dict(args.agent_path_latency), seed=args.seed,
+            ).start()
+            setup_django(os.path.join(tmp_dir, 'loadtest.sqlite3'), agent.url, os.path.join(tmp_dir, 'pdf'))
+
+        fixtures = Fixtures.create(args.users, args.startups, args.seed)
+        try:
+            print(f'{args.users} users for {args.duration:g}s against {args.base_url or "this process"}')
+            summary = run(args, fixtures)
+        finally:
+            if args.base_url:
+                fixtures.delete()
+            if agent is not None:
+                agent.stop()
+
+    report(summary)
+    output = args.output or RESULTS_DIR / f'loadtest-{started_at:%Y%m%d-%H%M%S}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'started_at': started_at.isoformat(),
+        'commit': git_commit(),
+        'target': args.base_url or 'in-process',
+        'settings': {
+            'users': args.users, 'duration': args.duration, 'mix': args.mix, 'startups': args.startups,
+            'agent_latency': args.agent_latency, 'agent_jitter': args.agent_jitter,
+            'agent_failure_rate': args.agent_failure_rate, 'agent_path_latency': dict(args.agent_path_latency),
+            'seed': args.seed,
+        },
+        'flows': summary,
+    }, indent=2))
+    print(f'Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Benchmark: investor recommendation latency at scale.
+
+Fills a throwaway SQLite database with synthetic startups, tags, investors and
+likes, builds the precomputed state with `rebuild()` (what the
+`rebuild_recommendations` command runs), then times what requests actually do:
+
+    top_startup_ids()   the candidate query behind every uncached list
+    GET recommendations the endpoint, with the investor's cached list dropped
+                        first (cold) and as stored by the previous request (warm)
+    POST like           the like endpoint; its refresh task is only recorded,
+                        then run and timed separately, as a worker would
+
+Pass --redis to cache in a real Redis and publish the likes' events to it;
+without it the process-local cache is used and events are not published. The
+candidate table, and so rebuild(), grows quickly with --investor-tags and
+--likes; the defaults keep a full-scale run to a few minutes on SQLite. Run
+from the repository root:
+
+    python -m benchmarks.recommendations --startups 100000 --investors 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+from unittest import mock
+
+import django
+import numpy as np
+
+
+def setup_django(db_path, redis_url):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'startup_hub.settings')
+    from django.conf import settings
+
+    settings.DATABASES['default'].update({'NAME': db_path, 'OPTIONS': {'timeout': 60}})
+    if redis_url:
+        settings.CACHES['default']['LOCATION'] = redis_url
+        settings.EVENTS = {**settings.EVENTS, 'REDIS_URL': redis_url}
+    else:
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    settings.ALLOWED_HOSTS = ['testserver']
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def create_fixtures(args, rng):
+    """Bulk-inserts the data set (no signals fire) and returns the investor ids."""
+    from django.db import transaction
+
+    from investors.models import InvestorProfile, Like
+    from startups.models import Startup, Tag
+    from users.models import User
+
+    batch_size = 5000
+    with transaction.atomic():
+        founder = User.objects.create_user(username='founder', password='bench')
+        tag_ids = [tag.pk for tag in Tag.objects.bulk_create(Tag(name=f'tag{i}') for i in range(args.tags))]
+        Startup.objects.bulk_create(
+            (Startup(founder=founder, name=f'Startup {i}', description_short='Bench.', founding_year=2020,
+                     is_active=bool(active))
+             for i, active in enumerate(rng.random(args.startups) > 0.05)),
+            batch_size=batch_size,
+        )
+        startup_ids = np.array(Startup.objects.order_by('id').values_list('id', flat=True))
+        Startup.tags.through.objects.bulk_create(
+            (Startup.tags.through(startup_id=int(startup_id), tag_id=tag_ids[col])
+             for startup_id, col in _pairs(rng, startup_ids, args.tags, args.startup_tags)),
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+
+        User.objects.bulk_create(
+            (User(username=f'investor{i}') for i in range(args.investors)), batch_size=batch_size
+        )
+        investor_ids = np.array(User.objects.filter(username__startswith='investor').values_list('id', flat=True))
+        InvestorProfile.objects.bulk_create(
+            (InvestorProfile(user_id=int(investor_id)) for investor_id in investor_ids), batch_size=batch_size
+        )
+        InvestorProfile.interested_in_tags.through.objects.bulk_create(
+            (InvestorProfile.interested_in_tags.through(investorprofile_id=int(investor_id), tag_id=tag_ids[col])
+             for investor_id, col in _pairs(rng, investor_ids, args.tags, args.investor_tags)),
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+        # Older startups collect more likes, like on the real platform
+        popular = (rng.random(len(investor_ids) * args.likes) ** 2 * len(startup_ids)).astype(int)
+        Like.objects.bulk_create(
+            (Like(investor_id=int(investor_id), startup_id=int(startup_ids[col]))
+             for investor_id, col in zip(np.repeat(investor_ids, args.likes), popular)),
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+    return investor_ids
+
+
+def _pairs(rng, row_ids, n_cols, per_row):
+    return zip(np.repeat(row_ids, per_row), rng.integers(0, n_cols, size=len(row_ids) * per_row))
+
+
+def timed(fn, samples):
+    """Calls fn(sample) for each sample; returns the latencies in ms."""
+    timings = []
+    for sample in samples:
+        started = time.perf_counter()
+        fn(sample)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(name, timings, queries=None):
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    line = f'{name:<26} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  p99 {p99:8.2f} ms  max {max(timings):8.2f} ms'
+    if queries is not None:
+        line += f'  {queries:3d} queries'
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--startups', type=int, default=100_000)
+    parser.add_argument('--investors', type=int, default=10_000)
+    parser.add_argument('--tags', type=int, default=2000)
+    parser.add_argument('--startup-tags', type=int, default=3, help='Tags per startup.')
+    parser.add_argument('--investor-tags', type=int, default=1, help='Interested tags per investor.')
+    parser.add_argument('--likes', type=int, default=5, help='Likes per investor.')
+    parser.add_argument('--samples', type=int, default=500, help='Investors to time.')
+    parser.add_argument('--redis', help='Redis URL for the cache (default: process-local cache).')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        setup_django(os.path.join(tmp_dir, 'bench.sqlite3'), args.redis)
+        from django.core.cache import cache
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+        from rest_framework.test import APIClient
+
+        from investors import recommendations
+        from investors.recommendation_state import rebuild
+        from investors.tasks import refresh_recommendations_for_likes_task
+        from startups.models import Startup
+        from users.models import User
+
+        started = time.perf_counter()
+        investor_ids = create_fixtures(args, rng)
+        print(f'{args.startups} startups, {args.investors} investors, {args.likes} likes each; '
+              f'fixtures in {time.perf_counter() - started:.1f}s')
+        started = time.perf_counter()
+        pairs, candidates = rebuild()
+        print(f'rebuild(): {pairs} co-like pairs, {candidates} candidates in {time.perf_counter() - started:.1f}s')
+
+        cache.clear()
+        samples = [int(investor_id) for investor_id in rng.choice(investor_ids, size=args.samples)]
+        limit = recommendations.get_options()['LIMIT']
+        report('top_startup_ids()', timed(lambda investor_id: recommendations.top_startup_ids(investor_id, limit), samples))
+
+        users = User.objects.in_bulk(samples)
+        client = APIClient()
+        url = reverse('investor-recommendations')
+
+        def get(investor_id, cold):
+            if cold:
+                recommendations.invalidate(investor_id)
+            client.force_authenticate(users[investor_id])
+            assert client.get(url).status_code == 200
+
+        for cold, name in ((True, 'GET recommendations cold'), (False, 'GET recommendations warm')):
+            timings = timed(lambda investor_id: get(investor_id, cold), samples)
+            with CaptureQueriesContext(connection) as queries:
+                get(samples[0], cold)
+            report(name, timings, len(queries))
+
+        # One like per sampled investor, of a startup they have not liked yet
+        startup_ids = list(Startup.objects.filter(is_active=True).order_by('?').values_list('id', flat=True)[:len(samples)])
+        likes = [(investor_id, startup_id) for investor_id, startup_id in zip(samples, startup_ids)
+                 if not users[investor_id].investorprofile.likes.filter(startup_id=startup_id).exists()]
+        queued = []
+
+        def like(pair):
+            investor_id, startup_id = pair
+            client.force_authenticate(users[investor_id])
+            assert client.post(reverse('startup-like', args=[startup_id])).status_code == 200
+
+        with mock.patch.object(refresh_recommendations_for_likes_task, 'delay', lambda *task_args: queued.append(task_args)), \
+                mock.patch('events._publish') if not args.redis else nullcontext():
+            report('POST like', timed(like, likes))
+        report('  refresh task (worker)', timed(lambda task_args: refresh_recommendations_for_likes_task(*task_args), queued))
+
+
+if __name__ == '__main__':
+    main()
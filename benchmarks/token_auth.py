@@ -0,0 +1,108 @@
+"""
+Benchmark: requests/sec with DRF's TokenAuthentication vs CachedTokenAuthentication.
+
+Sends the same authenticated GET (dj_rest_auth's user details, which does no
+work beyond authentication) from a pool of threads, first with each request
+resolving its token in the database, then with the cached class. The database
+is a throwaway SQLite file; pass --redis to cache in a real Redis instead of
+the process-local cache. Run from the repository root:
+
+    python -m benchmarks.token_auth --requests 5000 --workers 8 --redis redis://127.0.0.1:6379/15
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+
+def setup_django(db_path, redis_url):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'startup_hub.settings')
+    from django.conf import settings
+
+    settings.DATABASES['default'].update({'NAME': db_path, 'OPTIONS': {'timeout': 60}})
+    if redis_url:
+        settings.CACHES['default']['LOCATION'] = redis_url
+    else:
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    settings.ALLOWED_HOSTS = ['testserver']
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def create_fixtures(count):
+    from rest_framework.authtoken.models import Token
+    from users.models import User
+
+    return [
+        Token.objects.create(user=User.objects.create_user(username=f'bench{i}', password='bench')).key
+        for i in range(count)
+    ]
+
+
+def run(authentication_class, tokens, requests, workers):
+    from dj_rest_auth.views import UserDetailsView
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    from users import authentication
+
+    cache.clear()
+    authentication.local_tokens.clear()
+    UserDetailsView.authentication_classes = [authentication_class]
+
+    def send(i):
+        started = time.perf_counter()
+        response = Client().get('/api/auth/user/', headers={'Authorization': f'Token {tokens[i % len(tokens)]}'})
+        assert response.status_code == 200, response.content
+        return time.perf_counter() - started
+
+    # Single-threaded sample of the query count per request, after warm-up. The cached
+    # class needs two passes: the first stores the token's user id, the second the user.
+    for i in range(2 * len(tokens)):
+        send(i)
+    with CaptureQueriesContext(connection) as queries:
+        send(0)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(send, range(requests)))
+    return time.perf_counter() - started, latencies, len(queries)
+
+
+def report(name, elapsed, latencies, queries):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f'{name:<26} {len(latencies) / elapsed:10.1f} req/s {statistics.median(latencies) * 1000:8.2f}ms p50 '
+          f'{p95 * 1000:8.2f}ms p95 {queries:3d} queries/request')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000, help='Requests to send per mode.')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent client threads.')
+    parser.add_argument('--users', type=int, default=100, help='Distinct tokens to rotate through.')
+    parser.add_argument('--redis', help='Redis URL for the cache (default: process-local cache).')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        setup_django(os.path.join(tmp_dir, 'bench.sqlite3'), args.redis)
+        from rest_framework.authentication import TokenAuthentication
+        from users.authentication import CachedTokenAuthentication
+
+        tokens = create_fixtures(args.users)
+        print(f'{args.requests} requests, {args.workers} workers, {args.users} tokens, '
+              f'cache: {args.redis or "locmem"}')
+        report('TokenAuthentication', *run(TokenAuthentication, tokens, args.requests, args.workers))
+        report('CachedTokenAuthentication', *run(CachedTokenAuthentication, tokens, args.requests, args.workers))
+
+
+if __name__ == '__main__':
+    main()
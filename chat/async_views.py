@@ -0,0 +1,85 @@
+"""
+Async (ASGI) implementation of the chat send path.
+
+The agent call dominates a chat request, and in a sync worker it holds the
+whole thread for as long as the agent takes. Served under ASGI, this view
+awaits the agent instead, so one process can keep hundreds of conversations
+in flight. It is mounted next to the sync endpoint and behaves the same way.
+"""
+import httpx
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from agent_client import AgentUnavailable, get_agent
+from .models import ChatSession, ChatMessage
+from .serializers import ChatMessageSerializer, MessageInputSerializer
+from .views import CONNECTION_ERROR_REPLY, UNREADABLE_REPLY
+
+def _authenticate(drf_request):
+    """Runs the configured DRF authentication classes and returns the user (or None)."""
+    user = drf_request.user
+    return user if user.is_authenticated else None
+
+
+@csrf_exempt
+@require_POST
+async def send_message(request, pk):
+    """
+    Async twin of ChatViewSet.send_message.
+    Endpoint: POST /api/chat/sessions/{id}/send-message-async/
+    """
+    drf_request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    user = await sync_to_async(_authenticate)(drf_request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    try:
+        session = await ChatSession.objects.aget(pk=pk, user=user)
+    except ChatSession.DoesNotExist:
+        return JsonResponse({'detail': 'No ChatSession matches the given query.'}, status=404)
+
+    try:
+        input_serializer = MessageInputSerializer(data=drf_request.data)
+    except ParseError as exc:
+        return JsonResponse({'detail': str(exc.detail)}, status=400)
+    if not input_serializer.is_valid():
+        return JsonResponse(input_serializer.errors, status=400)
+    prompt = input_serializer.validated_data['prompt']
+
+    ai_message = await handle_send_message(session, user, prompt)
+    return JsonResponse(ChatMessageSerializer(ai_message).data, status=201)
+
+
+async def handle_send_message(session, user, prompt):
+    """Async twin of ChatViewSet._handle_send_message."""
+    await ChatMessage.objects.acreate(session=session, role=ChatMessage.Role.USER, content=prompt)
+
+    try:
+        payload = {
+            "user_id": str(user.id),
+            "prompt": prompt
+        }
+        response = await get_agent('CHATBOT_AGENT_URL').apost(payload)
+
+        response_data = response.json()
+        ai_content = response_data.get('response', response_data.get('answer', 'Sorry, I received an unexpected response.'))
+
+    except (httpx.HTTPError, AgentUnavailable) as e:
+        ai_content = CONNECTION_ERROR_REPLY.format(error=e)
+    except ValueError:
+        ai_content = UNREADABLE_REPLY
+
+    return await ChatMessage.objects.acreate(
+        session=session,
+        role=ChatMessage.Role.AI,
+        content=ai_content
+    )
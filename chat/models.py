@@ -7,6 +7,12 @@ class ChatSession(models.Model):
     topic = models.CharField(max_length=255, blank=True, null=True, help_text="Optional: A title for the conversation.")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Backs the keyset pagination of a user's sessions.
+            models.Index(fields=['user', '-created_at', '-id'], name='chatsession_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Chat Session {self.id} for {self.user.username}"
 
@@ -23,6 +29,10 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Backs message paging, the ?after= delta and the last-message subqueries.
+            models.Index(fields=['session', 'created_at', 'id'], name='chatmessage_session_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_role_display()} message in Session {self.session.id}"
\ No newline at end of file
@@ -8,14 +8,29 @@ class ChatMessageSerializer(serializers.ModelSerializer):
         fields = ['id', 'role', 'content', 'created_at']
 
 class ChatSessionSerializer(serializers.ModelSerializer):
-    """Serializer for a chat session, including all its messages."""
-    messages = ChatMessageSerializer(many=True, read_only=True)
+    """
+    Serializer for a chat session's metadata. Messages are paged separately
+    (sessions/{id}/messages/); the count and last message come from the
+    annotations added by ChatViewSet.get_queryset.
+    """
+    message_count = serializers.IntegerField(read_only=True, default=0)
+    last_message = serializers.SerializerMethodField()
 
     class Meta:
         model = ChatSession
-        fields = ['id', 'user', 'topic', 'messages', 'created_at']
+        fields = ['id', 'user', 'topic', 'message_count', 'last_message', 'created_at']
         read_only_fields = ['user']
 
+    def get_last_message(self, session):
+        if getattr(session, 'last_message_id', None) is None:
+            return None
+        return {
+            'id': session.last_message_id,
+            'role': session.last_message_role,
+            'preview': session.last_message_preview,
+            'created_at': serializers.DateTimeField().to_representation(session.last_message_at),
+        }
+
 class MessageInputSerializer(serializers.Serializer):
     """Serializer for the user's input when sending a message."""
     prompt = serializers.CharField(max_length=4000)
\ No newline at end of file
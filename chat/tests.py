@@ -1,3 +1,236 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from agent_client import DEFAULTS, AgentClient, AgentUnavailable, CircuitBreaker
+from testing import use_locmem_cache
+from users.models import User
+from .models import ChatMessage, ChatSession
+from .views import CONNECTION_ERROR_REPLY
+
+
+@use_locmem_cache
+class StreamingSendMessageTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='chatter', password='pass')
+        self.client.force_authenticate(self.user)
+        self.session = ChatSession.objects.create(user=self.user)
+        self.url = f'/api/chat/sessions/{self.session.id}/send-message/stream/'
+
+    def agent_stream(self, *lines):
+        upstream = mock.Mock()
+        upstream.headers = {'Content-Type': 'text/event-stream'}
+        upstream.iter_lines.return_value = iter(lines)
+        return upstream
+
+    @mock.patch('agent_client.requests.Session.post')
+    def test_relays_tokens_and_saves_reply(self, post):
+        post.return_value = self.agent_stream('data: {"token": "Hi "}', '', 'data: {"token": "there"}', 'data: [DONE]')
+
+        response = self.client.post(self.url, {'prompt': 'Hello'}, format='json')
+        body = b''.join(response.streaming_content).decode()
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: token\ndata: {"content": "Hi "}', body)
+        self.assertIn('event: done', body)
+        self.assertEqual(
+            list(self.session.messages.values_list('role', 'content')),
+            [(ChatMessage.Role.USER, 'Hello'), (ChatMessage.Role.AI, 'Hi there')]
+        )
+
+    @mock.patch('agent_client.requests.Session.post')
+    def test_client_disconnect_keeps_partial_reply(self, post):
+        upstream = self.agent_stream('data: {"token": "Hi "}', 'data: {"token": "there"}')
+        post.return_value = upstream
+
+        response = self.client.post(self.url, {'prompt': 'Hello'}, format='json')
+        next(iter(response.streaming_content))
+        response.close()
+
+        upstream.close.assert_called_once()
+        self.assertEqual(self.session.messages.get(role=ChatMessage.Role.AI).content, 'Hi ')
+
+
+@use_locmem_cache
+class AsgiStreamingSendMessageTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='chatter', password='pass')
+        self.token = Token.objects.create(user=self.user)
+        self.session = ChatSession.objects.create(user=self.user)
+        self.url = f'/api/chat/sessions/{self.session.id}/send-message/stream/'
+
+    @mock.patch('agent_client.httpx.AsyncClient.send')
+    async def test_streams_from_an_async_iterator(self, send):
+        send.return_value = httpx.Response(
+            200, headers={'Content-Type': 'text/event-stream'},
+            content=b'data: {"token": "Hi "}\n\ndata: {"token": "there"}\n\ndata: [DONE]\n\n',
+            request=httpx.Request('POST', 'http://agent'),
+        )
+
+        response = await self.async_client.post(
+            self.url, {'prompt': 'Hello'}, content_type='application/json',
+            headers={'Authorization': f'Token {self.token.key}'}
+        )
+        # A sync iterator would have been buffered whole before the first byte was sent
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        self.assertIn('event: token\ndata: {"content": "Hi "}', body)
+        self.assertIn('event: done', body)
+        messages = [(message.role, message.content) async for message in self.session.messages.all()]
+        self.assertEqual(messages, [(ChatMessage.Role.USER, 'Hello'), (ChatMessage.Role.AI, 'Hi there')])
+
+
+@use_locmem_cache
+class AsyncSendMessageTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='chatter', password='pass')
+        self.token = Token.objects.create(user=self.user)
+        self.session = ChatSession.objects.create(user=self.user)
+        self.url = reverse('chatsession-send-message-async', args=[self.session.id])
+        # Each test gets fresh agent clients, so failures don't carry over into the circuit breaker
+        patcher = mock.patch.dict('agent_client._agents', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def send(self, prompt):
+        return await self.async_client.post(
+            self.url, {'prompt': prompt}, content_type='application/json',
+            headers={'Authorization': f'Token {self.token.key}'}
+        )
+
+    async def messages(self):
+        return [(message.role, message.content) async for message in self.session.messages.order_by('id')]
+
+    @mock.patch('agent_client.httpx.AsyncClient.post')
+    async def test_saves_agent_reply(self, post):
+        post.return_value = httpx.Response(
+            200, json={'response': 'Hi there'}, request=httpx.Request('POST', 'http://agent')
+        )
+
+        response = await self.send('Hello')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['content'], 'Hi there')
+        self.assertEqual(post.call_args.kwargs['json'], {'user_id': str(self.user.id), 'prompt': 'Hello'})
+        self.assertEqual(await self.messages(), [(ChatMessage.Role.USER, 'Hello'), (ChatMessage.Role.AI, 'Hi there')])
+
+    @mock.patch('agent_client.httpx.AsyncClient.post', side_effect=httpx.ConnectError('refused'))
+    async def test_agent_error_is_saved_as_reply(self, post):
+        response = await self.send('Hello')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['content'], CONNECTION_ERROR_REPLY.format(error='refused'))
+        self.assertEqual(len(await self.messages()), 2)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.post(self.url, {'prompt': 'Hello'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(await self.session.messages.aexists())
+
+
+@use_locmem_cache
+class SessionMessagesTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='chatter', password='pass')
+        self.client.force_authenticate(self.user)
+        self.session = ChatSession.objects.create(user=self.user, topic='Fundraising')
+        self.messages = [
+            ChatMessage.objects.create(
+                session=self.session, role=ChatMessage.Role.USER if i % 2 == 0 else ChatMessage.Role.AI,
+                content=f'Message {i}'
+            )
+            for i in range(5)
+        ]
+
+    def test_session_list_carries_metadata_only(self):
+        for _ in range(3):
+            ChatSession.objects.create(user=self.user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/chat/sessions/')
+
+        session = next(row for row in response.data['results'] if row['id'] == self.session.id)
+        self.assertNotIn('messages', session)
+        self.assertEqual(session['message_count'], 5)
+        self.assertEqual(session['last_message']['id'], self.messages[-1].id)
+        self.assertEqual(session['last_message']['preview'], 'Message 4')
+        self.assertEqual(sum(row['last_message'] is None for row in response.data['results']), 3)
+
+    def test_messages_page_newest_first(self):
+        response = self.client.get(f'/api/chat/sessions/{self.session.id}/messages/', {'page_size': 3})
+
+        self.assertEqual([row['content'] for row in response.data['results']], ['Message 4', 'Message 3', 'Message 2'])
+        older = self.client.get(response.data['next']).data
+        self.assertEqual([row['content'] for row in older['results']], ['Message 1', 'Message 0'])
+
+    def test_after_returns_only_newer_messages_oldest_first(self):
+        url = f'/api/chat/sessions/{self.session.id}/messages/'
+
+        response = self.client.get(url, {'after': self.messages[2].id})
+
+        self.assertEqual([row['content'] for row in response.data['results']], ['Message 3', 'Message 4'])
+        self.assertEqual(self.client.get(url, {'after': self.messages[4].id}).data['results'], [])
+        self.assertEqual(self.client.get(url, {'after': 'latest'}).status_code, 400)
+
+
+class AgentClientTests(SimpleTestCase):
+
+    def make_agent(self, **options):
+        return AgentClient('CHATBOT_AGENT_URL', {**DEFAULTS, **options})
+
+    @mock.patch('agent_client.time.monotonic')
+    def test_circuit_opens_after_failures_and_lets_one_trial_through(self, monotonic):
+        monotonic.return_value = 100.0
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+        breaker.record_failure()
+        self.assertEqual((breaker.state, breaker.allow()), (CircuitBreaker.CLOSED, True))
+        breaker.record_failure()
+        self.assertEqual((breaker.state, breaker.allow()), (CircuitBreaker.OPEN, False))
+
+        monotonic.return_value = 130.0
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())  # Only one trial at a time
+        breaker.record_failure()
+        self.assertEqual((breaker.state, breaker.allow()), (CircuitBreaker.OPEN, False))
+
+        monotonic.return_value = 160.0
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual((breaker.state, breaker.allow()), (CircuitBreaker.CLOSED, True))
+
+    @mock.patch('agent_client.requests.Session.post', side_effect=requests.exceptions.ConnectionError)
+    def test_open_circuit_fails_fast(self, post):
+        agent = self.make_agent(failure_threshold=2)
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                agent.post({})
+
+        with self.assertRaises(AgentUnavailable):
+            agent.post({})
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(agent.snapshot()['rejected'], 1)
+
+    @mock.patch('agent_client.requests.Session.post')
+    def test_call_over_the_concurrency_cap_is_rejected(self, post):
+        agent = self.make_agent(max_concurrency=1, acquire_timeout=0)
+
+        with agent.stream({}):
+            with self.assertRaises(AgentUnavailable):
+                agent.post({})
+        agent.post({})
+
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(agent.snapshot()['rejected'], 1)
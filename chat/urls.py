@@ -1,10 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import ChatViewSet
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'sessions', ChatViewSet)
 
 urlpatterns = [
+    # Async (ASGI) variant of sessions/{id}/send-message/
+    path('sessions/<int:pk>/send-message-async/', async_views.send_message, name='chatsession-send-message-async'),
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
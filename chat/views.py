@@ -1,12 +1,27 @@
+import asyncio
+import json
+
+import httpx
 import requests
-from django.conf import settings
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Substr
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status, serializers # Added serializers for ValidationError
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
 from .models import ChatSession, ChatMessage
 from .serializers import ChatSessionSerializer, ChatMessageSerializer, MessageInputSerializer
+from agent_client import AgentUnavailable, get_agent
+from pagination import ChatMessageCursorPagination, CreatedAtCursorPagination
+from sse import EventStreamRenderer, format_event
+
+CONNECTION_ERROR_REPLY = "Sorry, I'm having trouble connecting right now. (Error: {error})"
+UNREADABLE_REPLY = "Sorry, I received a response I couldn't understand from my brain."
+PREVIEW_LENGTH = 200
 
 class ChatViewSet(viewsets.ModelViewSet):
     """
@@ -17,10 +32,30 @@ class ChatViewSet(viewsets.ModelViewSet):
     queryset = ChatSession.objects.all()
     serializer_class = ChatSessionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
-        """Users can only see their own chat sessions."""
-        return ChatSession.objects.filter(user=self.request.user).order_by('-created_at')
+        """
+        Users can only see their own chat sessions. Where sessions are
+        serialized, each one is annotated with its message count and last
+        message, one index lookup per session instead of loading messages.
+        """
+        sessions = ChatSession.objects.filter(user=self.request.user).order_by('-created_at')
+        if self.action not in ('list', 'retrieve', 'create', 'update', 'partial_update'):
+            return sessions
+
+        session_messages = ChatMessage.objects.filter(session=OuterRef('pk'))
+        last_message = session_messages.order_by('-created_at', '-id')
+        message_count = session_messages.order_by().values('session').annotate(count=Count('pk')).values('count')
+        return sessions.annotate(
+            message_count=Coalesce(Subquery(message_count, output_field=IntegerField()), 0),
+            last_message_id=Subquery(last_message.values('id')[:1]),
+            last_message_role=Subquery(last_message.values('role')[:1]),
+            last_message_preview=Subquery(
+                last_message.annotate(preview=Substr('content', 1, PREVIEW_LENGTH)).values('preview')[:1]
+            ),
+            last_message_at=Subquery(last_message.values('created_at')[:1]),
+        )
 
     def perform_create(self, serializer):
         """
@@ -36,6 +71,35 @@ class ChatViewSet(viewsets.ModelViewSet):
         # If a prompt is provided, create the session AND handle the first message exchange
         session = serializer.save(user=self.request.user)
         self._handle_send_message(session, prompt)
+        # Respond with the count and last message of the exchange
+        serializer.instance = self.get_queryset().get(pk=session.pk)
+
+    @action(detail=True, methods=['get'], pagination_class=ChatMessageCursorPagination)
+    def messages(self, request, pk=None):
+        """
+        Pages through a session's messages, newest first.
+        With `?after=<message id>`, returns only the messages sent after that
+        one, oldest first, so a client can fetch just what is new.
+        Endpoint: GET /api/chat/sessions/{id}/messages/
+        """
+        session = self.get_object()
+        messages = session.messages.all()
+
+        after = request.query_params.get('after')
+        if after is not None:
+            anchor = session.messages.filter(pk=after).values('created_at').first() if after.isdigit() else None
+            if anchor is None:
+                return Response(
+                    {'error': 'after must be the id of a message in this session.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            # Keyset on (created_at, id), so the delta is a range scan of the session's index
+            messages = messages.filter(
+                Q(created_at__gt=anchor['created_at']) | Q(created_at=anchor['created_at'], id__gt=after)
+            )
+
+        page = self.paginate_queryset(messages)
+        return self.get_paginated_response(ChatMessageSerializer(page, many=True).data)
 
     @action(detail=True, methods=['post'], url_path='send-message')
     def send_message(self, request, pk=None):
@@ -54,6 +118,109 @@ class ChatViewSet(viewsets.ModelViewSet):
         response_serializer = ChatMessageSerializer(ai_response_message)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=['post'], url_path='send-message/stream',
+            renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def send_message_stream(self, request, pk=None):
+        """
+        Streaming variant of send-message. Relays the agent's answer as
+        Server-Sent Events while it is generated:
+          event: token  data: {"content": "..."}   (repeated)
+          event: done   data: <the saved AI ChatMessage>
+        Streams under both WSGI and ASGI.
+        Endpoint: POST /api/chat/sessions/{id}/send-message/stream/
+        """
+        session = self.get_object()
+        input_serializer = MessageInputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+        prompt = input_serializer.validated_data['prompt']
+
+        # Under ASGI, Django buffers a sync iterator in full before sending it, so stream from an async one
+        if isinstance(request._request, ASGIRequest):
+            content = self._astream_message(session, prompt)
+        else:
+            content = self._stream_message(session, prompt)
+        response = StreamingHttpResponse(content, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no' # Stop nginx from buffering the stream
+        return response
+
+    def _stream_message(self, session, prompt):
+        """
+        Generator behind send_message_stream. The AI message is saved once the
+        agent finishes; if the client disconnects first, the upstream
+        connection is closed and whatever the agent already said is saved, so
+        our history stays in step with the agent's own context.
+        """
+        ChatMessage.objects.create(session=session, role=ChatMessage.Role.USER, content=prompt)
+
+        payload = {
+            "user_id": str(self.request.user.id),
+            "prompt": prompt,
+            "stream": True
+        }
+        tokens = []
+        ai_message = None
+        try:
+            try:
+                # Leaving this block closes the upstream connection, also on client disconnect
+                with get_agent('CHATBOT_AGENT_URL').stream(payload, headers={"Accept": "text/event-stream"}) as upstream:
+                    for token in _iter_agent_tokens(upstream):
+                        tokens.append(token)
+                        yield format_event({"content": token}, event="token")
+            except requests.exceptions.RequestException as e:
+                if not tokens:
+                    tokens = [CONNECTION_ERROR_REPLY.format(error=e)]
+            except ValueError:
+                if not tokens:
+                    tokens = [UNREADABLE_REPLY]
+
+            ai_message = ChatMessage.objects.create(
+                session=session,
+                role=ChatMessage.Role.AI,
+                content="".join(tokens)
+            )
+            yield format_event(ChatMessageSerializer(ai_message).data, event="done")
+        finally:
+            if ai_message is None and tokens:
+                ChatMessage.objects.create(session=session, role=ChatMessage.Role.AI, content="".join(tokens))
+
+    async def _astream_message(self, session, prompt):
+        """Async twin of _stream_message, for requests served by the ASGI application."""
+        await ChatMessage.objects.acreate(session=session, role=ChatMessage.Role.USER, content=prompt)
+
+        payload = {
+            "user_id": str(self.request.user.id),
+            "prompt": prompt,
+            "stream": True
+        }
+        tokens = []
+        ai_message = None
+        try:
+            try:
+                async with get_agent('CHATBOT_AGENT_URL').astream(payload, headers={"Accept": "text/event-stream"}) as upstream:
+                    async for token in _aiter_agent_tokens(upstream):
+                        tokens.append(token)
+                        yield format_event({"content": token}, event="token")
+            except (httpx.HTTPError, AgentUnavailable) as e:
+                if not tokens:
+                    tokens = [CONNECTION_ERROR_REPLY.format(error=e)]
+            except ValueError:
+                if not tokens:
+                    tokens = [UNREADABLE_REPLY]
+
+            ai_message = await ChatMessage.objects.acreate(
+                session=session,
+                role=ChatMessage.Role.AI,
+                content="".join(tokens)
+            )
+            yield format_event(ChatMessageSerializer(ai_message).data, event="done")
+        finally:
+            if ai_message is None and tokens:
+                # Runs when the client disconnects; finish the save even though the stream is cancelled
+                await asyncio.shield(ChatMessage.objects.acreate(
+                    session=session, role=ChatMessage.Role.AI, content="".join(tokens)
+                ))
+
     def _handle_send_message(self, session, prompt):
         """
         Private helper method to encapsulate the logic of sending a message
@@ -73,13 +240,7 @@ class ChatViewSet(viewsets.ModelViewSet):
                 "prompt": prompt
             }
 
-            response = requests.post(
-                settings.CHATBOT_AGENT_URL,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=60
-            )
-            response.raise_for_status()
+            response = get_agent('CHATBOT_AGENT_URL').post(payload)
 
             # The agent's response format is not specified, so we assume it's JSON
             # with a key like 'response' or 'answer'. We'll check for common ones.
@@ -88,10 +249,10 @@ class ChatViewSet(viewsets.ModelViewSet):
 
         except requests.exceptions.RequestException as e:
             # Handle network errors, timeouts, etc.
-            ai_content = f"Sorry, I'm having trouble connecting right now. (Error: {e})"
+            ai_content = CONNECTION_ERROR_REPLY.format(error=e)
         except ValueError:
             # Handle cases where the response is not valid JSON
-            ai_content = "Sorry, I received a response I couldn't understand from my brain."
+            ai_content = UNREADABLE_REPLY
         
         # 3. Save the AI's response to our database. This step is unchanged.
         ai_message = ChatMessage.objects.create(
@@ -99,4 +260,67 @@ class ChatViewSet(viewsets.ModelViewSet):
             role=ChatMessage.Role.AI,
             content=ai_content
         )
-        return ai_message
\ No newline at end of file
+        return ai_message
+
+
+_DONE = object()
+
+
+def _agent_event_token(line):
+    """The token carried by one line of an agent's SSE stream: None to skip the line, _DONE at its end."""
+    if not line or not line.startswith('data:'):
+        return None
+    data = line[len('data:'):].strip()
+    if data == '[DONE]':
+        return _DONE
+    try:
+        parsed = json.loads(data)
+    except ValueError:
+        return data
+    if isinstance(parsed, dict):
+        return parsed.get('token', parsed.get('content', parsed.get('response', '')))
+    return str(parsed)
+
+
+def _iter_agent_tokens(response):
+    """
+    Yields text chunks from a streaming agent response. Understands an SSE
+    stream of `data:` lines (JSON objects or raw text, ending at `[DONE]`),
+    a plain chunked text body, and falls back to a regular JSON answer from
+    agents that do not stream.
+    """
+    content_type = response.headers.get('Content-Type', '')
+    if content_type.startswith('text/event-stream'):
+        for line in response.iter_lines(decode_unicode=True):
+            token = _agent_event_token(line)
+            if token is _DONE:
+                break
+            if token:
+                yield token
+    elif content_type.startswith('application/json'):
+        response_data = response.json()
+        yield response_data.get('response', response_data.get('answer', 'Sorry, I received an unexpected response.'))
+    else:
+        for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+            if chunk:
+                yield chunk
+
+
+async def _aiter_agent_tokens(response):
+    """Async twin of _iter_agent_tokens for a streamed httpx response."""
+    content_type = response.headers.get('Content-Type', '')
+    if content_type.startswith('text/event-stream'):
+        async for line in response.aiter_lines():
+            token = _agent_event_token(line)
+            if token is _DONE:
+                break
+            if token:
+                yield token
+    elif content_type.startswith('application/json'):
+        await response.aread()
+        response_data = response.json()
+        yield response_data.get('response', response_data.get('answer', 'Sorry, I received an unexpected response.'))
+    else:
+        async for chunk in response.aiter_text():
+            if chunk:
+                yield chunk
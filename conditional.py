@@ -0,0 +1,44 @@
+"""
+Conditional GET for DRF views.
+
+A view looks up a cheap version of the resource (an `updated_at`, a counter,
+a cache generation) without loading or serializing it, and hands it to
+`conditional_response` together with a function that builds the full
+response. A client that sends the matching If-None-Match (or an
+If-Modified-Since no older than `last_modified`) gets an empty 304 instead.
+
+The ETag also covers the negotiated media type, because the JSON and the
+browsable API renderings of one version are different bodies.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(request, *version):
+    renderer = getattr(request, 'accepted_media_type', '')
+    digest = hashlib.sha1(':'.join(map(str, (renderer, *version))).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def conditional_response(request, build_response, version, last_modified=None):
+    """
+    Returns a 304 if the client's copy of `version` is current, else
+    `build_response()`. Either way the response carries the validators.
+    `version` is a tuple of values that changes whenever the body does.
+    """
+    etag = make_etag(request, *version)
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build_response()
+        if response.status_code != 200:
+            return response
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    # Cached copies are per user and must be revalidated before reuse
+    response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Accept, Authorization'
+    return response
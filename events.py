@@ -0,0 +1,171 @@
+"""
+Live per-user events over Server-Sent Events.
+
+Each signed-in client keeps one `GET /api/events/` open instead of polling.
+Code anywhere (web requests, Celery workers) calls
+
+    events.publish(user_id, 'report', {...})
+
+which, once the surrounding transaction commits, publishes the event to the
+user's Redis pub/sub channel. Every web node subscribes on behalf of the
+clients connected to it, so an event reaches the user whichever node or
+worker produced it. Events are:
+
+    report        an AnalysisReport's status or pdf_status changed
+    description   a startup's AI description was written (or failed)
+    description_job
+                  a batch description job finished
+    likes         investors liked one of the founder's startups
+
+Delivery is best effort and not replayed: a client that (re)connects should
+fetch the current state once, then rely on the stream. The stream view is
+async and is meant to be served by the ASGI application, where an open
+stream costs no worker thread. Under WSGI (e.g. runserver) it streams from a
+sync generator instead, since Django would read an async one to the end
+before sending anything; there each open stream holds a worker thread until
+the client disconnects. Authenticate with the usual
+`Authorization: Token ...` header (browsers need a fetch-based SSE client,
+since EventSource cannot send headers).
+"""
+import asyncio
+import json
+import logging
+import os
+
+import redis
+import redis.asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from sse import format_event
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'events:user:'
+
+DEFAULTS = {
+    'REDIS_URL': 'redis://127.0.0.1:6379/2',
+    'HEARTBEAT': 15,  # seconds between keep-alive comments on an idle stream
+}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'EVENTS', {})}
+
+
+def channel(user_id):
+    return f'{CHANNEL_PREFIX}{user_id}'
+
+
+_client = None
+_client_pid = None
+
+
+def _redis():
+    """This process's publishing client (a forked worker builds its own)."""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = redis.Redis.from_url(get_options()['REDIS_URL'])
+        _client_pid = os.getpid()
+    return _client
+
+
+def publish(user_id, event, data):
+    """Sends `event` to every open stream of `user_id` once the current transaction commits."""
+    if user_id is None:
+        return
+    message = json.dumps({'event': event, 'data': data}, default=str)
+    transaction.on_commit(lambda: _publish(channel(user_id), message))
+
+
+def _publish(channel_name, message):
+    try:
+        _redis().publish(channel_name, message)
+    except redis.RedisError:
+        logger.warning("Could not publish an event to %s.", channel_name, exc_info=True)
+
+
+def _authenticate(drf_request):
+    user = drf_request.user
+    return user if user.is_authenticated else None
+
+
+@require_GET
+async def event_stream(request):
+    """
+    The signed-in user's events, as `event: <name>` / `data: <json>` SSE
+    frames. Endpoint: GET /api/events/
+    """
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    user = await sync_to_async(_authenticate)(drf_request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    # Under WSGI, Django buffers an async iterator in full before sending it, so stream from a sync one
+    content = _events(user.pk) if isinstance(request, ASGIRequest) else _sync_events(user.pk)
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+
+async def _events(user_id):
+    options = get_options()
+    client = redis.asyncio.Redis.from_url(options['REDIS_URL'])
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        await pubsub.subscribe(channel(user_id))
+        # Tells the client it is subscribed, so it can fetch the current state without missing anything
+        yield format_event({}, event='ready')
+        while True:
+            frame = _frame(await pubsub.get_message(timeout=options['HEARTBEAT']))
+            if frame is not None:
+                yield frame
+    finally:
+        # Runs when the client disconnects and the server closes this generator
+        await asyncio.shield(_close(pubsub, client))
+
+
+def _sync_events(user_id):
+    """Sync twin of _events, for requests served by the WSGI application."""
+    options = get_options()
+    client = redis.Redis.from_url(options['REDIS_URL'])
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(channel(user_id))
+        yield format_event({}, event='ready')
+        while True:
+            frame = _frame(pubsub.get_message(timeout=options['HEARTBEAT']))
+            if frame is not None:
+                yield frame
+    finally:
+        try:
+            pubsub.close()
+            client.close()
+        except redis.RedisError:
+            pass
+
+
+def _frame(message):
+    """The SSE frame for a pub/sub message; a keep-alive comment when none came, None to skip it."""
+    if message is None:
+        return ': keep-alive\n\n'
+    try:
+        payload = json.loads(message['data'])
+    except ValueError:
+        return None
+    return format_event(payload['data'], event=payload['event'])
+
+
+async def _close(pubsub, client):
+    try:
+        await pubsub.aclose()
+        await client.aclose()
+    except redis.RedisError:
+        pass
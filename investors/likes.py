@@ -0,0 +1,132 @@
+"""
+The denormalized Startup.likes_count counter.
+
+Every write to Like must move the counter in the same transaction. Single
+saves and deletes go through the signals in signals.py; `set_likes` writes
+in bulk with the signals muted and makes the same adjustments itself, once
+per batch instead of once per row.
+The counter is only ever changed with an UPDATE ... SET likes_count =
+likes_count + n, so concurrent likes never overwrite each other. The same
+UPDATE bumps updated_at, since likes_count is part of a startup's
+representation and its ETag.
+
+New likes are announced to the startups' founders on their event streams
+(events.py).
+
+`reconcile_likes_count` recomputes the counter from the Like table in
+batches and fixes any drift, e.g. after rows were changed outside the ORM.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+import events
+from startups import list_cache
+from startups.models import Startup
+from . import recommendation_state
+from .models import InvestorProfile, Like
+
+_bulk_write = ContextVar('bulk_like_write', default=False)
+
+
+@contextmanager
+def bulk_write():
+    """Within this block the Like signal handlers do nothing; the caller keeps the derived state."""
+    token = _bulk_write.set(True)
+    try:
+        yield
+    finally:
+        _bulk_write.reset(token)
+
+
+def in_bulk_write():
+    return _bulk_write.get()
+
+
+def set_likes(investor, like_ids=(), unlike_ids=()):
+    """
+    Makes `investor` like every startup in like_ids and none in unlike_ids.
+    Idempotent: liking a liked startup or unliking an unliked one is a no-op.
+    Returns ({startup_id: liked} for every requested id, [ids that don't exist]).
+    """
+    requested = list(dict.fromkeys([*like_ids, *unlike_ids]))
+    with transaction.atomic():
+        # Serializes concurrent like writes of one investor, so the counter deltas below are exact
+        InvestorProfile.objects.select_for_update().filter(pk=investor.pk).first()
+        # One query validates the ids and reads the current state
+        rows = Startup.objects.filter(id__in=requested).annotate(
+            liked=Exists(Like.objects.filter(investor=investor, startup=OuterRef('pk')))
+        ).values_list('id', 'liked', 'founder_id')
+        current = {startup_id: liked for startup_id, liked, _ in rows}
+        founders = {startup_id: founder_id for startup_id, _, founder_id in rows}
+        missing = [startup_id for startup_id in requested if startup_id not in current]
+        if missing:
+            return {}, missing
+
+        added = [startup_id for startup_id in dict.fromkeys(like_ids) if not current[startup_id]]
+        removed = [startup_id for startup_id in dict.fromkeys(unlike_ids) if current[startup_id]]
+        with bulk_write():
+            Like.objects.bulk_create(
+                [Like(investor=investor, startup_id=startup_id) for startup_id in added], ignore_conflicts=True
+            )
+            if removed:
+                Like.objects.filter(investor=investor, startup_id__in=removed).delete()
+        adjust_likes_count(added, 1)
+        adjust_likes_count(removed, -1)
+        if added or removed:
+            recommendation_state.queue_likes_changed(investor.pk, [*added, *removed])
+        announce_likes(investor.pk, [(startup_id, founders[startup_id]) for startup_id in added])
+
+    state = {startup_id: current[startup_id] for startup_id in requested}
+    state.update(dict.fromkeys(added, True))
+    state.update(dict.fromkeys(removed, False))
+    return state, []
+
+
+def announce_likes(investor_id, liked):
+    """Tells founders about new likes; `liked` holds (startup_id, founder_id) pairs."""
+    by_founder = {}
+    for startup_id, founder_id in liked:
+        by_founder.setdefault(founder_id, []).append(startup_id)
+    for founder_id, startup_ids in by_founder.items():
+        events.publish(founder_id, 'likes', {'investor_id': investor_id, 'startup_ids': startup_ids})
+
+
+def adjust_likes_count(startup_ids, delta):
+    """Adds `delta` to the counter of each startup, once per occurrence of its id."""
+    by_amount = {}
+    for startup_id, times in Counter(startup_ids).items():
+        by_amount.setdefault(delta * times, []).append(startup_id)
+    now = timezone.now()
+    for amount, ids in by_amount.items():
+        Startup.objects.filter(id__in=ids).update(likes_count=F('likes_count') + amount, updated_at=now)
+    if by_amount:
+        # Popularity ordering and the likes_min filter of cached list pages changed
+        list_cache.invalidate()
+
+
+def reconcile_likes_count(batch_size=1000):
+    """
+    Walks all startups in id order, batch_size at a time, and rewrites the
+    counters that differ from the Like table. Returns (checked, fixed).
+    """
+    actual = Coalesce(Subquery(
+        Like.objects.filter(startup=OuterRef('pk')).order_by().values('startup').annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField()
+    ), 0)
+    checked = fixed = 0
+    last_id = 0
+    while True:
+        batch = list(Startup.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            return checked, fixed
+        checked += len(batch)
+        last_id = batch[-1]
+        drifted = Startup.objects.filter(id__in=batch).alias(actual=actual).filter(~Q(likes_count=F('actual')))
+        # The recount happens inside the UPDATE, so a like landing meanwhile is not lost
+        fixed += drifted.update(likes_count=actual, updated_at=timezone.now())
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from investors.recommendation_state import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recomputes all co-like counts and recommendation candidates from scratch."
+
+    def handle(self, *args, **options):
+        pairs, candidates = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {pairs} co-like pairs and {candidates} candidates."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from investors.likes import reconcile_likes_count
+
+
+class Command(BaseCommand):
+    help = "Recomputes Startup.likes_count from the Like table and fixes any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Startups checked per query.")
+
+    def handle(self, *args, **options):
+        checked, fixed = reconcile_likes_count(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} startups, fixed {fixed} like counters."))
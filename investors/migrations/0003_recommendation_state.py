@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investors', '0002_remove_investorprofile_liked_startups_like'),
+        ('startups', '0008_analysisreport_served_from_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag_score', models.PositiveIntegerField(default=0)),
+                ('colike_score', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField()),
+                ('investor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendation_candidates', to='investors.investorprofile')),
+                ('startup', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='startups.startup')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['investor', '-score'], name='candidate_investor_score_idx')],
+                'unique_together': {('investor', 'startup')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StartupCoLike',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField()),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='startups.startup')),
+                ('startup', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='colikes', to='startups.startup')),
+            ],
+            options={
+                'unique_together': {('startup', 'other')},
+            },
+        ),
+    ]
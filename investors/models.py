@@ -22,3 +22,33 @@ class Like(models.Model):
     def __str__(self):
         return f"{self.investor} likes {self.startup}"
     
+
+class StartupCoLike(models.Model):
+    """Number of investors who liked both startups. Stored in both directions."""
+    startup = models.ForeignKey(Startup, on_delete=models.CASCADE, related_name='colikes')
+    other = models.ForeignKey(Startup, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('startup', 'other')
+
+    def __str__(self):
+        return f"{self.startup_id} & {self.other_id}: {self.count}"
+
+
+class RecommendationCandidate(models.Model):
+    """A startup with a non-zero recommendation score for an investor (see recommendations.py)."""
+    investor = models.ForeignKey('InvestorProfile', on_delete=models.CASCADE, related_name='recommendation_candidates')
+    startup = models.ForeignKey(Startup, on_delete=models.CASCADE, related_name='+')
+    tag_score = models.PositiveIntegerField(default=0)
+    colike_score = models.PositiveIntegerField(default=0)
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('investor', 'startup')
+        indexes = [
+            models.Index(fields=['investor', '-score'], name='candidate_investor_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.investor_id} -> {self.startup_id}: {self.score}"
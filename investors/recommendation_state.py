@@ -0,0 +1,175 @@
+"""
+Precomputed recommendation state, kept up to date as likes and tags change.
+
+    StartupCoLike            (a, b, n): n investors liked both a and b; a != b,
+                             stored in both directions
+    RecommendationCandidate  (investor, startup, tag score, co-like score, score)
+                             for every active, unliked startup with a non-zero score
+
+The signal handlers in signals.py call the functions below, which recompute
+exactly the rows an event can affect from the current database state. Likes
+are the hot path, so their refresh is queued after commit (`queue_likes_changed`)
+and runs in a Celery task; meanwhile the investor's cached list is dropped and
+reads skip liked startups, so a like still disappears from their list at once.
+
+    (un)likes (X, S)              pairs involving S; all of X's candidates; for
+                                  other investors who liked S or anything X
+                                  likes, their rows for those startups
+    investor's tags change        all of that investor's candidates
+    startup's tags or is_active   that startup's candidates for every investor
+
+`rebuild()` throws everything away and recomputes it with the sparse engine;
+both paths produce the same rows.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from startups.models import Startup
+from . import recommendations
+from .models import Like, RecommendationCandidate, StartupCoLike
+
+BATCH_SIZE = 1000
+
+
+def queue_likes_changed(investor_id, startup_ids):
+    """Schedules likes_changed for when the current transaction commits."""
+    from .tasks import refresh_recommendations_for_likes_task
+
+    startup_ids = list(startup_ids)
+    recommendations.invalidate(investor_id)
+    transaction.on_commit(lambda: refresh_recommendations_for_likes_task.delay(investor_id, startup_ids))
+
+
+def likes_changed(investor_id, startup_ids):
+    """Likes of `startup_ids` by `investor_id` were created or deleted."""
+    refresh_colikes(startup_ids)
+    affected_startups = set(Like.objects.filter(investor_id=investor_id).values_list('startup_id', flat=True))
+    affected_startups.update(startup_ids)
+    peers = set(
+        Like.objects.filter(startup_id__in=affected_startups).values_list('investor_id', flat=True)
+    ) - {investor_id}
+
+    refresh_candidates(investor_ids=[investor_id])
+    if peers:
+        refresh_candidates(investor_ids=peers, startup_ids=affected_startups)
+    recommendations.invalidate(investor_id, *peers)
+
+
+def investor_tags_changed(investor_ids):
+    refresh_candidates(investor_ids=investor_ids)
+    recommendations.invalidate(*investor_ids)
+
+
+def startups_changed(startup_ids):
+    """The tags or is_active flag of these startups changed."""
+    refresh_candidates(startup_ids=startup_ids)
+    recommendations.invalidate_all()
+
+
+@transaction.atomic
+def refresh_colikes(startup_ids):
+    """Recomputes every co-like pair that involves one of `startup_ids`."""
+    StartupCoLike.objects.filter(Q(startup_id__in=startup_ids) | Q(other_id__in=startup_ids)).delete()
+    counts = Like.objects.filter(startup_id__in=startup_ids).values(
+        'startup_id', other_id=F('investor__likes__startup_id')
+    ).annotate(count=Count('pk'))
+
+    pairs = {}
+    for row in counts:
+        if row['startup_id'] != row['other_id']:
+            pairs[row['startup_id'], row['other_id']] = row['count']
+            pairs[row['other_id'], row['startup_id']] = row['count']
+    StartupCoLike.objects.bulk_create(
+        [StartupCoLike(startup_id=a, other_id=b, count=count) for (a, b), count in pairs.items()],
+        batch_size=BATCH_SIZE,
+    )
+
+
+@transaction.atomic
+def refresh_candidates(investor_ids=None, startup_ids=None):
+    """
+    Recomputes the candidate rows for investor_ids x startup_ids; None stands
+    for all investors or all startups.
+    """
+    stale = RecommendationCandidate.objects.all()
+    tag_matches = Startup.tags.through.objects.filter(startup__is_active=True)
+    colikes = StartupCoLike.objects.filter(other__is_active=True)
+    likes = Like.objects.all()
+    if investor_ids is not None:
+        stale = stale.filter(investor_id__in=investor_ids)
+        tag_matches = tag_matches.filter(tag__investors__in=investor_ids)
+        colikes = colikes.filter(startup__liked_by__investor_id__in=investor_ids)
+        likes = likes.filter(investor_id__in=investor_ids)
+    else:
+        tag_matches = tag_matches.filter(tag__investors__isnull=False)
+        colikes = colikes.filter(startup__liked_by__isnull=False)
+    if startup_ids is not None:
+        stale = stale.filter(startup_id__in=startup_ids)
+        tag_matches = tag_matches.filter(startup_id__in=startup_ids)
+        colikes = colikes.filter(other_id__in=startup_ids)
+        likes = likes.filter(startup_id__in=startup_ids)
+
+    scores = {}
+    for row in tag_matches.values('startup_id', investor_id=F('tag__investors')).annotate(score=Count('pk')):
+        scores[row['investor_id'], row['startup_id']] = [row['score'], 0]
+    for row in colikes.values('other_id', investor_id=F('startup__liked_by__investor_id')).annotate(score=Sum('count')):
+        scores.setdefault((row['investor_id'], row['other_id']), [0, 0])[1] = row['score']
+    for liked in likes.values_list('investor_id', 'startup_id'):
+        scores.pop(liked, None)
+
+    options = recommendations.get_options()
+    stale.delete()
+    RecommendationCandidate.objects.bulk_create(
+        [_candidate(investor_id, startup_id, tag_score, colike_score, options)
+         for (investor_id, startup_id), (tag_score, colike_score) in scores.items()],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def rebuild():
+    """Recomputes all co-like pairs and candidates from scratch. Returns (pairs, candidates) written."""
+    engine = recommendations.RecommendationEngine.from_db()
+    options = recommendations.get_options()
+    colikes = engine.colike_counts().tocoo()
+    tag_scores, colike_scores = engine.candidate_scores()
+    nonzero = (tag_scores + colike_scores).tocoo()
+    tag_values = _values_at(tag_scores, nonzero.row, nonzero.col)
+    colike_values = _values_at(colike_scores, nonzero.row, nonzero.col)
+
+    with transaction.atomic():
+        StartupCoLike.objects.all().delete()
+        RecommendationCandidate.objects.all().delete()
+        StartupCoLike.objects.bulk_create(
+            (StartupCoLike(startup_id=engine.startup_ids[a], other_id=engine.startup_ids[b], count=count)
+             for a, b, count in zip(colikes.row.tolist(), colikes.col.tolist(), colikes.data.astype(int).tolist())),
+            batch_size=BATCH_SIZE,
+        )
+        RecommendationCandidate.objects.bulk_create(
+            (_candidate(engine.investor_ids[i], engine.startup_ids[j], tag_score, colike_score, options)
+             for i, j, tag_score, colike_score in zip(
+                 nonzero.row.tolist(), nonzero.col.tolist(),
+                 tag_values.astype(int).tolist(), colike_values.astype(int).tolist()
+             )),
+            batch_size=BATCH_SIZE,
+        )
+    recommendations.invalidate_all()
+    return colikes.nnz, nonzero.nnz
+
+
+def _values_at(matrix, rows, cols):
+    """The entries of a sparse matrix at (rows, cols) as a flat array."""
+    if not len(rows):
+        # scipy returns a sparse matrix rather than a dense one for an empty index
+        return np.zeros(0)
+    return np.asarray(matrix[rows, cols]).ravel()
+
+
+def _candidate(investor_id, startup_id, tag_score, colike_score, options):
+    return RecommendationCandidate(
+        investor_id=int(investor_id),
+        startup_id=int(startup_id),
+        tag_score=tag_score,
+        colike_score=colike_score,
+        score=options['TAG_WEIGHT'] * tag_score + options['COLIKE_WEIGHT'] * colike_score,
+    )
@@ -0,0 +1,196 @@
+"""
+Startup recommendations for investors.
+
+The engine keeps the startup/tag and investor/like relations as sparse
+matrices and scores every investor/startup pair at once with sparse products:
+
+    tag score     number of the investor's interested tags the startup carries
+    co-like score for each startup the investor liked, the number of investors
+                  who liked both it and the candidate, summed
+                  (i.e. row i of L @ L.T @ L, for the like matrix L)
+    score         RECOMMENDATIONS['TAG_WEIGHT'] * tag + RECOMMENDATIONS['COLIKE_WEIGHT'] * co-like
+
+Startups the investor already liked, and inactive startups, are never
+returned. Ties, including the all-zero case of an investor with no tags and no
+likes, go to the newest startup.
+
+Requests do not score anything: the non-zero scores are kept in the
+RecommendationCandidate table and the co-like counts per pair of startups in
+StartupCoLike, both updated incrementally by signals (see
+recommendation_state.py). The engine computes the same scores from scratch
+and is what the `rebuild_recommendations` command uses. The top-N list per
+investor is cached in the default cache for RESULT_TTL seconds.
+"""
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from scipy import sparse
+
+from startups import caching
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'TAG_WEIGHT': 1.0,
+    'COLIKE_WEIGHT': 0.5,
+    'RESULT_TTL': 300,
+    'LIMIT': 10,
+}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'RECOMMENDATIONS', {})}
+
+
+class RecommendationEngine:
+    """
+    startup_ids   startup ids, newest first; the row order of `startup_tags`
+                  and the column order of `likes`
+    active        boolean mask over startup_ids
+    startup_tags  sparse (startups x tags) 0/1 matrix
+    investor_ids  investor (user) ids; the row order of `likes` and `investor_tags`
+    likes         sparse (investors x startups) 0/1 matrix
+    investor_tags sparse (investors x tags) 0/1 matrix
+    """
+
+    def __init__(self, startup_ids, active, startup_tags, investor_ids, likes, investor_tags):
+        self.startup_ids = np.asarray(startup_ids, dtype=np.int64)
+        self.active = np.asarray(active, dtype=bool)
+        self.investor_ids = np.asarray(investor_ids, dtype=np.int64)
+        self.startup_tags = sparse.csr_matrix(startup_tags, dtype=np.float64)
+        self.likes = sparse.csr_matrix(likes, dtype=np.float64)
+        self.investor_tags = sparse.csr_matrix(investor_tags, dtype=np.float64)
+
+    @classmethod
+    def from_db(cls):
+        from startups.models import Startup, Tag
+        from .models import InvestorProfile, Like
+
+        startups = list(Startup.objects.order_by('-created_at', '-id').values_list('id', 'is_active'))
+        startup_index = {startup_id: row for row, (startup_id, _) in enumerate(startups)}
+        tag_index = {tag_id: col for col, tag_id in enumerate(Tag.objects.values_list('id', flat=True))}
+        investor_ids = list(InvestorProfile.objects.values_list('user_id', flat=True))
+        investor_index = {investor_id: row for row, investor_id in enumerate(investor_ids)}
+
+        startup_tag_pairs = Startup.tags.through.objects.values_list('startup_id', 'tag_id')
+        like_pairs = Like.objects.values_list('investor_id', 'startup_id')
+        investor_tag_pairs = InvestorProfile.interested_in_tags.through.objects.values_list('investorprofile_id', 'tag_id')
+
+        shape = (len(startups), len(tag_index))
+        return cls(
+            startup_ids=[startup_id for startup_id, _ in startups],
+            active=[is_active for _, is_active in startups],
+            startup_tags=_indicator(startup_tag_pairs, startup_index, tag_index, shape),
+            investor_ids=investor_ids,
+            likes=_indicator(like_pairs, investor_index, startup_index, (len(investor_ids), len(startups))),
+            investor_tags=_indicator(investor_tag_pairs, investor_index, tag_index, (len(investor_ids), len(tag_index))),
+        )
+
+    def colike_counts(self):
+        """Sparse (startups x startups) matrix of co-like counts, L.T @ L without the diagonal."""
+        counts = (self.likes.T @ self.likes).tocoo()
+        off_diagonal = counts.row != counts.col
+        return sparse.csr_matrix(
+            (counts.data[off_diagonal], (counts.row[off_diagonal], counts.col[off_diagonal])), shape=counts.shape
+        )
+
+    def candidate_scores(self):
+        """
+        Returns sparse (investors x startups) tag and co-like score matrices
+        for all investors at once, with liked and inactive startups zeroed.
+        """
+        eligible = sparse.diags(self.active.astype(np.float64))
+        tag_scores = (self.investor_tags @ self.startup_tags.T @ eligible).tocsr()
+        colike_scores = (self.likes @ self.colike_counts() @ eligible).tocsr()
+        tag_scores = tag_scores - tag_scores.multiply(self.likes)
+        colike_scores = colike_scores - colike_scores.multiply(self.likes)
+        tag_scores.eliminate_zeros()
+        colike_scores.eliminate_zeros()
+        return tag_scores, colike_scores
+
+
+def _indicator(pairs, row_index, col_index, shape):
+    rows, cols = [], []
+    for row_key, col_key in pairs:
+        if row_key in row_index and col_key in col_index:
+            rows.append(row_index[row_key])
+            cols.append(col_index[col_key])
+    data = np.ones(len(rows))
+    matrix = sparse.csr_matrix((data, (rows, cols)), shape=shape)
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+def top_startup_ids(investor_id, limit):
+    """
+    Reads the investor's best candidates and, when there are fewer than
+    `limit`, fills up with the newest unliked startups (all scoring zero).
+    """
+    from startups.models import Startup
+    from .models import RecommendationCandidate
+
+    # A fresh like is only dropped from the candidates once its refresh task ran
+    startup_ids = list(
+        RecommendationCandidate.objects.filter(investor_id=investor_id)
+        .exclude(startup__liked_by__investor_id=investor_id)
+        .order_by('-score', '-startup__created_at', '-startup_id')
+        .values_list('startup_id', flat=True)[:limit]
+    )
+    if len(startup_ids) < limit:
+        startup_ids += Startup.objects.filter(is_active=True).exclude(id__in=startup_ids).exclude(
+            liked_by__investor_id=investor_id
+        ).order_by('-created_at', '-id').values_list('id', flat=True)[:limit - len(startup_ids)]
+    return startup_ids
+
+
+GENERATION = 'recommendations'
+
+
+def cache_key(investor_id):
+    """The investor's cache key, or None when the cache is unavailable."""
+    # The generation changes whenever a startup is added or its tags or is_active change,
+    # which can affect every investor's list at once
+    generation = caching.peek_generation(GENERATION)
+    if generation is None:
+        return None
+    return f'recommendations:{generation}:{investor_id}'
+
+
+def recommend_startup_ids(investor_id, limit=None):
+    """Top-N startup ids for an investor, from the per-investor cache when possible."""
+    options = get_options()
+    limit = limit or options['LIMIT']
+    key = cache_key(investor_id)
+    if key is None:
+        return top_startup_ids(investor_id, limit)
+    try:
+        cached = cache.get(key)
+    except Exception:
+        cached = None
+    if cached is not None and cached[0] >= limit:
+        return cached[1][:limit]
+    startup_ids = top_startup_ids(investor_id, limit)
+    try:
+        cache.set(key, (limit, startup_ids), options['RESULT_TTL'])
+    except Exception:
+        logger.warning("Cache is unavailable; recommendations not stored.", exc_info=True)
+    return startup_ids
+
+
+def invalidate(*investor_ids):
+    """Drops the cached lists of investors whose candidates changed. Best effort, like caching.py."""
+    keys = [key for key in map(cache_key, investor_ids) if key is not None]
+    if not keys:
+        return
+    try:
+        cache.delete_many(keys)
+    except Exception:
+        logger.warning("Cache is unavailable; could not invalidate recommendations.", exc_info=True)
+
+
+def invalidate_all():
+    """Drops every cached list by moving to a new generation of cache keys."""
+    caching.bump_generation(GENERATION)
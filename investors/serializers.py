@@ -1,12 +1,34 @@
 from rest_framework import serializers
 from .models import InvestorProfile
+from startups.models import Startup
 from startups.serializers import TagSerializer, StartupListSerializer
 
 class InvestorProfileSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()
     interested_in_tags = TagSerializer(many=True, read_only=True)
-    liked_startups = StartupListSerializer(many=True, read_only=True)
+    liked_startups = serializers.SerializerMethodField()
 
     class Meta:
         model = InvestorProfile
-        fields = ('user', 'company_name', 'interested_in_tags', 'liked_startups')
\ No newline at end of file
+        fields = ('user', 'company_name', 'interested_in_tags', 'liked_startups')
+
+    def get_liked_startups(self, profile):
+        # Most recently liked first
+        startups = Startup.objects.filter(liked_by__investor=profile).order_by('-liked_by__created_at').select_related(
+            'founder'
+        ).prefetch_related('tags')
+        return StartupListSerializer(startups, many=True).data
+
+
+class BulkLikeSerializer(serializers.Serializer):
+    """Startup ids to like and to unlike in one request."""
+    like = serializers.ListField(child=serializers.IntegerField(), required=False, default=list, max_length=200)
+    unlike = serializers.ListField(child=serializers.IntegerField(), required=False, default=list, max_length=200)
+
+    def validate(self, data):
+        if not data['like'] and not data['unlike']:
+            raise serializers.ValidationError("Provide startup ids to like or unlike.")
+        both = set(data['like']) & set(data['unlike'])
+        if both:
+            raise serializers.ValidationError(f"Cannot both like and unlike startups {sorted(both)}.")
+        return data
\ No newline at end of file
@@ -0,0 +1,87 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from startups.models import Startup, Tag
+from . import recommendation_state, recommendations
+from .likes import adjust_likes_count, announce_likes, in_bulk_write
+from .models import InvestorProfile, Like
+
+
+@receiver(post_save, sender=Like)
+def like_created(sender, instance, created, **kwargs):
+    if created and not in_bulk_write():
+        adjust_likes_count([instance.startup_id], 1)
+        recommendation_state.queue_likes_changed(instance.investor_id, [instance.startup_id])
+        announce_likes(instance.investor_id, [(instance.startup_id, instance.startup.founder_id)])
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, **kwargs):
+    if in_bulk_write():
+        return
+    adjust_likes_count([instance.startup_id], -1)
+    recommendation_state.queue_likes_changed(instance.investor_id, [instance.startup_id])
+
+
+@receiver(m2m_changed, sender=InvestorProfile.interested_in_tags.through)
+def investor_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recommendation_state.investor_tags_changed([instance.pk])
+        return
+    # tag.investors.add(...) etc.: pk_set holds investors, except on clear
+    if action == 'pre_clear':
+        instance._cleared_investor_ids = list(instance.investors.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        recommendation_state.investor_tags_changed(instance.__dict__.pop('_cleared_investor_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        recommendation_state.investor_tags_changed(pk_set)
+
+
+@receiver(m2m_changed, sender=Startup.tags.through)
+def startup_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recommendation_state.startups_changed([instance.pk])
+        return
+    if action == 'pre_clear':
+        instance._recommendations_cleared_startup_ids = list(instance.startup_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        recommendation_state.startups_changed(instance.__dict__.pop('_recommendations_cleared_startup_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        recommendation_state.startups_changed(pk_set)
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged(sender, instance, **kwargs):
+    # Deleting a tag drops its m2m rows without sending m2m_changed
+    instance._recommendations_tagged = (
+        list(instance.startup_set.values_list('pk', flat=True)),
+        list(instance.investors.values_list('pk', flat=True)),
+    )
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    startup_ids, investor_ids = instance.__dict__.pop('_recommendations_tagged', ([], []))
+    if startup_ids:
+        recommendation_state.startups_changed(startup_ids)
+    if investor_ids:
+        recommendation_state.investor_tags_changed(investor_ids)
+
+
+@receiver(pre_save, sender=Startup)
+def remember_is_active(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and 'is_active' not in update_fields):
+        instance._was_active = None
+        return
+    instance._was_active = Startup.objects.filter(pk=instance.pk).values_list('is_active', flat=True).first()
+
+
+@receiver(post_save, sender=Startup)
+def startup_saved(sender, instance, created, **kwargs):
+    if created:
+        # No tags or likes yet; only the zero-score fill of cached lists is stale
+        recommendations.invalidate_all()
+    elif instance.__dict__.pop('_was_active', None) not in (None, instance.is_active):
+        recommendation_state.startups_changed([instance.pk])
@@ -0,0 +1,16 @@
+from celery import shared_task
+from django.db import IntegrityError
+
+from . import recommendation_state
+
+
+@shared_task(autoretry_for=(IntegrityError,), max_retries=3, retry_backoff=True)
+def refresh_recommendations_for_likes_task(investor_id, startup_ids):
+    """
+    Brings the co-like pairs and candidates up to date after likes changed
+    (see recommendation_state.likes_changed). Queued on commit by the like
+    writes, so their cost does not grow with how popular the startups are.
+    Two runs racing over the same pairs can collide on the unique rows; the
+    loser simply runs again against the committed state.
+    """
+    recommendation_state.likes_changed(investor_id, startup_ids)
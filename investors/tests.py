@@ -1,3 +1,291 @@
+from contextlib import contextmanager
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from startups.models import Startup, Tag
+from testing import use_locmem_cache
+from users.models import User
+from .models import InvestorProfile, Like, RecommendationCandidate, StartupCoLike
+from .likes import reconcile_likes_count
+from .recommendation_state import rebuild
+from .recommendations import RecommendationEngine, recommend_startup_ids
+from .tasks import refresh_recommendations_for_likes_task
+
+
+class InvestorFixturesMixin:
+
+    def make_startup(self, name, *tags, is_active=True):
+        startup = Startup.objects.create(
+            founder=self.founder, name=name, description_short=name, founding_year=2021, is_active=is_active
+        )
+        startup.tags.set(tags)
+        return startup
+
+    def make_investor(self, username, *tags):
+        user = User.objects.create_user(username=username, password='pass')
+        investor = InvestorProfile.objects.create(user=user)
+        investor.interested_in_tags.set(tags)
+        return investor
+
+    @contextmanager
+    def refreshing_likes(self):
+        """Runs the recommendation refresh that likes in this block queue, inline once they commit."""
+        with mock.patch.object(refresh_recommendations_for_likes_task, 'delay', refresh_recommendations_for_likes_task), \
+                mock.patch('events._publish'), self.captureOnCommitCallbacks(execute=True):
+            yield
+
+
+@use_locmem_cache
+class RecommendationEngineTests(InvestorFixturesMixin, TestCase):
+
+    def setUp(self):
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.fintech, self.health = Tag.objects.create(name='fintech'), Tag.objects.create(name='health')
+
+    def test_scores_tags_and_co_likes_and_skips_liked(self):
+        liked = self.make_startup('Liked', self.fintech)
+        co_liked = self.make_startup('Co-liked')
+        tagged = self.make_startup('Tagged', self.fintech, self.health)
+        self.make_startup('Inactive', self.fintech, is_active=False)
+        self.make_startup('Untagged')
+
+        investor = self.make_investor('investor', self.fintech, self.health)
+        peer = self.make_investor('peer')
+        Like.objects.create(investor=investor, startup=liked)
+        Like.objects.create(investor=peer, startup=liked)
+        Like.objects.create(investor=peer, startup=co_liked)
+
+        engine = RecommendationEngine.from_db()
+        tag_scores, colike_scores = engine.candidate_scores()
+
+        row = engine.investor_ids.tolist().index(investor.pk)
+        columns = engine.startup_ids.tolist()
+        scores = {
+            startup_id: (tag_scores[row, col], colike_scores[row, col])
+            for col, startup_id in enumerate(columns) if tag_scores[row, col] or colike_scores[row, col]
+        }
+        # Liked, inactive and unrelated startups score nothing
+        self.assertEqual(scores, {tagged.id: (2, 0), co_liked.id: (0, 1)})
+
+    def test_investor_without_signals_gets_newest_startups(self):
+        older = self.make_startup('Older')
+        newer = self.make_startup('Newer')
+        investor = self.make_investor('investor')
+
+        self.assertEqual(recommend_startup_ids(investor.pk, 10), [newer.id, older.id])
+
+
+@use_locmem_cache
+class RecommendationStateTests(InvestorFixturesMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.fintech, self.health, self.ai = (Tag.objects.create(name=name) for name in ('fintech', 'health', 'ai'))
+
+    def state(self):
+        return (
+            set(StartupCoLike.objects.values_list('startup_id', 'other_id', 'count')),
+            set(RecommendationCandidate.objects.values_list('investor_id', 'startup_id', 'tag_score', 'colike_score', 'score')),
+        )
+
+    def test_incremental_updates_match_rebuild(self):
+        alpha = self.make_startup('Alpha', self.fintech)
+        beta = self.make_startup('Beta', self.health, self.ai)
+        gamma = self.make_startup('Gamma', self.fintech, self.ai)
+        delta = self.make_startup('Delta')
+        ann = self.make_investor('ann', self.fintech)
+        bob = self.make_investor('bob', self.ai)
+        cid = self.make_investor('cid')
+
+        with self.refreshing_likes():
+            for investor, startup in ((ann, alpha), (bob, alpha), (bob, beta), (cid, beta), (cid, delta), (ann, gamma)):
+                Like.objects.create(investor=investor, startup=startup)
+            Like.objects.get(investor=ann, startup=gamma).delete()
+        cid.interested_in_tags.add(self.health)
+        self.ai.investors.add(ann)
+        delta.tags.add(self.fintech)
+        self.fintech.startup_set.remove(alpha)
+        gamma.is_active = False
+        gamma.save()
+
+        incremental = self.state()
+        self.assertTrue(incremental[0] and incremental[1])
+        self.assertIn((alpha.id, beta.id, 1), incremental[0])
+        self.assertIn((ann.pk, beta.id, 1, 1, 1.5), incremental[1])
+
+        rebuild()
+        self.assertEqual(self.state(), incremental)
+
+    def test_likes_are_refreshed_after_commit(self):
+        startup = self.make_startup('Match', self.fintech)
+        investor = self.make_investor('investor', self.fintech)
+
+        with mock.patch.object(refresh_recommendations_for_likes_task, 'delay') as delay, \
+                mock.patch('events._publish'), self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(investor=investor, startup=startup)
+        # Only the refresh task is queued; reads already skip the liked startup
+        delay.assert_called_once_with(investor.pk, [startup.id])
+        self.assertTrue(RecommendationCandidate.objects.filter(investor=investor).exists())
+        self.assertEqual(recommend_startup_ids(investor.pk), [])
+
+        refresh_recommendations_for_likes_task(investor.pk, [startup.id])
+        self.assertFalse(RecommendationCandidate.objects.filter(investor=investor).exists())
+
+    def test_deleting_a_tag_matches_rebuild(self):
+        alpha = self.make_startup('Alpha', self.fintech, self.ai)
+        self.make_startup('Beta', self.fintech)
+        ann = self.make_investor('ann', self.fintech)
+        self.make_investor('bob', self.fintech, self.ai)
+        with self.refreshing_likes():
+            Like.objects.create(investor=ann, startup=alpha)
+
+        self.fintech.delete()
+
+        incremental = self.state()
+        self.assertFalse(RecommendationCandidate.objects.filter(investor=ann).exists())
+        rebuild()
+        self.assertEqual(self.state(), incremental)
+
+    def test_reactivating_a_startup_restores_its_candidates(self):
+        startup = self.make_startup('Match', self.fintech, is_active=False)
+        investor = self.make_investor('investor', self.fintech)
+        self.assertFalse(RecommendationCandidate.objects.exists())
+
+        startup.is_active = True
+        startup.save()
+
+        self.assertEqual(
+            list(RecommendationCandidate.objects.values_list('investor_id', 'startup_id')), [(investor.pk, startup.id)]
+        )
+
+    def test_rebuild_without_scores(self):
+        self.make_startup('Alpha')
+        self.make_investor('investor')
+
+        self.assertEqual(rebuild(), (0, 0))
+        self.assertEqual(self.state(), (set(), set()))
+
+    def test_cache_outage_does_not_break_writes(self):
+        startup = self.make_startup('Match', self.fintech)
+        investor = self.make_investor('investor', self.fintech)
+        broken = mock.Mock()
+        for method in ('get', 'set', 'add', 'incr', 'get_or_set', 'delete_many'):
+            getattr(broken, method).side_effect = ConnectionError
+        with mock.patch('startups.caching.cache', broken), mock.patch('investors.recommendations.cache', broken), \
+                self.assertLogs(level='WARNING'):
+            newer = self.make_startup('Newer')
+            Like.objects.create(investor=investor, startup=startup)
+
+            self.assertEqual(recommend_startup_ids(investor.pk), [newer.id])
+
+
+@use_locmem_cache
+class LikesCountTests(InvestorFixturesMixin, TestCase):
+
+    def setUp(self):
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.startup = self.make_startup('Acme')
+
+    def likes_count(self):
+        return Startup.objects.values_list('likes_count', flat=True).get(pk=self.startup.pk)
+
+    def test_likes_move_the_counter(self):
+        like = Like.objects.create(investor=self.make_investor('ann'), startup=self.startup)
+        Like.objects.create(investor=self.make_investor('bob'), startup=self.startup)
+        self.assertEqual(self.likes_count(), 2)
+
+        like.delete()
+        self.assertEqual(self.likes_count(), 1)
+
+    def test_reconcile_fixes_drift(self):
+        Like.objects.create(investor=self.make_investor('ann'), startup=self.startup)
+        untouched = self.make_startup('Other')
+        Startup.objects.filter(pk=self.startup.pk).update(likes_count=7)
+
+        self.assertEqual(reconcile_likes_count(batch_size=1), (2, 1))
+        self.assertEqual(self.likes_count(), 1)
+        untouched.refresh_from_db()
+        self.assertEqual(untouched.likes_count, 0)
+
+
+@use_locmem_cache
+class RecommendationEndpointTests(InvestorFixturesMixin, APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.tag = Tag.objects.create(name='fintech')
+        self.investor = self.make_investor('investor', self.tag)
+        self.client.force_authenticate(self.investor.user)
+
+    def test_liking_a_startup_removes_it_from_recommendations(self):
+        startup = self.make_startup('Match', self.tag)
+        url = reverse('investor-recommendations')
+
+        self.assertEqual([row['id'] for row in self.client.get(url).data], [startup.id])
+
+        self.client.post(reverse('startup-like', args=[startup.id]))
+        self.assertEqual(self.client.get(url).data, [])
+
+    def test_tag_changes_reorder_cached_recommendations(self):
+        older = self.make_startup('Older')
+        newer = self.make_startup('Newer')
+        url = reverse('investor-recommendations')
+        self.assertEqual([row['id'] for row in self.client.get(url).data], [newer.id, older.id])
+
+        older.tags.add(self.tag)
+
+        self.assertEqual([row['id'] for row in self.client.get(url).data], [older.id, newer.id])
+
+
+@use_locmem_cache
+class BulkLikeTests(InvestorFixturesMixin, APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.tag = Tag.objects.create(name='fintech')
+        self.investor = self.make_investor('investor', self.tag)
+        self.client.force_authenticate(self.investor.user)
+        self.startups = [self.make_startup(f'Startup {i}', self.tag) for i in range(4)]
+        self.url = reverse('investor-likes')
+
+    def test_likes_and_unlikes_idempotently(self):
+        first, second, third, fourth = (startup.id for startup in self.startups)
+        Like.objects.create(investor=self.investor, startup_id=third)
+
+        for _ in range(2):
+            with self.refreshing_likes():
+                response = self.client.post(self.url, {'like': [first, second], 'unlike': [third, fourth]}, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['results'], [
+                {'startup_id': first, 'liked': True}, {'startup_id': second, 'liked': True},
+                {'startup_id': third, 'liked': False}, {'startup_id': fourth, 'liked': False},
+            ])
+
+        self.assertEqual(set(self.investor.likes.values_list('startup_id', flat=True)), {first, second})
+        self.assertEqual(
+            dict(Startup.objects.values_list('id', 'likes_count')), {first: 1, second: 1, third: 0, fourth: 0}
+        )
+        self.assertEqual(
+            set(RecommendationCandidate.objects.values_list('startup_id', flat=True)), {third, fourth}
+        )
+
+    def test_unknown_ids_change_nothing(self):
+        response = self.client.post(self.url, {'like': [self.startups[0].id, 999999]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['startup_ids'], [999999])
+        self.assertFalse(Like.objects.exists())
+
+    def test_profile_lists_liked_startups(self):
+        self.client.post(self.url, {'like': [self.startups[1].id]}, format='json')
+
+        response = self.client.get(reverse('investor-profile-me'))
 
-# Create your tests here.
+        self.assertEqual([row['id'] for row in response.data['liked_startups']], [self.startups[1].id])
@@ -12,5 +12,6 @@ from . import views
 urlpatterns = [
     path('investor/profile/me/', views.InvestorProfileViewSet.as_view({'get': 'me', 'put': 'me'}), name='investor-profile-me'),
     path('investor/recommendations/', views.InvestorProfileViewSet.as_view({'get': 'get_recommendations'}), name='investor-recommendations'),
+    path('investor/likes/', views.InvestorProfileViewSet.as_view({'post': 'bulk_likes'}), name='investor-likes'),
     path('startups/<int:pk>/like/', views.InvestorProfileViewSet.as_view({'post': 'like_startup'}), name='startup-like'),
 ]
\ No newline at end of file
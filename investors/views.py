@@ -4,8 +4,10 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
+from .likes import set_likes
 from .models import InvestorProfile
-from .serializers import InvestorProfileSerializer
+from .recommendations import recommend_startup_ids
+from .serializers import BulkLikeSerializer, InvestorProfileSerializer
 from startups.models import Startup
 from startups.serializers import StartupListSerializer
 
@@ -32,22 +34,14 @@ class InvestorProfileViewSet(viewsets.GenericViewSet):
     @action(detail=False, methods=['get'], url_path='recommendations')
     def get_recommendations(self, request):
         """
-        Get startup recommendations based on investor's interested tags.
+        Get startup recommendations ranked by tag overlap with the investor's
+        interests and by co-likes from other investors (see recommendations.py).
         """
         profile = get_object_or_404(InvestorProfile, user=request.user)
-        interested_tags = profile.interested_in_tags.all()
-        liked_startup_ids = profile.liked_startups.values_list('id', flat=True)
+        startup_ids = recommend_startup_ids(profile.pk)
 
-        if not interested_tags.exists():
-            # If no interests, recommend the newest startups they haven't liked
-            recommended_startups = Startup.objects.exclude(id__in=liked_startup_ids)[:10]
-        else:
-            # Recommend startups with matching tags that they haven't liked
-            recommended_startups = Startup.objects.filter(
-                tags__in=interested_tags
-            ).exclude(
-                id__in=liked_startup_ids
-            ).distinct()[:10]
+        startups = Startup.objects.filter(id__in=startup_ids).select_related('founder').prefetch_related('tags').in_bulk()
+        recommended_startups = [startups[startup_id] for startup_id in startup_ids if startup_id in startups]
 
         serializer = StartupListSerializer(recommended_startups, many=True)
         return Response(serializer.data)
@@ -58,7 +52,27 @@ class InvestorProfileViewSet(viewsets.GenericViewSet):
         Like a startup. The 'pk' in the URL is the startup's ID.
         """
         profile = get_object_or_404(InvestorProfile, user=request.user)
-        startup_to_like = get_object_or_404(Startup, pk=pk)
-        
-        profile.liked_startups.add(startup_to_like)
-        return Response({'status': 'startup liked'}, status=status.HTTP_200_OK)
\ No newline at end of file
+        _, missing = set_likes(profile, like_ids=[int(pk)])
+        if missing:
+            return Response({'error': 'Startup not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'status': 'startup liked'}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='likes')
+    def bulk_likes(self, request):
+        """
+        Like and unlike many startups at once:
+          {"like": [1, 2], "unlike": [3]}
+        Safe to repeat. Returns the resulting state of every requested id:
+          {"results": [{"startup_id": 1, "liked": true}, ...]}
+        """
+        profile = get_object_or_404(InvestorProfile, user=request.user)
+        serializer = BulkLikeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        state, missing = set_likes(profile, serializer.validated_data['like'], serializer.validated_data['unlike'])
+        if missing:
+            return Response(
+                {'error': 'These startups do not exist.', 'startup_ids': missing},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'results': [{'startup_id': startup_id, 'liked': liked} for startup_id, liked in state.items()]})
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""
+Prometheus metrics for the web and worker processes, served at /metrics.
+
+Recorded as things happen (no database access):
+
+    agent_request_duration_seconds   histogram per agent setting, URL and outcome
+    agent_requests_rejected_total    calls refused locally (circuit open, at capacity)
+    celery_task_duration_seconds     histogram per task name and final state
+    celery_task_retries_total        retries per task name
+    http_request_duration_seconds    histogram per DRF route name, action, method
+                                     and status class
+    pdf_render_queue_seconds         wait for a PDF pool worker (startups/pdf_pool.py)
+    pdf_render_duration_seconds      PDF render time in a pool worker
+    pdf_render_rejected_total        PDF renders refused because the pool was full
+
+Collected when /metrics is scraped:
+
+    analysis_reports                 AnalysisReport rows per status (one query)
+    celery_queue_length              messages waiting per Celery queue
+    cache_requests_total             hits, stale hits and misses of the caching.py caches
+                                     and the analysis report cache
+
+With several processes (gunicorn workers, Celery prefork children), set
+PROMETHEUS_MULTIPROC_DIR to an empty directory shared by all of them, and
+cleared on deploy, before they start. Every process then writes its samples
+there and /metrics aggregates them; without it each process reports only
+its own.
+"""
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery import current_app
+from celery.signals import task_postrun, task_prerun, task_retry
+from django.conf import settings
+from django.db.models import Count
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CollectorRegistry, CONTENT_TYPE_LATEST, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# Agent calls and Celery tasks run for seconds to minutes
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+AGENT_LATENCY = Histogram(
+    'agent_request_duration_seconds', 'Latency of calls to the external AI agents.',
+    ['agent', 'url', 'outcome'], buckets=SLOW_BUCKETS,
+)
+AGENT_REJECTED = Counter(
+    'agent_requests_rejected_total', 'Agent calls refused without reaching the agent.', ['agent'],
+)
+TASK_DURATION = Histogram(
+    'celery_task_duration_seconds', 'Run time of Celery tasks.', ['task', 'state'], buckets=SLOW_BUCKETS,
+)
+TASK_RETRIES = Counter('celery_task_retries_total', 'Celery task retries.', ['task'])
+PDF_RENDER_QUEUE = Histogram(
+    'pdf_render_queue_seconds', 'Time PDF renders wait for a pool worker.', buckets=SLOW_BUCKETS,
+)
+PDF_RENDER_DURATION = Histogram(
+    'pdf_render_duration_seconds', 'Time a pool worker spends rendering a PDF.', buckets=SLOW_BUCKETS,
+)
+PDF_RENDER_REJECTED = Counter('pdf_render_rejected_total', 'PDF renders refused because the pool was full.')
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Latency of API requests.', ['route', 'action', 'method', 'status'],
+)
+
+# Seconds to wait for the broker when counting queued messages
+QUEUE_CONNECT_TIMEOUT = 2
+
+# Caches whose caching.stats counters are exported
+CACHE_NAMES = ('startup-listings', 'startup-facets', 'analysis-reports')
+
+
+def observe_agent_call(agent, url, seconds, failed):
+    AGENT_LATENCY.labels(agent, url, 'error' if failed else 'ok').observe(seconds)
+
+
+def count_agent_rejection(agent):
+    AGENT_REJECTED.labels(agent).inc()
+
+
+def observe_pdf_render(queue_seconds, render_seconds):
+    PDF_RENDER_QUEUE.observe(queue_seconds)
+    PDF_RENDER_DURATION.observe(render_seconds)
+
+
+def count_pdf_render_rejection():
+    PDF_RENDER_REJECTED.inc()
+
+
+# Celery -------------------------------------------------------------------
+
+_task_started = {}
+
+
+@task_prerun.connect
+def task_started(task_id=None, **kwargs):
+    _task_started[task_id] = time.monotonic()
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None and task is not None:
+        TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.monotonic() - started)
+
+
+@task_retry.connect
+def task_retried(sender=None, **kwargs):
+    if sender is not None:
+        TASK_RETRIES.labels(sender.name).inc()
+
+
+# Requests -----------------------------------------------------------------
+
+class RequestMetricsMiddleware:
+    """Times every request, labelled by the route name and DRF action that served it."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Routers map each HTTP method of a route to a viewset action
+        actions = getattr(view_func, 'actions', None) or {}
+        request._metrics_action = actions.get(request.method.lower(), '')
+
+    @staticmethod
+    def _observe(request, response, started):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            # Unrouted paths (404s, scanners) would blow up the label set
+            route = 'unmatched'
+        else:
+            route = match.view_name
+        REQUEST_LATENCY.labels(
+            route, getattr(request, '_metrics_action', ''), request.method, f'{response.status_code // 100}xx'
+        ).observe(time.perf_counter() - started)
+
+
+# Scrape-time collectors ---------------------------------------------------
+
+class PipelineCollector:
+    """State that is read from the database, the broker and the cache at scrape time."""
+
+    def collect(self):
+        yield self._reports()
+        queues = self._queues()
+        if queues is not None:
+            yield queues
+        yield self._caches()
+
+    @staticmethod
+    def _reports():
+        from startups.models import AnalysisReport
+
+        family = GaugeMetricFamily('analysis_reports', 'AnalysisReport rows per status.', labels=['status'])
+        counts = dict.fromkeys(AnalysisReport.Status.values, 0)
+        for row in AnalysisReport.objects.order_by().values('status').annotate(count=Count('pk')):
+            counts[row['status']] = row['count']
+        for status, count in counts.items():
+            family.add_metric([status], count)
+        return family
+
+    @staticmethod
+    def _queues():
+        app = current_app
+        names = {app.conf.task_default_queue}
+        names.update(route['queue'] for route in getattr(settings, 'CELERY_TASK_ROUTES', {}).values() if 'queue' in route)
+        family = GaugeMetricFamily('celery_queue_length', 'Messages waiting in a Celery queue.', labels=['queue'])
+        try:
+            with app.connection_for_read(connect_timeout=QUEUE_CONNECT_TIMEOUT) as connection:
+                connection.ensure_connection(max_retries=1)
+                for name in sorted(names):
+                    try:
+                        # A fresh channel per queue: a failed passive declare closes it
+                        with connection.channel() as channel:
+                            family.add_metric([name], channel.queue_declare(queue=name, passive=True).message_count)
+                    except connection.channel_errors:
+                        pass  # Not declared yet: no worker has consumed from it
+        except Exception:
+            # Broker down; report nothing rather than failing the scrape
+            return None
+        return family
+
+    @staticmethod
+    def _caches():
+        from startups import caching
+
+        family = CounterMetricFamily(
+            'cache_requests', 'Lookups in the application caches.', labels=['cache', 'result']
+        )
+        for name in CACHE_NAMES:
+            stats = caching.stats(name)
+            for result in ('hits', 'stale', 'misses'):
+                family.add_metric([name, result], stats[result])
+        return family
+
+
+def registry():
+    collected = CollectorRegistry()
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        MultiProcessCollector(collected)
+    else:
+        collected.register(_DefaultRegistry())
+    collected.register(PipelineCollector())
+    return collected
+
+
+class _DefaultRegistry:
+    """Re-exports this process's own metrics into a per-scrape registry."""
+
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def metrics_view(request):
+    """Prometheus text format. Requires `Authorization: Bearer <METRICS_TOKEN>` when that setting is set."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
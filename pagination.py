@@ -0,0 +1,163 @@
+import json
+import operator
+from functools import reduce
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import Cursor, CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created_at, id), newest first.
+    Each page is a range scan on the matching composite index, so deep pages
+    cost the same as the first one and clients can resume from a cursor.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SelectableCursorPagination(CreatedAtCursorPagination):
+    """
+    Lets clients pick one of the view's `cursor_orderings` by name with
+    `?ordering=<name>`. Each ordering must end in unique columns and should
+    match an index.
+
+    DRF's CursorPagination keeps only the first ordering column in the cursor
+    and steps over rows that tie on it with an offset, which it caps at
+    `offset_cutoff`. Past that many ties, as on `likes_count`, pages repeat
+    forever. Here the cursor holds the values of every ordering column, and a
+    page is the rows strictly after that tuple, so pages never overlap
+    however many rows tie or move while a client scrolls.
+    """
+    ordering_query_param = 'ordering'
+
+    def get_ordering(self, request, queryset, view):
+        name = request.query_params.get(self.ordering_query_param)
+        if name is None:
+            return self.ordering
+        try:
+            return view.cursor_orderings[name]
+        except KeyError:
+            raise ValidationError({self.ordering_query_param: f"Must be one of: {', '.join(view.cursor_orderings)}."})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        # A previous page is read backwards from the cursor, then put back in order
+        ordering = [_flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(_after(ordering, self._decode_position(queryset.model, self.cursor.position)))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        if (self.has_next or self.has_previous) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._encode_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._encode_position(self.page[0])))
+
+    def _encode_position(self, instance):
+        # str() keeps the microseconds of datetimes, which the JSON encoders drop
+        return json.dumps([getattr(instance, field.lstrip('-')) for field in self.ordering], default=str)
+
+    def _decode_position(self, model, position):
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError(position)
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _after(ordering, values):
+    """Rows that come strictly after `values` in `ordering`, compared column by column."""
+    clauses = []
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        ties = {earlier.lstrip('-'): value for earlier, value in zip(ordering[:i], values[:i])}
+        clauses.append(Q(**ties, **{f"{name}__{'lt' if field.startswith('-') else 'gt'}": values[i]}))
+    return reduce(operator.or_, clauses)
+
+
+class ChatMessageCursorPagination(CreatedAtCursorPagination):
+    """
+    Newest messages first, for scrolling back through a conversation. With
+    `?after=<id>` the view keeps only newer messages, and they come oldest
+    first so a client can append them in order.
+    """
+    page_size = 50
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        if 'after' in request.query_params:
+            return ('created_at', 'id')
+        return self.ordering
+
+
+class RankedResultsPagination(LimitOffsetPagination):
+    """
+    Limit/offset pages over ranked results, which have no column to keep a
+    cursor on. `paginate_results` fetches one extra row to tell whether there
+    is a next page, so no count query is run.
+    """
+    default_limit = 20
+    max_limit = 100
+
+    def paginate_results(self, fetch, request):
+        """`fetch(limit, offset)` returns the rows of one window of the ranking."""
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        rows = fetch(self.limit + 1, self.offset)
+        self.has_next = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
@@ -0,0 +1,200 @@
+"""
+Per-request timing of the phases that make an endpoint slow.
+
+`ServerTimingMiddleware` measures, for a sample of requests:
+
+    db      SQL queries, on every connection (execute wrappers)
+    agent   calls to the external AI agents (agent_client.py)
+    pdf     WeasyPrint rendering (startups/pdf.py)
+    render  rendering the DRF response body
+    app     everything else: view code, serializers, auth, middleware
+    total   the whole request
+
+and reports them in a `Server-Timing` header, which browser dev tools show
+next to the request. Requests slower than SLOW_REQUEST_MS are also logged
+as one structured record on the `server_timing` logger.
+
+Code marks a phase with `with server_timing.phase('agent'): ...`; outside a
+sampled request that is a single context variable read. Only SAMPLE_RATE of
+the requests are measured (see SERVER_TIMING in settings), and requests that
+are not sampled pay nothing else. For streaming responses the timings cover
+the work done until the response starts, not the streamed body.
+"""
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SAMPLE_RATE': 1.0,
+    'SLOW_REQUEST_MS': 1000,
+    'HEADER': True,
+}
+
+# Measured phases in header order; 'app' and 'total' are derived
+PHASES = ('db', 'agent', 'pdf', 'render')
+
+_current = ContextVar('server_timing', default=None)
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'SERVER_TIMING', {})}
+
+
+class Timings:
+    """Accumulated seconds and counts per phase for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    def add(self, name, seconds):
+        entry = self.phases.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def summary(self):
+        """{phase: (milliseconds, count)}, with the derived app and total phases."""
+        total = time.perf_counter() - self.started
+        result = {name: (self.phases[name][0] * 1000, self.phases[name][1]) for name in PHASES if name in self.phases}
+        result['app'] = (max(total - sum(self.phases[name][0] for name in result), 0) * 1000, 1)
+        result['total'] = (total * 1000, 1)
+        return result
+
+
+@contextmanager
+def phase(name):
+    """Adds the time spent in the block to `name` if the current request is sampled."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def _time_query(execute, sql, params, many, context):
+    with phase('db'):
+        return execute(sql, params, many, context)
+
+
+def _instrument(connection):
+    # The wrapper stays installed; it costs one context variable read per query
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    _instrument(connection)
+
+
+def format_header(summary):
+    entries = []
+    for name, (milliseconds, count) in summary.items():
+        entry = f'{name};dur={milliseconds:.1f}'
+        if name in PHASES:
+            entry += f';desc="{count}x"'
+        entries.append(entry)
+    return ', '.join(entries)
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        options = get_options()
+        if not self._sampled(options):
+            return self.get_response(request)
+        token = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            timings = _current.get()
+            _current.reset(token)
+        return self._finish(request, response, timings, options)
+
+    async def __acall__(self, request):
+        options = get_options()
+        if not self._sampled(options):
+            return await self.get_response(request)
+        token = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings = _current.get()
+            _current.reset(token)
+        return self._finish(request, response, timings, options)
+
+    def process_template_response(self, request, response):
+        timings = _current.get()
+        if timings is not None:
+            # The handler renders the response right after this hook returns
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: timings.add('render', time.perf_counter() - started))
+        return response
+
+    @staticmethod
+    def _sampled(options):
+        return options['SAMPLE_RATE'] >= 1 or random.random() < options['SAMPLE_RATE']
+
+    @staticmethod
+    def _start():
+        # Connections opened later in other threads are instrumented by the signal
+        for connection in connections.all(initialized_only=True):
+            _instrument(connection)
+        return _current.set(Timings())
+
+    @staticmethod
+    def _finish(request, response, timings, options):
+        summary = timings.summary()
+        if options['HEADER']:
+            response['Server-Timing'] = format_header(summary)
+        total_ms = summary['total'][0]
+        if options['SLOW_REQUEST_MS'] is not None and total_ms >= options['SLOW_REQUEST_MS']:
+            match = getattr(request, 'resolver_match', None)
+            record = {
+                'method': request.method,
+                'path': request.path,
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+                'user_id': _user_id(request),
+                'total_ms': round(total_ms, 1),
+                'phases': {
+                    name: {'ms': round(milliseconds, 1), 'count': count}
+                    for name, (milliseconds, count) in summary.items() if name != 'total'
+                },
+            }
+            logger.warning("Slow request %s %s took %.0f ms", request.method, request.path, total_ms,
+                           extra={'server_timing': record})
+        return response
+
+
+def _user_id(request):
+    user = getattr(request, 'user', None)
+    # Don't trigger a session lookup (a query, and not allowed in async code) just to log it
+    if user is None or (isinstance(user, SimpleLazyObject) and user._wrapped is empty):
+        return None
+    return user.pk if user.is_authenticated else None
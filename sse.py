@@ -0,0 +1,31 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+def format_event(data, event=None):
+    """
+    Encodes one Server-Sent Event. `data` is sent as JSON on a single
+    `data:` line, so it never needs multi-line framing.
+    """
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets streaming endpoints accept `Accept: text/event-stream`. Streaming
+    views return their own StreamingHttpResponse; this renderer only handles
+    the ordinary Responses those views produce, e.g. validation errors.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = renderer_context.get('response') if renderer_context else None
+        event = 'error' if response is not None and response.status_code >= 400 else None
+        return format_event(data, event=event).encode(self.charset)
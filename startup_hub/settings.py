@@ -54,6 +54,8 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'metrics.RequestMetricsMiddleware',
+    'server_timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
@@ -66,16 +68,35 @@ MIDDLEWARE = [
 ]
 AUTH_USER_MODEL = 'users.User'
 
+# When set, /metrics (metrics.py) requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = None
+
+# Server-Timing header and slow-request log (server_timing.py). Lower
+# SAMPLE_RATE under production load; unsampled requests are not measured.
+SERVER_TIMING = {
+    'SAMPLE_RATE': 1.0,
+    'SLOW_REQUEST_MS': 1000,
+    'HEADER': True,
+}
+
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ]
 }
 
+# Resolved tokens are cached in Redis for TTL seconds and per process for
+# LOCAL_TTL seconds (users/authentication.py); logout and user saves drop them
+TOKEN_AUTH_CACHE = {
+    'TTL': 5 * 60,
+    'LOCAL_TTL': 30,
+    'LOCAL_SIZE': 1024,
+}
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  
     "http://127.0.0.1:3000",
@@ -156,6 +177,13 @@ CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# Report generation runs long agent calls; keep it on its own queue/workers
+CELERY_TASK_ROUTES = {
+    'startups.tasks.generate_analysis_report_task': {'queue': 'reports'},
+}
+# Exponential backoff (seconds) between retries of a failed report agent call
+REPORT_TASK_RETRY_BACKOFF = 15
+REPORT_TASK_RETRY_BACKOFF_MAX = 600
 
 # Django cache settings 
 CACHES = {
@@ -169,12 +197,75 @@ CACHES = {
 }
 
 
+# Live per-user event streams (events.py): events fan out through Redis pub/sub
+EVENTS = {
+    'REDIS_URL': 'redis://127.0.0.1:6379/2',
+    'HEARTBEAT': 15,
+}
+
+
+# Investor recommendation weights and cache lifetimes (investors/recommendations.py).
+# Scores are stored precomputed: run `manage.py rebuild_recommendations` after changing a weight.
+RECOMMENDATIONS = {
+    'TAG_WEIGHT': 1.0,
+    'COLIKE_WEIGHT': 0.5,
+    'RESULT_TTL': 300,
+    'LIMIT': 10,
+}
+
+# Batch description generation (startups/description_batch.py): CONCURRENCY caps the
+# agent calls one batch has in flight
+DESCRIPTION_BATCH = {
+    'CONCURRENCY': 4,
+    'MAX_ITEMS': 500,
+    'ATTEMPTS': 2,
+}
+
+# Response cache for the startup and tag lists (startups/list_cache.py); entries are
+# fresh for TTL seconds and served stale for STALE_TTL more while one request recomputes
+LIST_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'TTL': 5 * 60,
+    'STALE_TTL': 60,
+}
+
+# How long per-tag/per-year startup counts are cached; writes to startups or tags invalidate them sooner
+STARTUP_FACETS_CACHE_TTL = 10 * 60
+
+# Result cache for analysis reports, keyed by normalized query (startups/report_cache.py)
+ANALYSIS_REPORT_CACHE = {
+    'ENABLED': True,
+    'TTL': 24 * 60 * 60,
+    'MAX_ENTRIES': 1000,
+}
+
+
 STATIC_URL = 'static/'
 
 CHATBOT_AGENT_URL = "http://localhost:5000/startup"
 AI_AGENT_URL = "http://localhost:5000/startup_advisor"
 DESCRIPTION_AGENT_URL = "http://localhost:5000/description"
 
+# Per-agent policy for the shared agent client (agent_client.py); unset keys use its DEFAULTS
+AGENT_CLIENTS = {
+    'CHATBOT_AGENT_URL': {'timeout': 60, 'max_concurrency': 200},
+    'AI_AGENT_URL': {'timeout': 300, 'max_concurrency': 4},
+    'DESCRIPTION_AGENT_URL': {'timeout': 90, 'max_concurrency': 8},
+}
+
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Content-addressed store for rendered analysis report PDFs (see startups/pdf.py)
+REPORT_PDF_CACHE_DIR = BASE_DIR / 'report_pdf_cache'
+REPORT_PDF_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Process pool that renders PDFs for downloads not yet in the store (see startups/pdf_pool.py).
+# Per web process: WORKERS renders at once, MAX_QUEUED more may wait, the rest get a 503.
+PDF_RENDER_POOL = {
+    'WORKERS': 2,
+    'MAX_QUEUED': 4,
+    'TIMEOUT': 60,  # seconds per render
+    'MEMORY_LIMIT_MB': 1024,  # address space cap of each worker
+}
@@ -1,14 +1,20 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from events import event_stream
+from metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Prometheus scrape endpoint
+    path('metrics', metrics_view, name='metrics'),
     # authentification endpoints
     path('api/auth/', include('dj_rest_auth.urls')),
     # Registration endpoint 
     path('api/auth/registration/', include('dj_rest_auth.registration.urls')),
     
     # Our app's API endpoints
+    path('api/events/', event_stream, name='events'),
     path('api/', include('startups.urls')),
     path('api/', include('investors.urls')),
     path('api/chat/', include('chat.urls')), 
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class StartupsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'startups'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        # Connects the Celery task signal handlers in web and worker processes
+        import metrics  # noqa: F401
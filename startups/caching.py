@@ -0,0 +1,151 @@
+"""
+Generation-based invalidation for cached query results.
+
+Rather than tracking down every cached entry derived from some data, each kind
+of data has a generation counter in the default cache that is part of the
+entry keys. Writers bump the counter; entries under the old generation are
+never read again and expire on their own.
+
+`get_or_compute` adds stampede protection and hit/miss counters on top;
+caches with their own lookup logic can keep the same counters with `count`.
+Like report_cache.py, this is best effort: when the cache backend is down,
+`make_key` returns None and callers compute the result uncached.
+"""
+import hashlib
+import json
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+GENERATION_PREFIX = 'generation:'
+LOCK_PREFIX = 'lock:'
+STATS_PREFIX = 'cache-stats:'
+
+
+def get_generation(name):
+    return cache.get_or_set(GENERATION_PREFIX + name, 1, timeout=None)
+
+
+def peek_generation(name):
+    """The current generation of `name`, or None when the cache is unavailable."""
+    try:
+        return get_generation(name)
+    except Exception:
+        logger.warning("Cache is unavailable; no %s generation.", name, exc_info=True)
+        return None
+
+
+def bump_generation(name):
+    key = GENERATION_PREFIX + name
+    try:
+        # cache.add creates the counter only if missing, so incr never sees a missing key
+        cache.add(key, 1, timeout=None)
+        cache.incr(key)
+    except Exception:
+        logger.warning("Cache is unavailable; could not invalidate %s entries.", name, exc_info=True)
+
+
+def make_key(name, *parts):
+    """A cache key for `parts` (any JSON-serializable values) under the current generation of `name`."""
+    generation = peek_generation(name)
+    if generation is None:
+        return None
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f'{name}:{generation}:{digest}'
+
+
+def get_or_compute(name, parts, compute, timeout, stale_timeout=60, lock_timeout=10, wait=2.0):
+    """
+    Returns the cached value for `parts`, computing and storing it on a miss.
+
+    Entries are fresh for `timeout` seconds and then kept `stale_timeout`
+    longer. When an entry goes stale, the first caller to take the entry's
+    lock recomputes it while everyone else keeps getting the stale value, so
+    an expiry costs one recompute rather than one per concurrent request.
+    On a cold miss the callers without the lock poll for up to `wait`
+    seconds for the lock holder's result before computing it themselves.
+    Hits, stale hits and misses are counted per name (see `stats`).
+    """
+    key = make_key(name, *parts)
+    if key is None:
+        return compute()
+    entry = _get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until:
+            count(name, 'hits')
+            return value
+        if not _lock(key, lock_timeout):
+            count(name, 'stale')
+            return value
+    elif not _lock(key, lock_timeout):
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = _get(key)
+            if entry is not None:
+                count(name, 'hits')
+                return entry[0]
+
+    count(name, 'misses')
+    try:
+        value = compute()
+        _set(key, (value, time.time() + timeout), timeout + stale_timeout)
+    finally:
+        _unlock(key)
+    return value
+
+
+def stats(name):
+    """Aggregate hits, stale hits and misses of get_or_compute for `name`."""
+    keys = {kind: f'{STATS_PREFIX}{name}:{kind}' for kind in ('hits', 'stale', 'misses')}
+    try:
+        counts = cache.get_many(list(keys.values()))
+    except Exception:
+        counts = {}
+    result = {kind: counts.get(key, 0) for kind, key in keys.items()}
+    total = sum(result.values())
+    result['hit_rate'] = (result['hits'] + result['stale']) / total if total else None
+    return result
+
+
+def _get(key):
+    try:
+        return cache.get(key)
+    except Exception:
+        return None
+
+
+def _set(key, value, timeout):
+    try:
+        cache.set(key, value, timeout)
+    except Exception:
+        logger.warning("Cache is unavailable; %s not stored.", key, exc_info=True)
+
+
+def _lock(key, timeout):
+    try:
+        return cache.add(LOCK_PREFIX + key, 1, timeout)
+    except Exception:
+        # Without a cache there is nothing to coordinate on; just compute
+        return True
+
+
+def _unlock(key):
+    try:
+        cache.delete(LOCK_PREFIX + key)
+    except Exception:
+        pass
+
+
+def count(name, kind):
+    key = f'{STATS_PREFIX}{name}:{kind}'
+    try:
+        # cache.add creates the counter only if missing, so incr never sees a missing key
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except Exception:
+        pass
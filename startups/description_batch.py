@@ -0,0 +1,101 @@
+"""
+Batch AI description generation.
+
+A batch is stored as a DescriptionBatchJob with one DescriptionBatchItem per
+startup. Its items are dealt round-robin into at most CONCURRENCY slices, and
+the slices run as a Celery group of `generate_description_chunk_task`s, each
+calling the description agent for one item at a time. However large the
+batch, it never has more than CONCURRENCY calls in flight against
+DESCRIPTION_AGENT_URL (the agent client's own pool limit still applies on top).
+
+A network error is retried ATTEMPTS times with exponential backoff before the
+item is marked FAILED with the error; one failed item never fails the job.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from celery import group
+
+import events
+from . import search
+from .models import DescriptionBatchItem, DescriptionBatchJob, Startup
+
+DEFAULTS = {
+    'CONCURRENCY': 4,
+    'MAX_ITEMS': 500,
+    'ATTEMPTS': 2,
+    'RETRY_BACKOFF': 5,
+    'RETRY_BACKOFF_MAX': 60,
+    'FLUSH_EVERY': 10,
+}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'DESCRIPTION_BATCH', {})}
+
+
+def create_job(user, prompts):
+    """
+    Creates a job for `prompts` ({startup_id: prompt_data}) and starts it once
+    the surrounding transaction commits. Returns the job.
+    """
+    from .tasks import generate_description_chunk_task
+
+    with transaction.atomic():
+        job = DescriptionBatchJob.objects.create(user=user)
+        DescriptionBatchItem.objects.bulk_create([
+            DescriptionBatchItem(job=job, startup_id=startup_id, prompt_data=prompt_data)
+            for startup_id, prompt_data in prompts.items()
+        ])
+        item_ids = list(job.items.order_by('id').values_list('id', flat=True))
+
+        concurrency = get_options()['CONCURRENCY']
+        chunks = [item_ids[i::concurrency] for i in range(concurrency)]
+        fan_out = group(generate_description_chunk_task.s(str(job.id), chunk) for chunk in chunks if chunk)
+        transaction.on_commit(fan_out.apply_async)
+    return job
+
+
+def save_results(items):
+    """Writes finished items, and the descriptions of the successful ones, in two bulk updates."""
+    if not items:
+        return
+    now = timezone.now()
+    startups = []
+    for item in items:
+        item.updated_at = now
+        if item.status == DescriptionBatchItem.Status.SUCCEEDED:
+            item.startup.updated_at = now
+            startups.append(item.startup)
+    with transaction.atomic():
+        Startup.objects.bulk_update(startups, ['description_long', 'updated_at'])
+        DescriptionBatchItem.objects.bulk_update(items, ['status', 'error_message', 'updated_at'])
+        # bulk_update skips the post_save signal that keeps search current
+        search.reindex([startup.id for startup in startups])
+        for item in items:
+            events.publish(item.startup.founder_id, 'description', {
+                'startup_id': item.startup_id,
+                'status': 'completed' if item.status == DescriptionBatchItem.Status.SUCCEEDED else 'failed',
+                'job_id': str(item.job_id),
+            })
+
+
+def finish_job_if_done(job_id):
+    if DescriptionBatchItem.objects.filter(job_id=job_id, status=DescriptionBatchItem.Status.PENDING).exists():
+        return
+    # Of concurrent slices finishing together, only the one whose update matches announces it
+    if DescriptionBatchJob.objects.filter(pk=job_id, finished_at__isnull=True).update(finished_at=timezone.now()):
+        job = with_progress(DescriptionBatchJob.objects.filter(pk=job_id)).get()
+        events.publish(job.user_id, 'description_job', {
+            'id': str(job.id), 'total': job.total, 'succeeded': job.succeeded, 'failed': job.failed,
+        })
+
+
+def with_progress(jobs):
+    """Annotates a DescriptionBatchJob queryset with per-status item counts."""
+    return jobs.annotate(
+        total=Count('items'),
+        succeeded=Count('items', filter=Q(items__status=DescriptionBatchItem.Status.SUCCEEDED)),
+        failed=Count('items', filter=Q(items__status=DescriptionBatchItem.Status.FAILED)),
+    )
@@ -0,0 +1,100 @@
+"""
+Query-parameter filters for the startup list, and facet counts over them.
+
+    tags=1,4                only startups carrying every one of these tag ids
+    founding_year_min=2015  founded in or after
+    founding_year_max=2020  founded in or before
+    likes_min=10            liked by at least this many investors
+
+The tag filter is a single GROUP BY ... HAVING over the startup/tag join
+table, so it costs one index scan however many tags are asked for, and the
+year range and likes_min are plain range predicates on the (is_active,
+founding_year) and (is_active, likes_count) indexes.
+"""
+from django.conf import settings
+from django.db.models import Count, Value
+from rest_framework import serializers
+
+from . import caching
+from .models import Startup
+
+FACETS_CACHE = 'startup-facets'
+MAX_TAGS = 20
+
+
+class StartupFilterSerializer(serializers.Serializer):
+    tags = serializers.CharField(required=False)
+    founding_year_min = serializers.IntegerField(required=False, min_value=0)
+    founding_year_max = serializers.IntegerField(required=False, min_value=0)
+    likes_min = serializers.IntegerField(required=False, min_value=0)
+
+    def validate_tags(self, value):
+        try:
+            tag_ids = sorted({int(tag_id) for tag_id in value.split(',') if tag_id.strip()})
+        except ValueError:
+            raise serializers.ValidationError("Expected a comma-separated list of tag ids.")
+        if len(tag_ids) > MAX_TAGS:
+            raise serializers.ValidationError(f"At most {MAX_TAGS} tags can be combined.")
+        return tag_ids
+
+
+def parse_filters(query_params):
+    """Validated filters from the request's query parameters; raises ValidationError (400)."""
+    serializer = StartupFilterSerializer(data=query_params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def apply_filters(queryset, filters):
+    tag_ids = filters.get('tags')
+    if tag_ids:
+        with_all_tags = Startup.tags.through.objects.filter(tag_id__in=tag_ids).values('startup_id').annotate(
+            matched=Count('tag_id')
+        ).filter(matched=len(tag_ids)).values('startup_id')
+        queryset = queryset.filter(id__in=with_all_tags)
+    if 'founding_year_min' in filters:
+        queryset = queryset.filter(founding_year__gte=filters['founding_year_min'])
+    if 'founding_year_max' in filters:
+        queryset = queryset.filter(founding_year__lte=filters['founding_year_max'])
+    if 'likes_min' in filters:
+        queryset = queryset.filter(likes_count__gte=filters['likes_min'])
+    return queryset
+
+
+def facet_counts(queryset):
+    """
+    Per-tag and per-founding-year startup counts over `queryset`, computed
+    with one UNION ALL of two GROUP BYs.
+    """
+    startups = queryset.order_by().values('id')
+    by_tag = Startup.tags.through.objects.filter(startup_id__in=startups).values('tag_id', 'tag__name').annotate(
+        facet=Value('tag'), count=Count('startup_id')
+    ).values_list('facet', 'tag_id', 'tag__name', 'count').order_by()
+    by_year = queryset.order_by().values('founding_year').annotate(
+        facet=Value('founding_year'), label=Value(''), count=Count('id')
+    ).values_list('facet', 'founding_year', 'label', 'count')
+
+    facets = {'tags': [], 'founding_years': []}
+    for facet, key, label, count in by_tag.union(by_year, all=True):
+        if facet == 'tag':
+            facets['tags'].append({'id': key, 'name': label, 'count': count})
+        else:
+            facets['founding_years'].append({'year': key, 'count': count})
+    facets['tags'].sort(key=lambda row: (-row['count'], row['name']))
+    facets['founding_years'].sort(key=lambda row: row['year'])
+    return facets
+
+
+def cached_facet_counts(queryset, filters):
+    """
+    facet_counts() for the active startups matching `filters`, cached until
+    startups or tags change. Likes do not invalidate it, so with likes_min
+    the counts can lag behind by up to STARTUP_FACETS_CACHE_TTL.
+    """
+    return caching.get_or_compute(
+        FACETS_CACHE, [filters], lambda: facet_counts(queryset), settings.STARTUP_FACETS_CACHE_TTL
+    )
+
+
+def invalidate_facets():
+    caching.bump_generation(FACETS_CACHE)
@@ -0,0 +1,75 @@
+"""
+Response cache for the startup and tag listings.
+
+The list pages are the most read endpoints and change rarely, so their
+serialized data is kept in the default cache (Redis), keyed by path, host
+(pagination links are absolute) and the normalized query parameters. The
+content is the same for every authenticated user.
+
+Nothing is ever looked up to be deleted: every write to a Startup, Tag or
+Like bumps the 'startup-listings' generation (signals.py, investors/likes.py)
+and the old entries simply stop being read. Expiry and stampede protection
+are handled by caching.get_or_compute, which also counts hits and misses;
+see `stats()`.
+"""
+from django.conf import settings
+from rest_framework.response import Response
+
+from . import caching
+
+LISTINGS = 'startup-listings'
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TTL': 5 * 60,
+    'STALE_TTL': 60,
+}
+
+
+class _NotCacheable(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def _options():
+    return {**DEFAULTS, **getattr(settings, 'LIST_RESPONSE_CACHE', {})}
+
+
+def normalize_params(query_params):
+    """Sorted (name, sorted values) pairs without empty values, so equivalent URLs share an entry."""
+    return sorted(
+        (name, sorted(value for value in query_params.getlist(name) if value))
+        for name in query_params
+        if any(query_params.getlist(name))
+    )
+
+
+def cached_list(request, build_response):
+    """
+    Returns a Response with the cached data for this request, or calls
+    `build_response()` and caches its data. Only 200 responses are cached.
+    """
+    options = _options()
+    if not options['ENABLED']:
+        return build_response()
+
+    def compute():
+        response = build_response()
+        if response.status_code != 200:
+            raise _NotCacheable(response)
+        return response.data
+
+    parts = [request.path, request.get_host(), normalize_params(request.query_params)]
+    try:
+        data = caching.get_or_compute(LISTINGS, parts, compute, options['TTL'], stale_timeout=options['STALE_TTL'])
+    except _NotCacheable as exc:
+        return exc.response
+    return Response(data)
+
+
+def invalidate():
+    caching.bump_generation(LISTINGS)
+
+
+def stats():
+    return caching.stats(LISTINGS)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('startups', '0006_analysisreport_pdf_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisreport',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, help_text='When the report reached COMPLETED or FAILED.', null=True),
+        ),
+        migrations.AddField(
+            model_name='analysisreport',
+            name='started_at',
+            field=models.DateTimeField(blank=True, help_text='When the agent call first started.', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('startups', '0007_analysisreport_finished_at_analysisreport_started_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisreport',
+            name='served_from_cache',
+            field=models.BooleanField(default=False, help_text='Completed from the report result cache.'),
+        ),
+    ]
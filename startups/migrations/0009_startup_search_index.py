@@ -0,0 +1,46 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE startups_startupsearch USING fts5("
+    "name, tags, description_short, description_long, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO startups_startupsearch (rowid, name, tags, description_short, description_long)"
+    " SELECT s.id, s.name, COALESCE((SELECT group_concat(t.name, ' ') FROM startups_startup_tags st"
+    " JOIN startups_tag t ON t.id = st.tag_id WHERE st.startup_id = s.id), ''),"
+    " s.description_short, s.description_long FROM startups_startup s",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE TABLE startups_startupsearch ("
+    "startup_id bigint PRIMARY KEY REFERENCES startups_startup (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,"
+    " document tsvector NOT NULL)",
+    "CREATE INDEX startups_startupsearch_document_idx ON startups_startupsearch USING gin (document)",
+    "INSERT INTO startups_startupsearch (startup_id, document)"
+    " SELECT s.id, setweight(to_tsvector('simple', s.name), 'A')"
+    " || setweight(to_tsvector('simple', COALESCE((SELECT string_agg(t.name, ' ') FROM startups_startup_tags st"
+    " JOIN startups_tag t ON t.id = st.tag_id WHERE st.startup_id = s.id), '')), 'B')"
+    " || setweight(to_tsvector('simple', s.description_short), 'C')"
+    " || setweight(to_tsvector('simple', s.description_long), 'D') FROM startups_startup s",
+]
+
+FORWARD = {'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}
+
+
+def create_search_index(apps, schema_editor):
+    for statement in FORWARD.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in FORWARD:
+        schema_editor.execute("DROP TABLE IF EXISTS startups_startupsearch")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('startups', '0008_analysisreport_served_from_cache'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('startups', '0009_startup_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='startup',
+            index=models.Index(fields=['is_active', 'founding_year'], name='startup_active_year_idx'),
+        ),
+    ]
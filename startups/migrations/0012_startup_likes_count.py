@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing_likes(apps, schema_editor):
+    Startup = apps.get_model('startups', 'Startup')
+    Like = apps.get_model('investors', 'Like')
+    likes = Like.objects.filter(startup=OuterRef('pk')).order_by().values('startup').annotate(count=Count('pk'))
+    Startup.objects.update(
+        likes_count=Coalesce(Subquery(likes.values('count'), output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('startups', '0011_description_batch_jobs'),
+        ('investors', '0002_remove_investorprofile_liked_startups_like'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='startup',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of Likes, kept up to date by investors/likes.py.'),
+        ),
+        migrations.AddIndex(
+            model_name='startup',
+            index=models.Index(fields=['is_active', '-likes_count', '-created_at', '-id'], name='startup_active_likes_idx'),
+        ),
+        migrations.RunPython(count_existing_likes, migrations.RunPython.noop),
+    ]
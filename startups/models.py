@@ -1,3 +1,5 @@
+import uuid
+
 from django.conf import settings
 from django.db import models
 from users.models import User
@@ -17,11 +19,21 @@ class Startup(models.Model):
     founding_year = models.PositiveIntegerField()
     tags = models.ManyToManyField(Tag, blank=True)
     is_active = models.BooleanField(default=True)
+    likes_count = models.PositiveIntegerField(default=0, editable=False,
+                                              help_text="Number of Likes, kept up to date by investors/likes.py.")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Backs the keyset pagination of the active startup list.
+            models.Index(fields=['is_active', '-created_at', '-id'], name='startup_active_created_idx'),
+            # Backs the founding_year range filter (filters.py).
+            models.Index(fields=['is_active', 'founding_year'], name='startup_active_year_idx'),
+            # Backs ?ordering=popular and the likes_min filter.
+            models.Index(fields=['is_active', '-likes_count', '-created_at', '-id'], name='startup_active_likes_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -54,6 +66,11 @@ class AnalysisReport(models.Model):
         COMPLETED = 'COMPLETED', 'Completed'
         FAILED = 'FAILED', 'Failed'
 
+    class PdfStatus(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        READY = 'READY', 'Ready'
+        FAILED = 'FAILED', 'Failed'
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='analysis_reports')
     initial_query = models.TextField(help_text="The initial prompt from the user.")
     report_content_md = models.TextField(blank=True, null=True, help_text="The generated report in Markdown format.")
@@ -61,6 +78,48 @@ class AnalysisReport(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     error_message = models.TextField(blank=True, null=True, help_text="Details of failure, if any.")
+    started_at = models.DateTimeField(blank=True, null=True, help_text="When the agent call first started.")
+    finished_at = models.DateTimeField(blank=True, null=True, help_text="When the report reached COMPLETED or FAILED.")
+    served_from_cache = models.BooleanField(default=False, help_text="Completed from the report result cache.")
+    pdf_status = models.CharField(max_length=20, choices=PdfStatus.choices, default=PdfStatus.PENDING,
+                                  help_text="State of the pre-rendered PDF for the current content.")
+
+    class Meta:
+        indexes = [
+            # Backs the keyset pagination of a user's reports.
+            models.Index(fields=['user', '-created_at', '-id'], name='report_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Report for {self.user.username} at {self.created_at.strftime('%Y-%m-%d')}"
+
+
+class DescriptionBatchJob(models.Model):
+    """A batch of AI description generations for many startups, tracked as one job."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='description_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True, help_text="When the last item finished.")
+
+    def __str__(self):
+        return f"Description job {self.id} for {self.user.username}"
+
+
+class DescriptionBatchItem(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        SUCCEEDED = 'SUCCEEDED', 'Succeeded'
+        FAILED = 'FAILED', 'Failed'
+
+    job = models.ForeignKey(DescriptionBatchJob, on_delete=models.CASCADE, related_name='items')
+    startup = models.ForeignKey(Startup, on_delete=models.CASCADE, related_name='+')
+    prompt_data = models.TextField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    error_message = models.TextField(blank=True, null=True, help_text="Details of failure, if any.")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('job', 'startup')
 
     def __str__(self):
-        return f"Report for {self.user.username} at {self.created_at.strftime('%Y-%m-%d')}"
\ No newline at end of file
+        return f"Description of {self.startup_id} in job {self.job_id}: {self.status}"
@@ -0,0 +1,284 @@
+"""
+PDF rendering for analysis reports.
+
+Rendered PDFs are kept in a content-addressed file store: the file name is a
+hash of the report markdown plus STYLESHEET_VERSION, so a PDF is rendered once
+per distinct content and an edit to `report_content_md` (or to the stylesheet)
+simply addresses a new entry. Entries that are no longer requested age out of
+the store through LRU eviction once it grows past REPORT_PDF_CACHE_MAX_BYTES.
+"""
+import functools
+import hashlib
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+
+import markdown2
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+
+import server_timing
+
+# Bump whenever REPORT_STYLESHEET changes so that cached PDFs are re-rendered.
+STYLESHEET_VERSION = 1
+
+REPORT_STYLESHEET = """
+@page {
+    margin: 2cm;
+}
+body {
+    font-family: "Segoe UI", "Helvetica Neue", sans-serif;
+    line-height: 1.7;
+    color: #2c3e50;
+    background-color: #fff;
+    padding: 0;
+    margin: 0;
+}
+h1, h2, h3, h4 {
+    color: #1a237e;
+    margin-top: 30px;
+    margin-bottom: 15px;
+}
+p {
+    margin: 12px 0;
+    font-size: 14px;
+}
+ul, ol {
+    padding-left: 25px;
+    margin-bottom: 20px;
+}
+li {
+    margin-bottom: 8px;
+}
+a {
+    color: #0d47a1;
+    text-decoration: none;
+}
+a:hover {
+    text-decoration: underline;
+}
+code {
+    background-color: #f5f5f5;
+    padding: 2px 4px;
+    font-family: monospace;
+    border-radius: 4px;
+}
+pre {
+    background: #f0f0f0;
+    padding: 12px;
+    overflow-x: auto;
+    border-left: 4px solid #2196f3;
+    font-family: Consolas, monospace;
+    border-radius: 6px;
+}
+blockquote {
+    border-left: 4px solid #90caf9;
+    margin: 20px 0;
+    padding: 10px 20px;
+    background: #f9f9f9;
+    font-style: italic;
+    color: #555;
+}
+"""
+
+REPORT_HTML_TEMPLATE = """
+<html>
+<head>
+    <meta charset="utf-8">
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def extract_markdown(report):
+    """
+    Returns the markdown body of a report. The agent stores a JSON document
+    with the markdown under its 'response' key.
+    """
+    # If the field is already a dict, use it directly
+    if isinstance(report.report_content_md, dict):
+        return report.report_content_md.get("response", "")
+    # Otherwise, it's a JSON string and needs decoding
+    parsed = json.loads(report.report_content_md)
+    return parsed.get("response", "")
+
+
+def content_key(report):
+    """The store address of a report's PDF: a hash of its content and the stylesheet version."""
+    content = report.report_content_md
+    if isinstance(content, dict):
+        content = json.dumps(content, sort_keys=True)
+    digest = hashlib.sha256()
+    digest.update(f"stylesheet:{STYLESHEET_VERSION}\n".encode())
+    digest.update((content or "").encode())
+    return digest.hexdigest()
+
+
+def render_report_html(report):
+    """The report as an HTML document; REPORT_STYLESHEET is applied when rendering."""
+    html_content = markdown2.markdown(extract_markdown(report))
+    return REPORT_HTML_TEMPLATE.format(body=html_content)
+
+
+@functools.lru_cache(maxsize=None)
+def report_stylesheet():
+    """REPORT_STYLESHEET parsed, with its font configuration; built once per process and reused."""
+    font_config = FontConfiguration()
+    return CSS(string=REPORT_STYLESHEET, font_config=font_config), font_config
+
+
+def render_html_pdf(html):
+    """Renders report HTML to PDF bytes. This is the expensive WeasyPrint call."""
+    stylesheet, font_config = report_stylesheet()
+    return HTML(string=html).write_pdf(stylesheets=[stylesheet], font_config=font_config)
+
+
+def render_report_pdf(report):
+    """Renders a report to PDF bytes in this process; web requests use pdf_pool instead."""
+    with server_timing.phase('pdf'):
+        return render_html_pdf(render_report_html(report))
+
+
+def _cache_dir():
+    return Path(settings.REPORT_PDF_CACHE_DIR)
+
+
+def cache_path(key):
+    return _cache_dir() / key[:2] / f"{key}.pdf"
+
+
+def get_cached_pdf(key):
+    """
+    Returns the path of a stored PDF, or None. A hit refreshes the file's
+    mtime, which is the recency used by `evict`.
+    """
+    path = cache_path(key)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def store_pdf(key, data):
+    """Atomically writes a rendered PDF into the store and trims the store to size."""
+    path = cache_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    evict()
+    return path
+
+
+def evict(max_bytes=None):
+    """
+    Deletes the least recently used PDFs until the store fits in `max_bytes`
+    (REPORT_PDF_CACHE_MAX_BYTES by default). Returns the number of files removed.
+    """
+    if max_bytes is None:
+        max_bytes = settings.REPORT_PDF_CACHE_MAX_BYTES
+    entries = []
+    total = 0
+    for path in _cache_dir().glob('*/*.pdf'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def get_or_render_pdf(report, key=None):
+    """Returns the path of the report's PDF, rendering and storing it on a miss."""
+    key = key or content_key(report)
+    path = get_cached_pdf(key)
+    if path is None:
+        path = store_pdf(key, render_report_pdf(report))
+    return path
+
+
+def pdf_response(request, path, etag, filename):
+    """
+    Serves a stored PDF with single-range support: a `Range: bytes=...` header
+    gets a 206 with just the requested slice, unless If-Range names another
+    version. Callers answer If-None-Match before getting here, so that a 304
+    never needs the file to exist.
+    """
+    size = path.stat().st_size
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE', '')
+    if range_header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        byte_range = _parse_range(range_header, size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type='application/pdf',
+                                as_attachment=True, filename=filename)
+    else:
+        start, end = byte_range
+        with open(path, 'rb') as pdf_file:
+            pdf_file.seek(start)
+            data = pdf_file.read(end - start + 1)
+        response = HttpResponse(data, status=206, content_type='application/pdf')
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _parse_range(header, size):
+    """
+    Parses a single `bytes=start-end` range. Returns (start, end) inclusive,
+    None when the header should be ignored (e.g. multiple ranges), or False
+    when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes.
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
@@ -0,0 +1,194 @@
+"""
+Bounded pool of processes for PDF renders requested by web requests.
+
+A download whose PDF is not in the store yet would otherwise run WeasyPrint
+in the web worker, where a large report can take seconds and hundreds of MB.
+`render_report_pdf` hands the render to a small process pool instead
+(PDF_RENDER_POOL in settings):
+
+  - WORKERS processes render; each parses the stylesheet and font
+    configuration once, when it starts, and reuses them.
+  - At most WORKERS + MAX_QUEUED renders are in flight per web process.
+    Beyond that the caller gets RenderPoolBusy at once (the view answers
+    503 with Retry-After) instead of tying up a web worker.
+  - Each worker's address space is capped at MEMORY_LIMIT_MB, so a runaway
+    render fails with MemoryError instead of taking the box down, and a
+    render is interrupted after TIMEOUT seconds.
+  - Concurrent requests for the same PDF share one render.
+
+Time spent waiting for a worker and rendering is exported to Prometheus
+(metrics.py). Celery workers keep rendering in their own process
+(tasks.render_report_pdf_task); they are already off the request path.
+"""
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; renders run without a memory cap
+    resource = None
+
+import metrics
+import server_timing
+from . import pdf
+
+DEFAULTS = {
+    'WORKERS': 2,
+    'MAX_QUEUED': 4,
+    'TIMEOUT': 60,
+    'MEMORY_LIMIT_MB': 1024,
+}
+
+# Extra seconds the caller waits beyond TIMEOUT before giving up on a worker
+TIMEOUT_GRACE = 5
+
+# Seconds a client refused with RenderPoolBusy is told to wait (Retry-After)
+RETRY_AFTER = 5
+
+
+class RenderPoolBusy(Exception):
+    """Every render slot of this process is taken; try again shortly."""
+
+
+class RenderTimeout(Exception):
+    """The render took longer than PDF_RENDER_POOL['TIMEOUT']."""
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'PDF_RENDER_POOL', {})}
+
+
+# Worker side --------------------------------------------------------------
+
+_render_timeout = None
+
+
+def _init_worker(memory_limit_mb, timeout):
+    global _render_timeout
+    _render_timeout = timeout
+    if resource is not None and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    pdf.report_stylesheet()
+
+
+def _on_alarm(signum, frame):
+    raise RenderTimeout(f"PDF render took longer than {_render_timeout}s.")
+
+
+def _render(html):
+    """Runs in a worker. Returns (PDF bytes, time.time() the render started)."""
+    started = time.time()
+    signal.signal(signal.SIGALRM, _on_alarm)
+    signal.alarm(_render_timeout)
+    try:
+        return pdf.render_html_pdf(html), started
+    finally:
+        signal.alarm(0)
+
+
+# Web side -----------------------------------------------------------------
+
+class RenderPool:
+
+    def __init__(self, options):
+        self.options = options
+        self._slots = threading.BoundedSemaphore(options['WORKERS'] + options['MAX_QUEUED'])
+        self._executor = None
+        self._inflight = {}  # content key -> Future, for renders callers can share
+        # Reentrant: a future that is already done runs its callback (which locks) right away
+        self._lock = threading.RLock()
+
+    def render(self, key, html):
+        """Returns the PDF bytes for `html`; `key` identifies the content for sharing renders."""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                if not self._slots.acquire(blocking=False):
+                    metrics.count_pdf_render_rejection()
+                    raise RenderPoolBusy("All PDF render slots are busy.")
+                try:
+                    submitted = time.time()
+                    future = self._inflight[key] = self._submit(html)
+                except BaseException:
+                    self._slots.release()
+                    raise
+                future.add_done_callback(lambda done: self._finished(key, done))
+
+        try:
+            data, started = future.result(timeout=self.options['TIMEOUT'] + TIMEOUT_GRACE)
+        except FutureTimeoutError:  # Not the builtin TimeoutError before Python 3.11
+            # The worker ignored its alarm (stuck in native code); replace the pool
+            self._reset(kill=True)
+            raise RenderTimeout(f"PDF render took longer than {self.options['TIMEOUT']}s.")
+        except BrokenProcessPool:
+            # A worker died, e.g. killed for memory; the executor cannot be reused
+            self._reset()
+            raise
+        if owner:
+            metrics.observe_pdf_render(queue_seconds=max(started - submitted, 0), render_seconds=time.time() - started)
+        return data
+
+    def _finished(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        self._slots.release()
+
+    def _submit(self, html):
+        try:
+            return self._get_executor().submit(_render, html)
+        except BrokenProcessPool:
+            # Broken by an earlier crash that no caller was waiting on
+            self._reset()
+            return self._get_executor().submit(_render, html)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.options['WORKERS'],
+                # Forking a threaded web worker is unsafe; start clean interpreters
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.options['MEMORY_LIMIT_MB'], self.options['TIMEOUT']),
+            )
+        return self._executor
+
+    def _reset(self, kill=False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        if kill:
+            for process in list(getattr(executor, '_processes', {}).values()):
+                process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = RenderPool(get_options())
+    return _pool
+
+
+def render_report_pdf(report, key=None):
+    """
+    Renders a report to PDF bytes in the pool. Raises RenderPoolBusy when no
+    slot is free, RenderTimeout, or the render's own error (e.g. MemoryError).
+    """
+    with server_timing.phase('pdf'):
+        return get_pool().render(key or pdf.content_key(report), pdf.render_report_html(report))
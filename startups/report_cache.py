@@ -0,0 +1,118 @@
+"""
+Result cache for analysis reports, keyed by normalized query.
+
+Many users ask the advisor agent the same question with different casing or
+whitespace. The markdown of a finished report is stored in the default cache
+(Redis) under a hash of the normalized query, so a repeat question completes
+immediately instead of costing another multi-minute agent run.
+
+Entries expire after TTL seconds. On Redis the cache is also bounded to
+MAX_ENTRIES: a sorted set next to the entries scores each key by its last
+use. A hit or store updates just that key's score, and once the set grows
+past MAX_ENTRIES the least recently used keys are popped from it (ZPOPMIN,
+so each is evicted by one process only) and their entries deleted. Other
+backends cull entries on their own and keep no index.
+
+Hits and misses are counted with the caching.py counters under the name
+'analysis-reports', and exported with the other caches by metrics.py.
+
+The layer is optional: when it is disabled or the cache backend is down,
+every lookup is a miss and report generation proceeds as usual.
+"""
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from . import caching
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TTL': 24 * 60 * 60,
+    'MAX_ENTRIES': 1000,
+}
+
+NAME = 'analysis-reports'
+KEY_PREFIX = 'analysis-report:'
+INDEX_KEY = 'analysis-report-index'
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _options():
+    return {**DEFAULTS, **getattr(settings, 'ANALYSIS_REPORT_CACHE', {})}
+
+
+def is_enabled():
+    return _options()['ENABLED']
+
+
+def normalize_query(query):
+    """Unicode-normalizes, case-folds and collapses whitespace, so trivially different queries match."""
+    query = unicodedata.normalize('NFKC', query or '')
+    return WHITESPACE_RE.sub(' ', query).strip().casefold()
+
+
+def query_key(query):
+    return KEY_PREFIX + hashlib.sha256(normalize_query(query).encode()).hexdigest()
+
+
+def lookup(query):
+    """Returns the cached report content for `query`, or None. Counts the hit or miss."""
+    if not is_enabled():
+        return None
+    key = query_key(query)
+    try:
+        content = cache.get(key)
+        caching.count(NAME, 'hits' if content is not None else 'misses')
+        if content is not None:
+            _touch(key)
+    except Exception:
+        logger.warning("Analysis report cache is unavailable; treating lookup as a miss.", exc_info=True)
+        return None
+    return content
+
+
+def store(query, content):
+    """Stores a finished report's content for `query`, evicting the least recently used entries."""
+    if not is_enabled() or not content:
+        return
+    key = query_key(query)
+    try:
+        cache.set(key, content, _options()['TTL'])
+        _touch(key)
+    except Exception:
+        logger.warning("Analysis report cache is unavailable; result not cached.", exc_info=True)
+
+
+def _touch(key):
+    """Marks `key` as just used in the index and deletes entries beyond MAX_ENTRIES."""
+    client = _index_client()
+    if client is None:
+        return
+    options = _options()
+    index_key = cache.make_key(INDEX_KEY)
+    pipeline = client.pipeline()
+    pipeline.zadd(index_key, {key: time.time()})
+    pipeline.zcard(index_key)
+    pipeline.expire(index_key, options['TTL'])
+    _, size, _ = pipeline.execute()
+    overflow = size - options['MAX_ENTRIES']
+    if overflow > 0:
+        evicted = client.zpopmin(index_key, overflow)
+        cache.delete_many([member.decode() for member, _ in evicted])
+
+
+def _index_client():
+    """The raw Redis client of the default cache, or None for backends without one."""
+    try:
+        return get_redis_connection('default')
+    except NotImplementedError:
+        return None
@@ -0,0 +1,146 @@
+"""
+Ranked full-text search over startups.
+
+The index lives in the database next to the startups: an FTS5 virtual table
+on SQLite and a tsvector column with a GIN index on PostgreSQL (both created
+by migration 0009). Each startup's name, taglines, long description and tag
+names are indexed, weighted in that order of importance:
+
+    name > tag names > description_short > description_long
+
+Every word of the query is matched as a prefix ("fin" finds "fintech") and all
+words must match. Results are ranked by BM25 on SQLite and by ts_rank_cd on
+PostgreSQL, and come with a snippet of the best matching text in which the
+matches are wrapped in <mark>...</mark> (the rest of the snippet is escaped).
+
+Signals in signals.py keep the index current when a startup is saved or
+deleted, or its tags change. Bulk writes that skip signals (QuerySet.update,
+bulk_update) must call `reindex()` with the affected ids.
+"""
+import re
+
+from django.db import NotSupportedError, connection
+from django.utils.html import escape
+
+TABLE = 'startups_startupsearch'
+TERM_RE = re.compile(r'\w+')
+MAX_TERMS = 16
+
+# Highlight markers the database puts around matches; swapped for <mark> after escaping
+START_MARK, STOP_MARK = '\x02', '\x03'
+
+SQLITE_TAGS = (
+    "COALESCE((SELECT group_concat(t.name, ' ') FROM startups_startup_tags st"
+    " JOIN startups_tag t ON t.id = st.tag_id WHERE st.startup_id = s.id), '')"
+)
+POSTGRES_TAGS = (
+    "COALESCE((SELECT string_agg(t.name, ' ') FROM startups_startup_tags st"
+    " JOIN startups_tag t ON t.id = st.tag_id WHERE st.startup_id = s.id), '')"
+)
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('simple', s.name), 'A')"
+    f" || setweight(to_tsvector('simple', {POSTGRES_TAGS}), 'B')"
+    " || setweight(to_tsvector('simple', s.description_short), 'C')"
+    " || setweight(to_tsvector('simple', s.description_long), 'D')"
+)
+
+
+def query_terms(query):
+    return TERM_RE.findall(query or '')[:MAX_TERMS]
+
+
+def reindex(startup_ids):
+    """(Re)builds the index entries of the given startups; ids of deleted startups are dropped."""
+    startup_ids = list(startup_ids)
+    if not startup_ids:
+        return
+    _backend().reindex(startup_ids)
+
+
+def search(query, limit, offset=0):
+    """
+    Returns up to `limit` (startup_id, rank, snippet) tuples for active
+    startups matching every term of `query`, best first. Higher rank is better.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    return [
+        (startup_id, rank, highlight(snippet))
+        for startup_id, rank, snippet in _backend().search(terms, limit, offset)
+    ]
+
+
+def highlight(snippet):
+    return escape(snippet or '').replace(START_MARK, '<mark>').replace(STOP_MARK, '</mark>')
+
+
+class SQLiteBackend:
+
+    @staticmethod
+    def reindex(startup_ids):
+        placeholders = ', '.join(['%s'] * len(startup_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({placeholders})", startup_ids)
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, name, tags, description_short, description_long)"
+                f" SELECT s.id, s.name, {SQLITE_TAGS}, s.description_short, s.description_long"
+                f" FROM startups_startup s WHERE s.id IN ({placeholders})",
+                startup_ids
+            )
+
+    @staticmethod
+    def search(terms, limit, offset):
+        # Quoted terms can't be read as FTS5 operators; * makes each one a prefix
+        match = ' '.join('"%s"*' % term for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT f.rowid, -bm25({TABLE}, 10.0, 5.0, 2.0, 1.0) AS rank,"
+                f" snippet({TABLE}, -1, %s, %s, '…', 16)"
+                f" FROM {TABLE} f JOIN startups_startup s ON s.id = f.rowid"
+                f" WHERE {TABLE} MATCH %s AND s.is_active"
+                f" ORDER BY rank DESC, s.created_at DESC, s.id DESC LIMIT %s OFFSET %s",
+                [START_MARK, STOP_MARK, match, limit, offset]
+            )
+            return cursor.fetchall()
+
+
+class PostgreSQLBackend:
+
+    @staticmethod
+    def reindex(startup_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {TABLE} (startup_id, document)"
+                f" SELECT s.id, {POSTGRES_DOCUMENT} FROM startups_startup s WHERE s.id = ANY(%s)"
+                f" ON CONFLICT (startup_id) DO UPDATE SET document = EXCLUDED.document",
+                [startup_ids]
+            )
+
+    @staticmethod
+    def search(terms, limit, offset):
+        tsquery = ' & '.join("'%s':*" % term for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT s.id, ts_rank_cd(f.document, q) AS rank,"
+                f" ts_headline('simple', s.name || ' ' || s.description_short || ' ' || s.description_long, q,"
+                f" %s) FROM {TABLE} f JOIN startups_startup s ON s.id = f.startup_id,"
+                f" to_tsquery('simple', %s) q"
+                f" WHERE f.document @@ q AND s.is_active"
+                f" ORDER BY rank DESC, s.created_at DESC, s.id DESC LIMIT %s OFFSET %s",
+                [f'StartSel={START_MARK}, StopSel={STOP_MARK}, MaxWords=24, MinWords=8', tsquery, limit, offset]
+            )
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgreSQLBackend,
+}
+
+
+def _backend():
+    try:
+        return BACKENDS[connection.vendor]
+    except KeyError:
+        raise NotSupportedError(f"Startup search is not available on {connection.vendor}.")
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Tag, Startup, StartupDocument, AnalysisReport
+from .models import Tag, Startup, StartupDocument, AnalysisReport, DescriptionBatchItem, DescriptionBatchJob
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,13 +20,21 @@ class StartupListSerializer(serializers.ModelSerializer):
         model = Startup
         fields = ('id', 'name', 'founder', 'description_short', 'tags', 'founding_year')
 
+class StartupSearchResultSerializer(StartupListSerializer):
+    """A search hit: the list fields plus its rank and a highlighted snippet (set by the view)."""
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+
+    class Meta(StartupListSerializer.Meta):
+        fields = StartupListSerializer.Meta.fields + ('rank', 'snippet')
+
 class StartupDetailSerializer(serializers.ModelSerializer):
     """Serializer for detail view - more detail."""
     tags = TagSerializer(many=True, read_only=True)
     documents = StartupDocumentSerializer(many=True, read_only=True)
     founder = serializers.StringRelatedField() # Show username, not ID
     # Show how many investors liked this startup
-    likes_count = serializers.IntegerField(source='liked_by_investors.count', read_only=True)
+    likes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Startup
@@ -78,6 +86,7 @@ class AnalysisReportListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 
             'status', 
+            'pdf_status',
             'short_query',
             'created_at', 
             'error_message'
@@ -94,6 +103,8 @@ class AnalysisReportDetailSerializer(serializers.ModelSerializer):
     """
     user = serializers.StringRelatedField(read_only=True)
     initial_query_input = serializers.CharField(write_only=True, source='initial_query')
+    # Skip the report result cache and run the agent again
+    force_refresh = serializers.BooleanField(write_only=True, required=False, default=False)
 
     class Meta:
         model = AnalysisReport
@@ -101,20 +112,76 @@ class AnalysisReportDetailSerializer(serializers.ModelSerializer):
             'id', 
             'user', 
             'status', 
+            'pdf_status',
             'initial_query', # Show the full query in detail view
             'report_content_md',
             'initial_query_input',
+            'force_refresh',
+            'served_from_cache',
             'created_at', 
             'updated_at',
+            'started_at',
+            'finished_at',
             'error_message'
         ]
         read_only_fields = [
             'id', 
             'user', 
             'status', 
+            'pdf_status',
             'initial_query',
             'report_content_md',
+            'served_from_cache',
             'created_at', 
             'updated_at',
+            'started_at',
+            'finished_at',
             'error_message'
-        ]
\ No newline at end of file
+        ]
+
+
+class DescriptionBatchItemInputSerializer(serializers.Serializer):
+    startup_id = serializers.IntegerField()
+    prompt_data = serializers.CharField(max_length=4000)
+
+class DescriptionBatchInputSerializer(serializers.Serializer):
+    """The body of a batch description request: one prompt per startup."""
+    items = DescriptionBatchItemInputSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        max_items = self.context['max_items']
+        if len(items) > max_items:
+            raise serializers.ValidationError(f"At most {max_items} startups can be described in one batch.")
+        startup_ids = [item['startup_id'] for item in items]
+        if len(set(startup_ids)) != len(startup_ids):
+            raise serializers.ValidationError("Each startup can appear only once in a batch.")
+        return items
+
+class DescriptionBatchJobSerializer(serializers.ModelSerializer):
+    """
+    Aggregate progress of a batch description job, with the failed items.
+    The counts are annotated by description_batch.with_progress.
+    """
+    status = serializers.SerializerMethodField()
+    total = serializers.IntegerField(read_only=True)
+    succeeded = serializers.IntegerField(read_only=True)
+    failed = serializers.IntegerField(read_only=True)
+    pending = serializers.SerializerMethodField()
+    failures = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DescriptionBatchJob
+        fields = ['id', 'status', 'total', 'succeeded', 'failed', 'pending', 'failures', 'created_at', 'finished_at']
+
+    def get_status(self, job):
+        return 'COMPLETED' if job.finished_at else 'RUNNING'
+
+    def get_pending(self, job):
+        return job.total - job.succeeded - job.failed
+
+    def get_failures(self, job):
+        failed_items = job.items.filter(status=DescriptionBatchItem.Status.FAILED).order_by('id')
+        return [
+            {'startup_id': startup_id, 'error': error_message}
+            for startup_id, error_message in failed_items.values_list('startup_id', 'error_message')
+        ]
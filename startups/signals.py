@@ -0,0 +1,99 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+import events
+from . import caching, list_cache, search
+from .filters import invalidate_facets
+from .models import AnalysisReport, Startup, StartupDocument, Tag
+
+TAGS_GENERATION = 'tags'
+
+
+def touch_startups(startup_ids):
+    """Bumps updated_at of startups whose related rows (tags, documents) changed, so their ETags change."""
+    Startup.objects.filter(pk__in=startup_ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Startup)
+@receiver(post_delete, sender=Startup)
+def startup_changed(sender, instance, **kwargs):
+    search.reindex([instance.pk])
+    invalidate_facets()
+    list_cache.invalidate()
+
+
+@receiver(m2m_changed, sender=Startup.tags.through)
+def startup_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        startup_ids = [instance.pk]
+    elif action == 'pre_clear':
+        # tag.startup_set.clear(): pk_set is not given, remember who loses the tag.
+        # investors/signals.py does the same under its own attribute; each receiver pops only its own
+        instance._search_cleared_startup_ids = list(instance.startup_set.values_list('pk', flat=True))
+        return
+    elif action == 'post_clear':
+        startup_ids = instance.__dict__.pop('_search_cleared_startup_ids', [])
+    else:
+        # tag.startup_set.add(...) etc.: pk_set holds startups
+        startup_ids = pk_set
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_facets()
+        list_cache.invalidate()
+        search.reindex(startup_ids)
+        touch_startups(startup_ids)
+
+
+@receiver(post_save, sender=StartupDocument)
+@receiver(post_delete, sender=StartupDocument)
+def startup_document_changed(sender, instance, **kwargs):
+    touch_startups([instance.startup_id])
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    caching.bump_generation(TAGS_GENERATION)
+    list_cache.invalidate()
+    if not created:
+        startup_ids = list(instance.startup_set.values_list('pk', flat=True))
+        invalidate_facets()
+        search.reindex(startup_ids)
+        touch_startups(startup_ids)
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged_startups(sender, instance, **kwargs):
+    instance._tagged_startup_ids = list(instance.startup_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    startup_ids = instance.__dict__.pop('_tagged_startup_ids', [])
+    caching.bump_generation(TAGS_GENERATION)
+    list_cache.invalidate()
+    invalidate_facets()
+    search.reindex(startup_ids)
+    touch_startups(startup_ids)
+
+
+@receiver(pre_save, sender=AnalysisReport)
+def remember_report_state(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and not {'status', 'pdf_status'} & set(update_fields)):
+        instance._previous_state = None
+        return
+    instance._previous_state = AnalysisReport.objects.filter(pk=instance.pk).values_list(
+        'status', 'pdf_status'
+    ).first()
+
+
+@receiver(post_save, sender=AnalysisReport)
+def report_saved(sender, instance, created, **kwargs):
+    previous = instance.__dict__.pop('_previous_state', None)
+    if created or previous is None or previous == (instance.status, instance.pdf_status):
+        return
+    events.publish(instance.user_id, 'report', {
+        'id': instance.pk,
+        'status': instance.status,
+        'pdf_status': instance.pdf_status,
+        'updated_at': instance.updated_at.isoformat(),
+    })
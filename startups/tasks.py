@@ -1,47 +1,77 @@
 import time
 from celery import shared_task
-from .models import Startup,AnalysisReport
+from celery.utils.time import get_exponential_backoff_interval
 from django.conf import settings
+from django.utils import timezone
+from .models import Startup, AnalysisReport, DescriptionBatchItem
 import requests
+from agent_client import get_agent
+import events
+from .pdf import get_or_render_pdf
+from . import description_batch, report_cache
 
 # You would import your actual AI service here
 # from your_ai_module import AIEngine
 
-#@shared_task(bind=True) # `bind=True` to get task instance
-def generate_analysis_report_task( report_id):
+@shared_task(bind=True, max_retries=4, acks_late=True, soft_time_limit=360, time_limit=420)
+def generate_analysis_report_task(self, report_id):
     """
     A background task that calls the external AI agent to generate a report.
-    
+    Runs on the 'reports' queue (see CELERY_TASK_ROUTES). Network errors are
+    retried with exponential backoff; the report only becomes FAILED once the
+    retries are used up.
     """
     print(f"Generating analysis report for report_id: {report_id}")
     try:
         report = AnalysisReport.objects.get(id=report_id)
+        if report.status == AnalysisReport.Status.COMPLETED:
+            # Redelivered after the work was done (acks_late), nothing to do
+            return f"Report {report_id} is already completed."
+
         report.status = AnalysisReport.Status.PROCESSING
-        report.save()
+        if report.started_at is None:
+            report.started_at = timezone.now()
+        report.save(update_fields=['status', 'started_at', 'updated_at'])
 
-        # Prepare the request to the AI agent
-        agent_url = settings.AI_AGENT_URL
+        # Make the blocking HTTP call through the shared agent client
+        # (raises for 4xx/5xx and fails fast while the agent is down)
         payload = {"query": report.initial_query}
-        headers = {"Content-Type": "application/json"}
-
-        # Make the blocking HTTP call within the async task
-        response = requests.post(agent_url, json=payload, headers=headers, timeout=30000) # 5-min timeout
-        response.raise_for_status()  # Raise an exception for 4xx or 5xx status codes
+        response = get_agent('AI_AGENT_URL').post(payload)
 
         # Success! Update the report.
         report.report_content_md = response.text # Assuming agent returns raw markdown
         report.status = AnalysisReport.Status.COMPLETED
+        report.pdf_status = AnalysisReport.PdfStatus.PENDING
+        report.error_message = None
+        report.finished_at = timezone.now()
         report.save()
+        report_cache.store(report.initial_query, report.report_content_md)
+
+        # Render the PDF now so the download endpoint only has to stream a file
+        render_report_pdf_task.delay(report.id)
 
         return f"Successfully generated report for ID: {report_id}"
 
     except requests.exceptions.RequestException as exc:
         # Handle network errors, timeouts, etc.
+        if self.request.retries < self.max_retries:
+            # Retry the task if it's a transient network issue
+            countdown = get_exponential_backoff_interval(
+                factor=settings.REPORT_TASK_RETRY_BACKOFF,
+                retries=self.request.retries,
+                maximum=settings.REPORT_TASK_RETRY_BACKOFF_MAX,
+                full_jitter=True
+            )
+            report.status = AnalysisReport.Status.PENDING
+            report.error_message = f"Retrying in {countdown}s after network error communicating with AI Agent: {exc}"
+            report.save(update_fields=['status', 'error_message', 'updated_at'])
+            raise self.retry(exc=exc, countdown=countdown)
+
         report.status = AnalysisReport.Status.FAILED
         report.error_message = f"Network error communicating with AI Agent: {exc}"
-        report.save()
-        # Retry the task if it's a transient network issue
-        raise self.retry(exc=exc)
+        report.finished_at = timezone.now()
+        report.save(update_fields=['status', 'error_message', 'finished_at', 'updated_at'])
+        return f"Failed report generation for ID {report_id} after {self.request.retries} retries."
         
     except AnalysisReport.DoesNotExist:
         # This shouldn't happen, but good to handle
@@ -49,53 +79,83 @@ def generate_analysis_report_task( report_id):
         return f"Error: Report with ID {report_id} not found."
         
     except Exception as exc:
-        # Handle any other unexpected errors
+        # Handle any other unexpected errors (including the soft time limit)
         report.status = AnalysisReport.Status.FAILED
         report.error_message = f"An unexpected error occurred: {exc}"
-        report.save()
+        report.finished_at = timezone.now()
+        report.save(update_fields=['status', 'error_message', 'finished_at', 'updated_at'])
         # You might not want to retry for unknown errors
         return f"Failed report generation for ID {report_id} due to unexpected error."
 
 
-# Note: No need for 'time' import anymore
+@shared_task(bind=True, max_retries=2, default_retry_delay=30)
+def render_report_pdf_task(self, report_id):
+    """
+    Renders a completed report to PDF and puts it in the PDF store, so that
+    downloads never have to run WeasyPrint inside a web worker.
+    """
+    try:
+        report = AnalysisReport.objects.get(id=report_id)
+    except AnalysisReport.DoesNotExist:
+        print(f"Error: AnalysisReport with ID {report_id} not found.")
+        return f"Error: Report with ID {report_id} not found."
+
+    if report.status != AnalysisReport.Status.COMPLETED:
+        return f"Skipped PDF for report {report_id}: report is {report.status}."
+
+    try:
+        get_or_render_pdf(report)
+    except OSError as exc:
+        # Disk trouble writing to the PDF store may be transient
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=exc)
+        report.pdf_status = AnalysisReport.PdfStatus.FAILED
+        report.save(update_fields=['pdf_status', 'updated_at'])
+        return f"Failed to store PDF for report {report_id}: {exc}"
+    except Exception as exc:
+        # Bad content will not render any better on a retry
+        print(f"PDF rendering failed for report {report_id}: {exc}")
+        report.pdf_status = AnalysisReport.PdfStatus.FAILED
+        report.save(update_fields=['pdf_status', 'updated_at'])
+        return f"Failed to render PDF for report {report_id}: {exc}"
+
+    report.pdf_status = AnalysisReport.PdfStatus.READY
+    report.save(update_fields=['pdf_status', 'updated_at'])
+    return f"PDF ready for report {report_id}"
+
+
+def request_description(prompt_data):
+    """
+    Asks the description agent for a long description. Raises a
+    RequestException for network errors and 4xx/5xx, and ValueError for a
+    response without content.
+    """
+    payload = {"query": prompt_data} # This matches your agent's expected input
+    response = get_agent('DESCRIPTION_AGENT_URL').post(payload)
+
+    # Parse the JSON response and get the content from the 'response' key
+    generated_text = response.json().get('response')
+    if not generated_text:
+        # Handle case where the agent returns a 200 OK but with no content
+        raise ValueError("AI agent returned an empty response.")
+    return generated_text
+
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=180) # `bind=True` to get task instance
 def generate_startup_description_task(self, startup_id, prompt_data):
     """
     A background task to generate a startup description by calling the external AI agent.
     """
+    startup = None
     try:
         startup = Startup.objects.get(id=startup_id)
         print(f"Starting AI description generation for {startup.name}...")
         
-        # --- REAL AI CALL ---
-        # Replace the mock call with a real HTTP request.
-        
-        agent_url = settings.DESCRIPTION_AGENT_URL
-        payload = {"query": prompt_data} # This matches your agent's expected input
-        
-        response = requests.post(
-            agent_url, 
-            json=payload, 
-            headers={"Content-Type": "application/json"},
-            timeout=90 # 90-second timeout is reasonable for a description generation task
-        )
-        
-        # This will raise an HTTPError for bad responses (4xx or 5xx)
-        response.raise_for_status()
-        
-        # Parse the JSON response and get the content from the 'response' key
-        response_data = response.json()
-        generated_text = response_data.get('response')
-
-        if not generated_text:
-            # Handle case where the agent returns a 200 OK but with no content
-            raise ValueError("AI agent returned an empty response.")
-        
-        # --- END REAL AI CALL ---
+        generated_text = request_description(prompt_data)
         
         startup.description_long = generated_text
-        startup.save()
+        startup.save(update_fields=["description_long", "updated_at"])
+        events.publish(startup.founder_id, 'description', {'startup_id': startup.id, 'status': 'completed'})
         
         print(f"Successfully generated and saved description for {startup.name}.")
         return f"Success for startup_id {startup_id}"
@@ -109,6 +169,10 @@ def generate_startup_description_task(self, startup_id, prompt_data):
     except ValueError as exc:
         # Handle errors in parsing the response (e.g., not valid JSON, or empty response key)
         print(f"Invalid response from agent for startup {startup_id}: {exc}")
+        if startup is not None:
+            events.publish(startup.founder_id, 'description', {
+                'startup_id': startup.id, 'status': 'failed', 'error': str(exc)
+            })
         # We probably should not retry this, as the agent might be broken.
         return f"Failed due to invalid response for startup_id {startup_id}."
         
@@ -120,4 +184,48 @@ def generate_startup_description_task(self, startup_id, prompt_data):
     except Exception as exc:
         # A general catch-all for any other unexpected errors
         print(f"An unexpected error occurred for startup_id {startup_id}: {exc}")
-        return f"An unexpected error occurred for startup_id {startup_id}: {exc}"
\ No newline at end of file
+        return f"An unexpected error occurred for startup_id {startup_id}: {exc}"
+
+
+@shared_task(bind=True, acks_late=True)
+def generate_description_chunk_task(self, job_id, item_ids):
+    """
+    Works through one slice of a DescriptionBatchJob, one agent call at a
+    time (see description_batch.py). Results are written back in bulk every
+    FLUSH_EVERY items, so the job's progress moves while the slice runs.
+    Items that are no longer PENDING are skipped, which makes a redelivered
+    slice (acks_late) pick up where the previous attempt stopped.
+    """
+    options = description_batch.get_options()
+    items = DescriptionBatchItem.objects.filter(
+        id__in=item_ids, status=DescriptionBatchItem.Status.PENDING
+    ).select_related('startup').order_by('id')
+
+    finished = []
+    for item in items:
+        try:
+            item.startup.description_long = _request_description_with_retries(item.prompt_data, options)
+            item.status = DescriptionBatchItem.Status.SUCCEEDED
+        except (requests.exceptions.RequestException, ValueError) as exc:
+            print(f"Description failed for startup {item.startup_id} in job {job_id}: {exc}")
+            item.status = DescriptionBatchItem.Status.FAILED
+            item.error_message = str(exc)
+        finished.append(item)
+        if len(finished) >= options['FLUSH_EVERY']:
+            description_batch.save_results(finished)
+            finished = []
+    description_batch.save_results(finished)
+    description_batch.finish_job_if_done(job_id)
+    return f"Processed {len(item_ids)} items of description job {job_id}"
+
+
+def _request_description_with_retries(prompt_data, options):
+    for attempt in range(options['ATTEMPTS']):
+        try:
+            return request_description(prompt_data)
+        except requests.exceptions.RequestException:
+            if attempt + 1 >= options['ATTEMPTS']:
+                raise
+            time.sleep(get_exponential_backoff_interval(
+                factor=options['RETRY_BACKOFF'], retries=attempt, maximum=options['RETRY_BACKOFF_MAX'], full_jitter=True
+            ))
@@ -1,3 +1,885 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from kombu import Connection
+from prometheus_client import REGISTRY
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+import events
+from agent_client import get_agent
+from investors.models import InvestorProfile, Like, RecommendationCandidate
+from testing import use_locmem_cache
+from users.models import User
+from . import caching, list_cache, pdf, pdf_pool, report_cache
+from .models import AnalysisReport, DescriptionBatchItem, Startup, StartupDocument, Tag
+from .tasks import generate_startup_description_task, render_report_pdf_task
+
+
+@use_locmem_cache
+class StartupQueryPlanTests(APITestCase):
+    """
+    Pins the number of queries the startup endpoints issue, so that the
+    cost of a page does not grow with the number of rows on it.
+    """
+
+    def setUp(self):
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.client.force_authenticate(self.founder)
+        self.tags = [Tag.objects.create(name=f'tag-{i}') for i in range(3)]
+
+    def create_startups(self, count):
+        startups = []
+        for i in range(count):
+            startup = Startup.objects.create(
+                founder=self.founder,
+                name=f'Startup {i}',
+                description_short='A startup.',
+                founding_year=2020,
+            )
+            startup.tags.set(self.tags)
+            StartupDocument.objects.create(startup=startup, document='deck.pdf', description='Deck')
+            startups.append(startup)
+        return startups
+
+    def like(self, startup, username):
+        user = User.objects.create_user(username=username, password='pass')
+        investor = InvestorProfile.objects.create(user=user)
+        Like.objects.create(investor=investor, startup=startup)
+
+    def test_list_query_count_is_constant(self):
+        self.create_startups(2)
+        with self.assertNumQueries(2):
+            small = self.client.get(reverse('startup-list'), {'page_size': 100})
+
+        self.create_startups(20)
+        with self.assertNumQueries(2):
+            large = self.client.get(reverse('startup-list'), {'page_size': 100})
+
+        self.assertEqual(len(small.data['results']), 2)
+        self.assertEqual(len(large.data['results']), 22)
+        self.assertEqual(large.data['results'][0]['founder'], 'founder')
+        self.assertEqual(len(large.data['results'][0]['tags']), 3)
+
+    def test_detail_reports_likes_count(self):
+        startup = self.create_startups(1)[0]
+        self.like(startup, 'investor-1')
+        self.like(startup, 'investor-2')
+
+        # The ETag lookup on updated_at, then the startup with founder, tags and documents
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('startup-detail', args=[startup.id]))
+
+        self.assertEqual(response.data['likes_count'], 2)
+        self.assertEqual(len(response.data['tags']), 3)
+        self.assertEqual(len(response.data['documents']), 1)
+
+    def test_detail_with_malformed_id_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('startup-detail', args=['abc'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('analysisreport-detail', args=['abc'])).status_code, 404)
+
+    def test_list_pages_with_a_cursor(self):
+        created = self.create_startups(5)
+
+        first = self.client.get(reverse('startup-list'), {'page_size': 2})
+        second = self.client.get(first.data['next'])
+        third = self.client.get(second.data['next'])
+
+        ids = [row['id'] for page in (first, second, third) for row in page.data['results']]
+        self.assertEqual(ids, [startup.id for startup in reversed(created)])
+        self.assertIsNone(third.data['next'])
+
+
+@use_locmem_cache
+class AnalysisReportDownloadTests(APITestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        settings_override = override_settings(REPORT_PDF_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='reader', password='pass')
+        self.client.force_authenticate(self.user)
+        self.report = AnalysisReport.objects.create(
+            user=self.user,
+            initial_query='Market size?',
+            report_content_md=json.dumps({'response': '# Market\n\nLarge.'}),
+            status=AnalysisReport.Status.COMPLETED,
+        )
+        self.url = reverse('analysisreport-download', args=[self.report.id])
+
+    def test_repeat_download_is_conditional(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(b''.join(first.streaming_content)[:4], b'%PDF')
+
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_range_request_returns_partial_content(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, b'%PDF')
+        self.assertTrue(response['Content-Range'].startswith('bytes 0-3/'))
+
+    def test_content_change_addresses_a_new_pdf(self):
+        etag = self.client.get(self.url)['ETag']
+        self.report.report_content_md = json.dumps({'response': '# Revised'})
+        self.report.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_prerender_task_stores_pdf(self):
+        render_report_pdf_task(self.report.id)
+
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.pdf_status, AnalysisReport.PdfStatus.READY)
+        self.assertIsNotNone(pdf.get_cached_pdf(pdf.content_key(self.report)))
+
+    def render_failing_with(self, error):
+        with mock.patch('startups.pdf_pool.RenderPool.render', side_effect=error), self.assertLogs('startups.views'):
+            return self.client.get(self.url)
+
+    def test_busy_render_pool_returns_503(self):
+        with mock.patch('startups.pdf_pool.RenderPool.render', side_effect=pdf_pool.RenderPoolBusy):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(pdf_pool.RETRY_AFTER))
+
+    def test_render_timeout_returns_504(self):
+        response = self.render_failing_with(pdf_pool.RenderTimeout('PDF render took longer than 60s.'))
+
+        self.assertEqual(response.status_code, 504)
+        self.assertNotIn('60s', response.data['error'])
+
+    def test_render_out_of_memory_returns_503(self):
+        for error in (MemoryError('worker address space'), BrokenProcessPool('worker died')):
+            response = self.render_failing_with(error)
+
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], str(pdf_pool.RETRY_AFTER))
+            self.assertNotIn(str(error), response.data['error'])
+
+    def test_render_error_is_not_echoed(self):
+        response = self.render_failing_with(RuntimeError('/srv/app/secret/path'))
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.data['error'], 'Failed to generate PDF.')
+
+
+class PdfRenderPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.pool = pdf_pool.RenderPool({**pdf_pool.DEFAULTS, 'WORKERS': 1, 'MAX_QUEUED': 0})
+        self.addCleanup(self.pool._reset)
+
+    def test_renders_in_a_worker_and_records_queue_time(self):
+        before = REGISTRY.get_sample_value('pdf_render_queue_seconds_count') or 0
+
+        data = self.pool.render('key', pdf.REPORT_HTML_TEMPLATE.format(body='<h1>Market</h1>'))
+
+        self.assertEqual(data[:4], b'%PDF')
+        self.assertEqual(REGISTRY.get_sample_value('pdf_render_queue_seconds_count'), before + 1)
+
+    def test_full_pool_rejects_and_same_content_shares_a_render(self):
+        waiting = threading.Semaphore(0)
+
+        class Pending(Future):
+            def result(self, timeout=None):
+                waiting.release()
+                return super().result(timeout)
+
+        pending = Pending()
+        with mock.patch.object(self.pool, '_submit', return_value=pending) as submit:
+            renders = [threading.Thread(target=self.pool.render, args=('key', '<html></html>')) for _ in range(2)]
+            for thread in renders:
+                thread.start()
+            for thread in renders:
+                waiting.acquire(timeout=5)
+
+            with self.assertRaises(pdf_pool.RenderPoolBusy):
+                self.pool.render('other', '<html></html>')
+
+            pending.set_result((b'%PDF', time.time()))
+            for thread in renders:
+                thread.join()
+
+        submit.assert_called_once()
+        self.assertEqual(self.pool._inflight, {})
+        # The slot is free again once the render finished
+        with mock.patch.object(self.pool, '_submit', return_value=pending):
+            self.assertEqual(self.pool.render('other', '<html></html>'), b'%PDF')
+
+
+@use_locmem_cache
+class AnalysisReportCreateTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='analyst', password='pass')
+        self.client.force_authenticate(self.user)
+
+    @mock.patch('startups.views.generate_analysis_report_task.delay')
+    def test_create_queues_generation_and_returns_202(self, delay):
+        response = self.client.post(reverse('analysisreport-list'), {'initial_query_input': 'Market size?'})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], AnalysisReport.Status.PENDING)
+        delay.assert_called_once_with(response.data['id'])
+
+    @mock.patch('startups.views.render_report_pdf_task.delay')
+    @mock.patch('startups.views.generate_analysis_report_task.delay')
+    def test_cached_query_completes_immediately(self, generate, render):
+        report_cache.store('What is the  market size?', '{"response": "# Big"}')
+
+        response = self.client.post(reverse('analysisreport-list'), {'initial_query_input': ' what is the market SIZE? '})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], AnalysisReport.Status.COMPLETED)
+        self.assertTrue(response.data['served_from_cache'])
+        self.assertEqual(response.data['report_content_md'], '{"response": "# Big"}')
+        generate.assert_not_called()
+        render.assert_called_once_with(response.data['id'])
+
+    @mock.patch('startups.views.generate_analysis_report_task.delay')
+    def test_force_refresh_skips_the_cache(self, generate):
+        report_cache.store('Market size?', '{"response": "# Big"}')
+
+        response = self.client.post(
+            reverse('analysisreport-list'), {'initial_query_input': 'Market size?', 'force_refresh': True}
+        )
+
+        self.assertEqual(response.status_code, 202)
+        generate.assert_called_once_with(response.data['id'])
+
+
+    @override_settings(ANALYSIS_REPORT_CACHE={'MAX_ENTRIES': 2})
+    def test_least_recently_used_reports_are_evicted(self):
+        with mock.patch('startups.report_cache._index_client', return_value=FakeSortedSetClient()):
+            for query in ('first', 'second'):
+                report_cache.store(query, '{"response": "# Report"}')
+            report_cache.lookup('first')
+            report_cache.store('third', '{"response": "# Report"}')
+
+            self.assertIsNone(report_cache.lookup('second'))
+            self.assertIsNotNone(report_cache.lookup('first'))
+            self.assertIsNotNone(report_cache.lookup('third'))
+
+
+class FakeSortedSetClient:
+    """The sorted-set commands of a raw Redis client that report_cache uses, in memory."""
+
+    def __init__(self):
+        self.sets = {}
+        self.clock = 0
+
+    def pipeline(self):
+        client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args: self.calls.append((getattr(client, name), args))
+
+            def execute(self):
+                return [method(*args) for method, args in self.calls]
+
+        return Pipeline()
+
+    def zadd(self, name, mapping):
+        # Scores from a counter, so that entries touched in the same instant still order
+        for member in mapping:
+            self.clock += 1
+            self.sets.setdefault(name, {})[member.encode()] = self.clock
+
+    def zcard(self, name):
+        return len(self.sets.get(name, {}))
+
+    def expire(self, name, seconds):
+        return True
+
+    def zpopmin(self, name, count):
+        members = sorted(self.sets[name].items(), key=lambda item: item[1])[:count]
+        for member, _ in members:
+            del self.sets[name][member]
+        return members
+
+
+@use_locmem_cache
+class StartupSearchTests(APITestCase):
+
+    def setUp(self):
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.client.force_authenticate(self.founder)
+        self.url = reverse('startup-search')
+
+    def make_startup(self, name, description_short='A startup.', description_long='', is_active=True):
+        return Startup.objects.create(
+            founder=self.founder, name=name, description_short=description_short,
+            description_long=description_long, founding_year=2020, is_active=is_active
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_ranks_name_matches_first_and_matches_prefixes(self):
+        in_description = self.make_startup('Ledgerly', description_long='Payments for fintech teams.')
+        in_name = self.make_startup('Fintechly <Labs>')
+        self.make_startup('Fintech Dormant', is_active=False)
+
+        results = self.search('fin')['results']
+
+        self.assertEqual([row['id'] for row in results], [in_name.id, in_description.id])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+        self.assertEqual(results[0]['snippet'], '<mark>Fintechly</mark> &lt;Labs&gt;')
+
+    def test_every_term_must_match_and_tags_are_indexed(self):
+        tagged = self.make_startup('Acme')
+        tagged.tags.add(Tag.objects.create(name='healthcare'))
+        self.make_startup('Acme Tools')
+
+        self.assertEqual([row['id'] for row in self.search('acme health')['results']], [tagged.id])
+
+    def test_clearing_a_tag_updates_search_and_recommendations(self):
+        healthcare = Tag.objects.create(name='healthcare')
+        tagged = self.make_startup('Acme')
+        tagged.tags.add(healthcare)
+        investor = InvestorProfile.objects.create(user=User.objects.create_user(username='investor', password='pass'))
+        investor.interested_in_tags.add(healthcare)
+        self.assertTrue(RecommendationCandidate.objects.filter(investor=investor, startup=tagged).exists())
+
+        healthcare.startup_set.clear()
+
+        self.assertEqual(self.search('health')['results'], [])
+        self.assertFalse(RecommendationCandidate.objects.filter(investor=investor, startup=tagged).exists())
+
+    def test_pages_with_limit_and_offset(self):
+        for i in range(3):
+            self.make_startup(f'Robotics {i}')
+
+        first = self.search('robot', limit=2)
+        second = self.client.get(first['next']).data
+
+        self.assertEqual(len(first['results']), 2)
+        self.assertEqual(len(second['results']), 1)
+        self.assertIsNone(second['next'])
+
+    @mock.patch('agent_client.requests.Session.post')
+    def test_generated_description_is_searchable(self, post):
+        startup = self.make_startup('Acme')
+        post.return_value.json.return_value = {'response': 'Autonomous drones for vineyards.'}
+
+        generate_startup_description_task.apply(args=(startup.id, 'drones'))
+
+        self.assertEqual([row['id'] for row in self.search('vineyard')['results']], [startup.id])
+
+    def test_query_is_required(self):
+        response = self.client.get(self.url, {'q': ' ** '})
+        self.assertEqual(response.status_code, 400)
+
+
+@use_locmem_cache
+class StartupFilterTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.client.force_authenticate(self.founder)
+        self.fintech, self.health = Tag.objects.create(name='fintech'), Tag.objects.create(name='health')
+        self.both = self.make_startup('Both', 2018, self.fintech, self.health)
+        self.fintech_only = self.make_startup('Fintech', 2020, self.fintech)
+        self.untagged = self.make_startup('Untagged', 2020)
+
+    def make_startup(self, name, founding_year, *tags):
+        startup = Startup.objects.create(
+            founder=self.founder, name=name, description_short=name, founding_year=founding_year
+        )
+        startup.tags.set(tags)
+        return startup
+
+    def list_ids(self, **params):
+        response = self.client.get(reverse('startup-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.data['results']}
+
+    def test_tags_must_all_match(self):
+        self.assertEqual(self.list_ids(tags=f'{self.fintech.id}'), {self.both.id, self.fintech_only.id})
+        self.assertEqual(self.list_ids(tags=f'{self.fintech.id},{self.health.id}'), {self.both.id})
+
+    def test_founding_year_range(self):
+        self.assertEqual(self.list_ids(founding_year_min=2019), {self.fintech_only.id, self.untagged.id})
+        self.assertEqual(self.list_ids(founding_year_max=2018, tags=f'{self.fintech.id}'), {self.both.id})
+
+    def test_invalid_filters_are_rejected(self):
+        self.assertEqual(self.client.get(reverse('startup-list'), {'tags': 'fintech'}).status_code, 400)
+
+    def test_popular_ordering_and_likes_min(self):
+        for i, startup in enumerate([self.fintech_only, self.fintech_only, self.untagged]):
+            user = User.objects.create_user(username=f'investor-{i}', password='pass')
+            Like.objects.create(investor=InvestorProfile.objects.create(user=user), startup=startup)
+
+        response = self.client.get(reverse('startup-list'), {'ordering': 'popular'})
+
+        self.assertEqual([row['id'] for row in response.data['results']],
+                         [self.fintech_only.id, self.untagged.id, self.both.id])
+        self.assertEqual(self.list_ids(likes_min=2), {self.fintech_only.id})
+        self.assertEqual(self.client.get(reverse('startup-list'), {'ordering': 'likes'}).status_code, 400)
+
+    def test_popular_ordering_pages_through_many_ties(self):
+        # More startups with the same like count and creation time than DRF's offset_cutoff
+        Startup.objects.bulk_create(
+            Startup(founder=self.founder, name=f'Tied {i}', description_short='Tied', founding_year=2020)
+            for i in range(1050)
+        )
+        Startup.objects.update(created_at=timezone.now())
+        expected = list(Startup.objects.order_by('-likes_count', '-created_at', '-id').values_list('id', flat=True))
+
+        ids, pages = [], []
+        url, params = reverse('startup-list'), {'ordering': 'popular', 'page_size': 100}
+        while url:
+            response = self.client.get(url, params)
+            pages.append(response)
+            ids += [row['id'] for row in response.data['results']]
+            url, params = response.data['next'], None
+
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 11)
+        back = self.client.get(pages[-1].data['previous'])
+        self.assertEqual([row['id'] for row in back.data['results']], expected[900:1000])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse('startup-list'), {'ordering': 'popular', 'cursor': 'cD1bMV0='})
+        self.assertEqual(response.status_code, 404)
+
+    def test_facets_count_the_filtered_startups(self):
+        response = self.client.get(reverse('startup-facets'), {'founding_year_min': 2019})
+
+        self.assertEqual(response.data, {
+            'tags': [{'id': self.fintech.id, 'name': 'fintech', 'count': 1}],
+            'founding_years': [{'year': 2020, 'count': 2}],
+        })
+
+    def test_facets_are_cached_until_tags_change(self):
+        url = reverse('startup-facets')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.untagged.tags.add(self.health)
+
+        tags = {row['name']: row['count'] for row in self.client.get(url).data['tags']}
+        self.assertEqual(tags, {'fintech': 2, 'health': 2})
+
+
+@use_locmem_cache
+@override_settings(DESCRIPTION_BATCH={'CONCURRENCY': 2, 'ATTEMPTS': 1})
+class DescriptionBatchTests(APITestCase):
+
+    def setUp(self):
+        # Progress events go to Redis pub/sub, which tests do not have
+        publish = mock.patch('events._publish')
+        publish.start()
+        self.addCleanup(publish.stop)
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.client.force_authenticate(self.founder)
+        self.startups = [
+            Startup.objects.create(founder=self.founder, name=f'Startup {i}', description_short='A startup.',
+                                   founding_year=2020)
+            for i in range(5)
+        ]
+
+    def agent_reply(self, url, json=None, **kwargs):
+        if json['query'] == 'fail':
+            raise requests.exceptions.ConnectionError('agent down')
+        response = mock.Mock()
+        response.json.return_value = {'response': f"About {json['query']}"}
+        return response
+
+    def run_group(self, signatures):
+        signatures = list(signatures)
+        self.chunks = [signature.args[1] for signature in signatures]
+        return mock.Mock(apply_async=lambda: [signature.apply() for signature in signatures])
+
+    @mock.patch('agent_client.requests.Session.post')
+    def test_fans_out_and_reports_progress(self, post):
+        post.side_effect = self.agent_reply
+        items = [{'startup_id': startup.id, 'prompt_data': f'drones {i}'} for i, startup in enumerate(self.startups)]
+        items[3]['prompt_data'] = 'fail'
+
+        with mock.patch('startups.description_batch.group', side_effect=self.run_group), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('startup-generate-descriptions'), {'items': items}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(sorted(len(chunk) for chunk in self.chunks), [2, 3])
+        job = self.client.get(response.data['status_url']).data
+        self.assertEqual((job['status'], job['total'], job['succeeded'], job['failed'], job['pending']),
+                         ('COMPLETED', 5, 4, 1, 0))
+        self.assertEqual(job['failures'], [{'startup_id': self.startups[3].id, 'error': 'agent down'}])
+        self.startups[0].refresh_from_db()
+        self.assertEqual(self.startups[0].description_long, 'About drones 0')
+        search = self.client.get(reverse('startup-search'), {'q': 'drones'}).data
+        self.assertEqual(len(search['results']), 4)
+
+    def test_rejects_startups_of_other_founders(self):
+        other = User.objects.create_user(username='other', password='pass')
+        foreign = Startup.objects.create(founder=other, name='Foreign', description_short='x', founding_year=2020)
+
+        response = self.client.post(reverse('startup-generate-descriptions'), {'items': [
+            {'startup_id': self.startups[0].id, 'prompt_data': 'x'}, {'startup_id': foreign.id, 'prompt_data': 'x'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['startup_ids'], [foreign.id])
+        self.assertFalse(DescriptionBatchItem.objects.exists())
+
+
+@use_locmem_cache
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.client.force_authenticate(self.founder)
+        self.startup = Startup.objects.create(
+            founder=self.founder, name='Acme', description_short='A startup.', founding_year=2020
+        )
+
+    def assert_revalidates(self, url, change, validator_queries=1):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(validator_queries):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+        change()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_startup_detail_revalidates_on_likes_and_tags(self):
+        url = reverse('startup-detail', args=[self.startup.id])
+        investor = InvestorProfile.objects.create(user=User.objects.create_user(username='investor', password='pass'))
+
+        self.assert_revalidates(url, lambda: Like.objects.create(investor=investor, startup=self.startup))
+        self.assert_revalidates(url, lambda: self.startup.tags.add(Tag.objects.create(name='fintech')))
+
+    def test_report_detail_revalidates_when_completed(self):
+        report = AnalysisReport.objects.create(user=self.founder, initial_query='Market?')
+
+        def complete():
+            report.status = AnalysisReport.Status.COMPLETED
+            report.report_content_md = '# Report'
+            report.save()
+
+        self.assert_revalidates(reverse('analysisreport-detail', args=[report.id]), complete)
+
+    def test_tag_list_revalidates_on_tag_writes(self):
+        self.assert_revalidates(reverse('tag-list'), lambda: Tag.objects.create(name='health'), validator_queries=0)
+
+
+@use_locmem_cache
+class ListResponseCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.client.force_authenticate(self.founder)
+        self.startup = Startup.objects.create(
+            founder=self.founder, name='Acme', description_short='A startup.', founding_year=2020
+        )
+
+    def test_repeated_list_is_served_from_cache(self):
+        url = reverse('startup-list')
+        first = self.client.get(url, {'ordering': 'popular', 'founding_year_min': 2019})
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, {'founding_year_min': 2019, 'ordering': 'popular', 'tags': ''})
+        self.assertEqual(cached.json(), first.json())
+        self.assertEqual(list_cache.stats(), {'hits': 1, 'stale': 0, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_writes_invalidate_cached_pages(self):
+        url = reverse('startup-list')
+        investor = InvestorProfile.objects.create(user=User.objects.create_user(username='investor', password='pass'))
+        other = Startup.objects.create(founder=self.founder, name='Beta', description_short='B.', founding_year=2021)
+
+        def popular_ids():
+            return [row['id'] for row in self.client.get(url, {'ordering': 'popular'}).json()['results']]
+
+        self.assertEqual(popular_ids(), [other.id, self.startup.id])
+        Like.objects.create(investor=investor, startup=self.startup)
+        self.assertEqual(popular_ids(), [self.startup.id, other.id])
+
+        tag = Tag.objects.create(name='fintech')
+        self.startup.tags.add(tag)
+        self.assertEqual(self.client.get(url, {'tags': tag.id}).json()['results'][0]['tags'][0]['name'], 'fintech')
+        tag.name = 'payments'
+        tag.save()
+        self.assertEqual(self.client.get(url, {'tags': tag.id}).json()['results'][0]['tags'][0]['name'], 'payments')
+
+    def test_errors_are_not_cached(self):
+        url = reverse('startup-list')
+        self.assertEqual(self.client.get(url, {'ordering': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ordering': 'nope'}).status_code, 400)
+        self.assertEqual(list_cache.stats()['hits'], 0)
+
+    def test_stale_entry_is_served_while_another_request_recomputes(self):
+        compute = mock.Mock(side_effect=['first', 'second'])
+        self.assertEqual(caching.get_or_compute('test', ['key'], compute, timeout=0), 'first')
+
+        key = caching.make_key('test', 'key')
+        cache.add(caching.LOCK_PREFIX + key, 1)
+        self.assertEqual(caching.get_or_compute('test', ['key'], compute, timeout=0), 'first')
+        self.assertEqual(compute.call_count, 1)
+
+        cache.delete(caching.LOCK_PREFIX + key)
+        self.assertEqual(caching.get_or_compute('test', ['key'], compute, timeout=0), 'second')
+        self.assertEqual(caching.stats('test'), {'hits': 0, 'stale': 1, 'misses': 2, 'hit_rate': 1 / 3})
+
+
+@use_locmem_cache
+class ServerTimingTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.client.force_authenticate(self.founder)
+        self.startup = Startup.objects.create(
+            founder=self.founder, name='Acme', description_short='A startup.', founding_year=2020
+        )
+
+    def test_header_reports_measured_phases(self):
+        response = self.client.get(reverse('startup-detail', args=[self.startup.id]))
+        phases = {entry.split(';')[0]: entry for entry in response['Server-Timing'].split(', ')}
+        self.assertEqual(set(phases), {'db', 'render', 'app', 'total'})
+        self.assertIn('desc="4x"', phases['db'])
+
+    @override_settings(SERVER_TIMING={'SLOW_REQUEST_MS': 0})
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('server_timing', 'WARNING') as logs:
+            self.client.get(reverse('startup-detail', args=[self.startup.id]))
+        record = logs.records[0].server_timing
+        self.assertEqual(record['view'], 'startup-detail')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['user_id'], self.founder.id)
+        self.assertEqual(record['phases']['db']['count'], 4)
+
+    @override_settings(SERVER_TIMING={'SAMPLE_RATE': 0})
+    def test_unsampled_requests_are_not_measured(self):
+        response = self.client.get(reverse('startup-detail', args=[self.startup.id]))
+        self.assertNotIn('Server-Timing', response)
+
+
+@use_locmem_cache
+class MetricsEndpointTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.client.force_authenticate(self.founder)
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_latency_is_recorded_per_route_and_action(self):
+        labels = {'route': 'startup-list', 'action': 'list', 'method': 'GET', 'status': '2xx'}
+        before = self.sample('http_request_duration_seconds_count', **labels)
+        with self.assertNumQueries(1):  # the (empty) page; nothing for metrics
+            self.client.get(reverse('startup-list'))
+        self.assertEqual(self.sample('http_request_duration_seconds_count', **labels), before + 1)
+
+    def test_scrape_reports_pipeline_state(self):
+        report_cache.lookup('Market?')
+        AnalysisReport.objects.create(user=self.founder, initial_query='Market?', status=AnalysisReport.Status.PROCESSING)
+        with self.memory_broker() as connection:
+            with connection.SimpleQueue('reports') as queue:
+                queue.put({'task': 'queued'})
+                body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('analysis_reports{status="PROCESSING"} 1.0', body)
+        self.assertIn('analysis_reports{status="FAILED"} 0.0', body)
+        self.assertIn('celery_queue_length{queue="reports"} 1.0', body)
+        self.assertIn('cache_requests_total{cache="startup-listings",result="misses"}', body)
+        self.assertIn('cache_requests_total{cache="analysis-reports",result="misses"} 1.0', body)
+
+    def memory_broker(self):
+        """Points the scrape at an in-memory broker; there is no RabbitMQ in tests."""
+        patcher = mock.patch('celery.app.base.Celery.connection_for_read', lambda app, **kwargs: Connection('memory://'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return Connection('memory://')
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_scrape_requires_token_when_configured(self):
+        self.memory_broker().release()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_agent_calls_are_observed(self):
+        labels = {'agent': 'AI_AGENT_URL', 'url': settings.AI_AGENT_URL, 'outcome': 'error'}
+        before = self.sample('agent_request_duration_seconds_count', **labels)
+        with mock.patch('requests.Session.post', side_effect=requests.exceptions.ConnectionError):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                get_agent('AI_AGENT_URL').post({'query': 'Market?'})
+        self.assertEqual(self.sample('agent_request_duration_seconds_count', **labels), before + 1)
+
+
+class FakePubSub:
+    """Stands in for a redis.asyncio PubSub; hands out the queued messages, then stays idle."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = []
+        self.closed = False
+
+    async def subscribe(self, *channels):
+        self.channels.extend(channels)
+
+    async def get_message(self, timeout=None):
+        return {'data': self.messages.pop(0)} if self.messages else None
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeSyncPubSub(FakePubSub):
+    """Stands in for a sync redis PubSub."""
+
+    def subscribe(self, *channels):
+        self.channels.extend(channels)
+
+    def get_message(self, timeout=None):
+        return {'data': self.messages.pop(0)} if self.messages else None
+
+    def close(self):
+        self.closed = True
+
+
+@use_locmem_cache
+class EventTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.founder = User.objects.create_user(username='founder', password='pass')
+        self.client.force_authenticate(self.founder)
+        self.startup = Startup.objects.create(
+            founder=self.founder, name='Acme', description_short='A startup.', founding_year=2020
+        )
+
+    def published(self, action):
+        """Runs `action` and returns the (channel, event, data) it published on commit."""
+        with mock.patch('events._publish') as publish, \
+                mock.patch('investors.tasks.refresh_recommendations_for_likes_task.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            action()
+        return [(channel, *json.loads(message).values()) for channel, message in (c.args for c in publish.call_args_list)]
+
+    def test_report_status_changes_are_published(self):
+        report = AnalysisReport.objects.create(user=self.founder, initial_query='Market?')
+
+        def complete():
+            report.status = AnalysisReport.Status.COMPLETED
+            report.save()
+
+        [(channel, event, data)] = self.published(complete)
+        self.assertEqual(channel, f'events:user:{self.founder.id}')
+        self.assertEqual((event, data['id'], data['status']), ('report', report.id, 'COMPLETED'))
+        self.assertEqual(self.published(lambda: report.save(update_fields=['error_message', 'updated_at'])), [])
+
+    def test_likes_are_published_to_the_founder(self):
+        investor = User.objects.create_user(username='investor', password='pass')
+        InvestorProfile.objects.create(user=investor)
+        self.client.force_authenticate(investor)
+
+        def like():
+            self.client.post(reverse('investor-likes'), {'like': [self.startup.id]}, format='json')
+
+        [(channel, event, data)] = self.published(like)
+        self.assertEqual(channel, f'events:user:{self.founder.id}')
+        self.assertEqual((event, data), ('likes', {'investor_id': investor.id, 'startup_ids': [self.startup.id]}))
+
+    def test_description_completion_is_published(self):
+        with mock.patch('startups.tasks.request_description', return_value='A long description.'):
+            [(channel, event, data)] = self.published(
+                lambda: generate_startup_description_task.apply(args=[self.startup.id, {}])
+            )
+        self.assertEqual((event, data), ('description', {'startup_id': self.startup.id, 'status': 'completed'}))
+
+    def test_stream_requires_authentication(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('events')).status_code, 401)
+
+
+@use_locmem_cache
+class EventStreamTests(TestCase):
+
+    def setUp(self):
+        self.pubsub = FakePubSub([json.dumps({'event': 'report', 'data': {'id': 1, 'status': 'COMPLETED'}})])
+        redis_client = mock.Mock(pubsub=mock.Mock(return_value=self.pubsub), aclose=mock.AsyncMock())
+        patcher = mock.patch('redis.asyncio.Redis.from_url', return_value=redis_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_stream_subscribes_to_the_users_channel(self):
+        user = await User.objects.acreate(username='founder')
+        token = await Token.objects.acreate(user=user)
+        response = await self.async_client.get(reverse('events'), headers={'Authorization': f'Token {token.key}'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'event: ready\ndata: {}\n\n')
+        self.assertEqual(self.pubsub.channels, [f'events:user:{user.id}'])
+        await stream.aclose()
+
+    @override_settings(EVENTS={'HEARTBEAT': 0})
+    def test_stream_under_wsgi_uses_a_sync_iterator(self):
+        pubsub = FakeSyncPubSub([json.dumps({'event': 'report', 'data': {'id': 1, 'status': 'COMPLETED'}})])
+        user = User.objects.create_user(username='founder', password='pass')
+        token = Token.objects.create(user=user)
+
+        with mock.patch('redis.Redis.from_url', return_value=mock.Mock(pubsub=mock.Mock(return_value=pubsub))):
+            response = self.client.get(reverse('events'), headers={'Authorization': f'Token {token.key}'})
+            # An async iterator would have been read to the end, i.e. never, before the first byte
+            self.assertFalse(response.is_async)
+            stream = iter(response.streaming_content)
+            frames = [next(stream) for _ in range(3)]
+            response.close()
+
+        self.assertEqual(frames, [
+            b'event: ready\ndata: {}\n\n',
+            b'event: report\ndata: {"id": 1, "status": "COMPLETED"}\n\n',
+            b': keep-alive\n\n',
+        ])
+        self.assertEqual(pubsub.channels, [f'events:user:{user.id}'])
+        self.assertTrue(pubsub.closed)
+
+    @override_settings(EVENTS={'HEARTBEAT': 0})
+    async def test_stream_relays_events_and_unsubscribes_when_closed(self):
+        stream = events._events(7)
+        frames = [await anext(stream) for _ in range(3)]
+        await stream.aclose()
+        self.assertEqual(frames, [
+            'event: ready\ndata: {}\n\n',
+            'event: report\ndata: {"id": 1, "status": "COMPLETED"}\n\n',
+            ': keep-alive\n\n',
+        ])
+        self.assertTrue(self.pubsub.closed)
@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AnalysisReportViewSet, StartupViewSet, TagViewSet
+from .views import AnalysisReportViewSet, DescriptionBatchJobViewSet, StartupViewSet, TagViewSet
 
 router = DefaultRouter()
 router.register(r'startups', StartupViewSet)
 router.register(r'tags', TagViewSet)
 router.register(r'reports', AnalysisReportViewSet, basename='analysisreport')
+router.register(r'description-jobs', DescriptionBatchJobViewSet, basename='descriptionbatchjob')
 
 urlpatterns = [
     path('', include(router.urls)),
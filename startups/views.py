@@ -1,16 +1,36 @@
-import json
-from django.http import HttpResponse
-from rest_framework import viewsets, status
+import logging
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.permissions import IsAuthenticated
 
-from .models import Startup, Tag, AnalysisReport
-from .serializers import StartupListSerializer, StartupDetailSerializer, TagSerializer, AnalysisReportSerializer , AnalysisReportListSerializer, AnalysisReportDetailSerializer
+from .models import Startup, Tag, AnalysisReport, DescriptionBatchJob
+from .serializers import DescriptionBatchInputSerializer, DescriptionBatchJobSerializer
+from .serializers import StartupListSerializer, StartupDetailSerializer, StartupSearchResultSerializer, TagSerializer, AnalysisReportSerializer , AnalysisReportListSerializer, AnalysisReportDetailSerializer
 from permissions import IsOwnerOrReadOnly
-from .tasks import generate_startup_description_task, generate_analysis_report_task
-import markdown2
-from weasyprint import HTML
+from pagination import CreatedAtCursorPagination, RankedResultsPagination, SelectableCursorPagination
+from .tasks import generate_startup_description_task, generate_analysis_report_task, render_report_pdf_task
+from conditional import conditional_response
+from . import caching, description_batch, list_cache, pdf, pdf_pool, report_cache
+from .filters import apply_filters, cached_facet_counts, parse_filters
+from .search import query_terms, search as search_startups
+from .signals import TAGS_GENERATION
+
+logger = logging.getLogger(__name__)
+
+
+def _peek_updated_at(queryset, pk):
+    """updated_at of the row `pk`, or None if there is none or `pk` is malformed (get_object then answers 404)."""
+    try:
+        return queryset.filter(pk=pk).values_list('updated_at', flat=True).first()
+    except (ValueError, TypeError, DjangoValidationError):
+        return None
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -21,22 +41,112 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     permission_classes = [IsAuthenticated]
 
+    def list(self, request, *args, **kwargs):
+        # Tags change rarely; signals.py bumps the generation on every tag write
+        build_response = lambda: list_cache.cached_list(
+            request, lambda: super(TagViewSet, self).list(request, *args, **kwargs)
+        )
+        generation = caching.peek_generation(TAGS_GENERATION)
+        if generation is None:
+            return build_response()
+        return conditional_response(request, build_response, ('tags', generation))
+
+    def retrieve(self, request, *args, **kwargs):
+        return list_cache.cached_list(request, lambda: super(TagViewSet, self).retrieve(request, *args, **kwargs))
+
+class DescriptionBatchJobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Progress of the user's batch description jobs.
+    """
+    serializer_class = DescriptionBatchJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return description_batch.with_progress(DescriptionBatchJob.objects.filter(user=self.request.user))
+
 class StartupViewSet(viewsets.ModelViewSet):
     """
     A ViewSet for viewing and editing startup instances.
     """
     queryset = Startup.objects.filter(is_active=True)
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
+    pagination_class = SelectableCursorPagination
+    # ?ordering= choices for the list, each backed by an index on Startup
+    cursor_orderings = {
+        'newest': ('-created_at', '-id'),
+        'popular': ('-likes_count', '-created_at', '-id'),
+    }
+
+    def get_queryset(self):
+        """
+        Builds the query plan for the current action so that serializing a
+        page of startups costs a fixed number of queries, not one per row.
+        """
+        queryset = super().get_queryset().select_related('founder').prefetch_related('tags')
+        if self.action in ('list', 'facets'):
+            return apply_filters(queryset, parse_filters(self.request.query_params))
+        if self.action == 'search':
+            return queryset
+        return queryset.prefetch_related('documents')
+
+    def list(self, request, *args, **kwargs):
+        """Pages of the list are served from the response cache (see list_cache.py)."""
+        return list_cache.cached_list(request, lambda: super(StartupViewSet, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Supports conditional GET: updated_at moves on every change to the
+        startup, its tags, documents and like count (see signals.py and
+        investors/likes.py), so it alone validates the cached body.
+        """
+        updated_at = _peek_updated_at(Startup.objects.filter(is_active=True), kwargs['pk'])
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)
+        return conditional_response(request, lambda: super(StartupViewSet, self).retrieve(request, *args, **kwargs),
+                                    ('startup', kwargs['pk'], updated_at.isoformat()), last_modified=updated_at)
 
     def get_serializer_class(self):
         if self.action == 'list':
             return StartupListSerializer
+        if self.action == 'search':
+            return StartupSearchResultSerializer
         return StartupDetailSerializer
 
     def perform_create(self, serializer):
         # Automatically assign the logged-in user as the founder
         serializer.save(founder=self.request.user)
 
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Counts of startups per tag and per founding year among those matching
+        the same filters as the list (see filters.py).
+        """
+        filters = parse_filters(request.query_params)
+        return Response(cached_facet_counts(self.get_queryset(), filters))
+
+    @action(detail=False, methods=['get'], pagination_class=RankedResultsPagination)
+    def search(self, request):
+        """
+        Full-text search over names, descriptions and tags (see search.py).
+        `?q=` words are prefix-matched and must all occur; results are ranked
+        best first and paged with `limit` and `offset`.
+        """
+        query = request.query_params.get('q', '')
+        if not query_terms(query):
+            return Response({'error': 'q is required to search.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = self.paginator
+        hits = paginator.paginate_results(lambda limit, offset: search_startups(query, limit, offset), request)
+        startups = self.get_queryset().in_bulk([startup_id for startup_id, _, _ in hits])
+        results = []
+        for startup_id, rank, snippet in hits:
+            startup = startups.get(startup_id)
+            if startup is not None:
+                startup.rank, startup.snippet = rank, snippet
+                results.append(startup)
+        return paginator.get_paginated_response(self.get_serializer(results, many=True).data)
+
     @action(detail=True, methods=['post'])
     def generate_description(self, request, pk=None):
         """
@@ -66,6 +176,34 @@ class StartupViewSet(viewsets.ModelViewSet):
             {'status': 'Description generation has started in the background.'},
             status=status.HTTP_202_ACCEPTED
         )
+
+    @action(detail=False, methods=['post'], url_path='generate-descriptions')
+    def generate_descriptions(self, request):
+        """
+        Batch variant of generate_description for the founder's own startups:
+          {"items": [{"startup_id": 1, "prompt_data": "..."}, ...]}
+        Starts one job (see description_batch.py) and returns its id; poll
+        /api/description-jobs/{job_id}/ for progress.
+        """
+        input_serializer = DescriptionBatchInputSerializer(
+            data=request.data, context={'max_items': description_batch.get_options()['MAX_ITEMS']}
+        )
+        input_serializer.is_valid(raise_exception=True)
+        prompts = {item['startup_id']: item['prompt_data'] for item in input_serializer.validated_data['items']}
+
+        own_ids = set(Startup.objects.filter(id__in=prompts, founder=request.user).values_list('id', flat=True))
+        not_permitted = sorted(set(prompts) - own_ids)
+        if not_permitted:
+            return Response(
+                {'error': 'These startups do not exist or are not yours.', 'startup_ids': not_permitted},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        job = description_batch.create_job(request.user, prompts)
+        return Response(
+            {'job_id': job.id, 'status_url': reverse('descriptionbatchjob-detail', args=[job.id], request=request)},
+            status=status.HTTP_202_ACCEPTED
+        )
     
 class AnalysisReportViewSet(viewsets.ModelViewSet):
     """
@@ -78,6 +216,7 @@ class AnalysisReportViewSet(viewsets.ModelViewSet):
     # queryset and permission_classes remain the same
     queryset = AnalysisReport.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_serializer_class(self):
         """
@@ -96,21 +235,55 @@ class AnalysisReportViewSet(viewsets.ModelViewSet):
         """
         return AnalysisReport.objects.filter(user=self.request.user).order_by('-created_at')
 
+    def retrieve(self, request, *args, **kwargs):
+        """Supports conditional GET, validated by updated_at, so polling an unchanged report is cheap."""
+        updated_at = _peek_updated_at(self.get_queryset(), kwargs['pk'])
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)
+        return conditional_response(request, lambda: super(AnalysisReportViewSet, self).retrieve(request, *args, **kwargs),
+                                    ('report', kwargs['pk'], updated_at.isoformat()), last_modified=updated_at)
+
+    def create(self, request, *args, **kwargs):
+        """
+        The report is generated in the background, so POST answers
+        202 Accepted with the PENDING report; poll it for the result.
+        A report completed from the result cache is returned as 201 Created.
+        """
+        response = super().create(request, *args, **kwargs)
+        if response.data['status'] != AnalysisReport.Status.COMPLETED:
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
     def perform_create(self, serializer):
         """
         This is called on POST. It correctly assigns the user
         and triggers the background task.
         """
+        force_refresh = serializer.validated_data.pop('force_refresh', False)
         report = serializer.save(user=self.request.user, status=AnalysisReport.Status.PENDING)
         print(f"Report created: {report.id}")
-#        generate_analysis_report_task.delay(report.id)
-        generate_analysis_report_task(report.id)
+
+        cached_content = None if force_refresh else report_cache.lookup(report.initial_query)
+        if cached_content is not None:
+            # Someone already asked this question: complete the report right away
+            now = timezone.now()
+            report.report_content_md = cached_content
+            report.status = AnalysisReport.Status.COMPLETED
+            report.served_from_cache = True
+            report.started_at = report.finished_at = now
+            report.save()
+            render_report_pdf_task.delay(report.id)
+            return
+
+        generate_analysis_report_task.delay(report.id)
 
 
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
         """
-        Download the report PDF after converting Markdown to styled PDF.
+        Download the report PDF. It is normally pre-rendered by
+        render_report_pdf_task and streamed from the PDF store, with ETag and
+        Range support; it is only rendered here if no stored file exists yet.
         """
         report = self.get_object()
 
@@ -121,93 +294,44 @@ class AnalysisReportViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            # If the field is already a dict, use it directly
-            if isinstance(report.report_content_md, dict):
-                markdown_string = report.report_content_md.get("response", "")
-            else:
-                # Otherwise, it's a JSON string and needs decoding
-                parsed = json.loads(report.report_content_md)
-                markdown_string = parsed.get("response", "")
-
-            html_content = markdown2.markdown(markdown_string)
-
-            styled_html = f"""
-<html>
-<head>
-    <meta charset="utf-8">
-    <style>
-        @page {{
-            margin: 2cm;
-        }}
-        body {{
-            font-family: "Segoe UI", "Helvetica Neue", sans-serif;
-            line-height: 1.7;
-            color: #2c3e50;
-            background-color: #fff;
-            padding: 0;
-            margin: 0;
-        }}
-        h1, h2, h3, h4 {{
-            color: #1a237e;
-            margin-top: 30px;
-            margin-bottom: 15px;
-        }}
-        p {{
-            margin: 12px 0;
-            font-size: 14px;
-        }}
-        ul, ol {{
-            padding-left: 25px;
-            margin-bottom: 20px;
-        }}
-        li {{
-            margin-bottom: 8px;
-        }}
-        a {{
-            color: #0d47a1;
-            text-decoration: none;
-        }}
-        a:hover {{
-            text-decoration: underline;
-        }}
-        code {{
-            background-color: #f5f5f5;
-            padding: 2px 4px;
-            font-family: monospace;
-            border-radius: 4px;
-        }}
-        pre {{
-            background: #f0f0f0;
-            padding: 12px;
-            overflow-x: auto;
-            border-left: 4px solid #2196f3;
-            font-family: Consolas, monospace;
-            border-radius: 6px;
-        }}
-        blockquote {{
-            border-left: 4px solid #90caf9;
-            margin: 20px 0;
-            padding: 10px 20px;
-            background: #f9f9f9;
-            font-style: italic;
-            color: #555;
-        }}
-    </style>
-</head>
-<body>
-{html_content}
-</body>
-</html>
-"""
-
-
-            pdf = HTML(string=styled_html).write_pdf()
-            response = HttpResponse(pdf, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="startup_report_{report.id}.pdf"'
-            return response
-
-        except Exception as e:
+            key = pdf.content_key(report)
+            etag = f'"{key}"'
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                not_modified['ETag'] = etag
+                return not_modified
+            path = pdf.get_cached_pdf(key)
+            if path is None:
+                # The background render has not produced this PDF yet; render it in the PDF pool
+                path = pdf.store_pdf(key, pdf_pool.render_report_pdf(report, key))
+                if report.pdf_status != AnalysisReport.PdfStatus.READY:
+                    report.pdf_status = AnalysisReport.PdfStatus.READY
+                    report.save(update_fields=['pdf_status', 'updated_at'])
+            return pdf.pdf_response(request, path, etag, f"startup_report_{report.id}.pdf")
+
+        except pdf_pool.RenderPoolBusy:
+            return Response(
+                {"error": "Too many PDFs are being rendered right now. Please retry shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(pdf_pool.RETRY_AFTER)}
+            )
+        except pdf_pool.RenderTimeout:
+            logger.warning("PDF render of report %s timed out.", report.id)
+            return Response(
+                {"error": "Generating the PDF took too long. Please retry later."},
+                status=status.HTTP_504_GATEWAY_TIMEOUT
+            )
+        except (MemoryError, BrokenProcessPool):
+            # The render hit the worker's memory cap, or the worker was killed
+            logger.warning("PDF render of report %s ran out of resources.", report.id, exc_info=True)
+            return Response(
+                {"error": "The PDF could not be generated right now. Please retry shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(pdf_pool.RETRY_AFTER)}
+            )
+        except Exception:
+            logger.exception("PDF generation failed for report %s.", report.id)
             return Response(
-                {"error": f"Failed to generate PDF: {str(e)}"},
+                {"error": "Failed to generate PDF."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
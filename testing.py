@@ -0,0 +1,13 @@
+"""
+Shared helpers for the apps' tests.
+
+`use_locmem_cache` points the default cache at process-local memory, so tests
+neither need a Redis server nor leak entries between runs. Apply it to every
+test class that reaches the cache, directly or through signals and
+authentication.
+"""
+from django.test import override_settings
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+use_locmem_cache = override_settings(CACHES=LOCMEM_CACHES)
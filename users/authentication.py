@@ -0,0 +1,175 @@
+"""
+Token authentication without a database query per request.
+
+`CachedTokenAuthentication` is a drop-in replacement for DRF's
+TokenAuthentication. A resolved token (with its user) is kept in a small
+per-process LRU for LOCAL_TTL seconds, so most requests authenticate from
+memory. Behind that, the default cache (Redis) maps the token to its user's
+id for TTL seconds. That is all that leaves the process, never the user row
+with its password hash, and since a token never changes owner the mapping
+never goes stale. A process that finds the token there loads the user by
+primary key; a token found in neither is read from the database.
+
+Invalidation is immediate and per user. signals.py calls `invalidate()` when
+a token is deleted (which is how dj_rest_auth logs out) and when a user is
+saved, which covers deactivation. That deletes the deleted tokens' Redis
+entries and bumps the user's 'auth-tokens:<user id>' generation. Every
+process compares an LRU entry against its user's current generation, one
+cache read per request, so the user's entries cached by other processes die
+as well while everyone else's stay. When the cache is unavailable, tokens
+are looked up in the database as usual.
+"""
+import copy
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from startups import caching
+
+logger = logging.getLogger(__name__)
+
+GENERATION = 'auth-tokens'
+KEY_PREFIX = 'auth-token:'
+
+DEFAULTS = {
+    'TTL': 5 * 60,
+    'LOCAL_TTL': 30,
+    'LOCAL_SIZE': 1024,
+}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+def cache_key(token_key):
+    # Token keys are credentials; don't spell them out in cache key names
+    return KEY_PREFIX + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def user_generation(user_id):
+    """Name of the caching.py generation that validates `user_id`'s cached tokens."""
+    return f'{GENERATION}:{user_id}'
+
+
+class LocalTokenCache:
+    """A thread-safe LRU of token_key -> (token, generation, expires_at); hits are copies."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token_key):
+        """Returns (token, generation it was cached under), or None."""
+        with self._lock:
+            entry = self._entries.get(token_key)
+            if entry is None:
+                return None
+            token, generation, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[token_key]
+                return None
+            self._entries.move_to_end(token_key)
+        # Every request gets its own user object, as it would from the database
+        return copy.deepcopy(token), generation
+
+    def discard(self, token_key):
+        with self._lock:
+            self._entries.pop(token_key, None)
+
+    def set(self, token_key, token, generation, timeout, size):
+        with self._lock:
+            self._entries[token_key] = (token, generation, time.monotonic() + timeout)
+            self._entries.move_to_end(token_key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_tokens = LocalTokenCache()
+
+
+def invalidate(user_id, token_keys=()):
+    """Drops the cached tokens of `user_id` in every process, and the Redis entries of deleted `token_keys`."""
+    token_keys = list(token_keys)
+    if token_keys:
+        try:
+            cache.delete_many([cache_key(key) for key in token_keys])
+        except Exception:
+            logger.warning("Cache is unavailable; could not drop cached tokens.", exc_info=True)
+    caching.bump_generation(user_generation(user_id))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        options = get_options()
+        local = local_tokens.get(key)
+        if local is not None:
+            token, generation = local
+            if generation == caching.peek_generation(user_generation(token.user_id)):
+                return self._check(token)
+            local_tokens.discard(key)
+
+        user_id = self._cached_user_id(key)
+        if user_id is None:
+            # Not kept locally: the user was read before any generation could be
+            # checked, so a concurrent change would go unnoticed. The next request
+            # loads it via the mapping stored here.
+            token = self._fetch(key)
+            self._store(key, token, options['TTL'])
+        else:
+            # Read before the user, so a change made meanwhile leaves this entry behind
+            generation = caching.peek_generation(user_generation(user_id))
+            token = self._load(key, user_id)
+            if generation is not None:
+                local_tokens.set(key, token, generation, options['LOCAL_TTL'], options['LOCAL_SIZE'])
+        return self._check(token)
+
+    @staticmethod
+    def _check(token):
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
+
+    @staticmethod
+    def _cached_user_id(key):
+        try:
+            return cache.get(cache_key(key))
+        except Exception:
+            return None
+
+    @staticmethod
+    def _store(key, token, timeout):
+        try:
+            cache.set(cache_key(key), token.user_id, timeout)
+        except Exception:
+            logger.warning("Cache is unavailable; token not stored.", exc_info=True)
+
+    def _fetch(self, key):
+        model = self.get_model()
+        try:
+            return model.objects.select_related('user').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+    def _load(self, key, user_id):
+        """The token found in the cache, with its user read from the database."""
+        try:
+            user = get_user_model().objects.get(pk=user_id)
+        except ObjectDoesNotExist:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return self.get_model()(key=key, user=user)
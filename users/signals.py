@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import authentication
+from .models import User
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # dj_rest_auth's logout deletes the token
+    authentication.invalidate(instance.user_id, [instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # Locally cached tokens carry the user, so any change (deactivation above all) drops
+    # this user's. Logins only touch last_login, which nothing reads from request.user.
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    authentication.invalidate(instance.pk)
@@ -1,3 +1,70 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from testing import use_locmem_cache
+from . import authentication
+from .models import User
+
+
+@use_locmem_cache
+class CachedTokenAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        authentication.local_tokens.clear()
+        self.user = User.objects.create_user(username='founder', password='pass')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = reverse('rest_user_details')
+
+    def test_token_is_resolved_from_cache(self):
+        # The token from the database, then the user via the cached mapping, then memory
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['username'], 'founder')
+
+        # Another process has no local entry; it finds the token in Redis and loads only the user
+        authentication.local_tokens.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_cache_holds_no_user_data(self):
+        self.client.get(self.url)
+        self.assertEqual(cache.get(authentication.cache_key(self.token.key)), self.user.pk)
+
+    def test_saving_another_user_keeps_this_token_cached(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        other = User.objects.create_user(username='other', password='pass')
+        other.first_name = 'Ada'
+        other.save()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_logout_invalidates_token(self):
+        self.client.get(self.url)
+        self.assertEqual(self.client.post(reverse('rest_logout')).status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deactivation_invalidates_token(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_user_changes_are_visible_immediately(self):
+        self.client.get(self.url)
+        self.user.username = 'ada'
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).json()['username'], 'ada')
+
+    def test_unknown_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token nope')
+        self.assertEqual(self.client.get(self.url).status_code, 401)